@@ -0,0 +1,290 @@
+import time
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import httppool
+import metrics
+import ratelimit
+from bybitTrader import BybitCore
+
+try:
+    import aiohttp
+except ImportError:  # optional: without it requests go through httppool's sessions on a thread pool
+    aiohttp = None
+
+# asyncio variant of BybitTrader. Signing, payloads, the order registry and
+# the rate limit scheduler come from bybitTrader.BybitCore, which BybitTrader
+# shares; only the I/O is awaited, so one event loop can keep many ladders'
+# requests in flight at once:
+#
+#   async with AsyncBybitTrader(api_key, secret_key) as trader:
+#       ids = await asyncio.gather(*(trader.create_order('spot', 'BTCUSDT', 'Buy', 'Limit', 0.001, p) for p in prices))
+#       async for order in trader.order_updates():
+#           ...
+
+class AsyncHttp:
+    """One pooled async HTTP client: aiohttp when installed, else the shared requests sessions on a bounded thread pool."""
+    def __init__(self, limit=None, timeout=10, http_pool=None):
+        self.http = http_pool or httppool.pool
+        self.limit = limit or self.http.max_size  # concurrent requests, and connections kept per host
+        self.timeout = timeout
+        self.session = None
+        self.executor = None
+
+    async def request(self, method, url, headers=None, data=None):
+        """Returns (response headers, decoded JSON body)."""
+        if aiohttp is not None:
+            if self.session is None:
+                self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit_per_host=self.limit),
+                                                     timeout=aiohttp.ClientTimeout(total=self.timeout))
+            async with self.session.request(method, url, headers=headers, data=data) as response:
+                return response.headers, await response.json(content_type=None)
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.limit, thread_name_prefix='async-http')
+        call = functools.partial(self.http.request, method, url, headers=headers, data=data)
+        response = await asyncio.get_running_loop().run_in_executor(self.executor, call)
+        return response.headers, response.json()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+
+class OrderStream:
+    """Async iterator over the private order stream, one order dict at a time.
+
+    pybit delivers messages on its websocket thread; they are handed to the
+    event loop through an asyncio.Queue, and the trader's registry is
+    updated as each order is consumed.
+    """
+    def __init__(self, trader, maxsize=0):
+        self.trader = trader
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.pending = []
+        self.ws = None
+
+    def start(self):
+        self.ws = self.trader.websocket.connect("private", api_key=self.trader.api_key, api_secret=self.trader.secret_key)
+        self.ws.order_stream(callback=self.on_message)
+        return self
+
+    def on_message(self, message):  # pybit's thread
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, message)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self.pending:
+            message = await self.queue.get()
+            if message is None:
+                raise StopAsyncIteration
+            self.pending = list(message.get('data', []))
+        order = self.pending.pop(0)
+        self.trader.apply_order_update(order)
+        return order
+
+    def close(self):
+        if self.ws is not None:
+            self.ws.exit()
+            self.ws = None
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+
+
+class AsyncBybitTrader(BybitCore):
+    """BybitCore with every request awaited. Not a BybitTrader: code written for the blocking client gets no coroutines by mistake."""
+    def __init__(self, api_key, secret_key, base_dir='./', testnet=True, http_limit=None, **kwargs):
+        super().__init__(api_key, secret_key, base_dir, testnet, **kwargs)
+        self.client = AsyncHttp(http_limit, http_pool=self.http)
+        self.streams = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+        return False
+
+    async def close(self):
+        for stream in self.streams:
+            stream.close()
+        self.streams = []
+        await self.client.close()
+
+    async def http_request(self, endpoint, method, params="", info="", verbose=True, priority=None):
+        """Signed request, awaited until the scheduler gives this endpoint and priority a slot."""
+        url, params_encoded = self.encode_request(endpoint, method, params)
+        for attempt in range(self.rate_limit_retries + 1):
+            waited = await self.scheduler.acquire_async(endpoint, priority)
+            if waited:
+                metrics.observe('ratelimit_wait_ms', waited * 1000, endpoint=endpoint)
+            headers = self.signed_headers(params_encoded)  # signed after the wait so recv_window still holds
+            try:
+                with metrics.timer('rest_ms', endpoint=endpoint):
+                    response_headers, result = await self.client.request(method, url, headers=headers,
+                                                                         data=None if method == "GET" else params_encoded)
+            except Exception:
+                metrics.inc('rest_errors', endpoint=endpoint, kind='exception')
+                raise
+            self.scheduler.update(endpoint, response_headers, result.get('retCode'))
+            if result.get('retCode', 0) != 0:
+                metrics.inc('rest_errors', endpoint=endpoint, kind=str(result.get('retCode')))
+            if result.get('retCode') != ratelimit.RATE_LIMITED:
+                break
+        return result
+
+    async def get_index_price(self, symbol, category="spot"):
+        response = await self.http_request("/v5/market/tickers", "GET", {"symbol": symbol, "category": category}, "Get Index Price")
+        return self.parse_index_price(response)
+
+    async def get_last_price(self, symbol, category="spot", max_age=None):
+        price = self.websocket.get_price(symbol, self.price_max_age if max_age is None else max_age)
+        if price is None:
+            price = await self.get_index_price(symbol, category)
+            self.websocket.set_price(symbol, price)
+        return price
+
+    async def create_order(self, category, symbol, side, order_type, qty, price=None, time_in_force="GTC", reduce_only=False, verbose=True, priority=None,
+                           link_prefix=''):
+        order_payload = self.order_payload(category, symbol, side, order_type, qty, price, time_in_force, reduce_only, link_prefix)
+        response = await self.http_request("/v5/order/create", "POST", order_payload, "Create Order", priority=priority)
+        return self.order_created(order_payload, response, verbose)
+
+    async def batch_request(self, endpoint, category, items, info, batch_size=10):
+        """BybitTrader.batch_request with every batch sent concurrently."""
+        chunks = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+        responses = await asyncio.gather(*(self.http_request(endpoint, "POST", {"category": category, "request": chunk}, info)
+                                           for chunk in chunks))
+        results = []
+        for chunk, response in zip(chunks, responses):
+            results.extend(self.batch_results(chunk, response))
+        return results
+
+    async def create_orders(self, category, orders, verbose=True, link_prefix=''):
+        payloads = self.batch_order_payloads(orders, link_prefix)
+        results = await self.batch_request("/v5/order/create-batch", category, payloads, "Create Orders")
+        return self.orders_created(category, payloads, results, verbose)
+
+    async def amend_orders(self, category, symbol, amendments, verbose=True):
+        items = self.amend_items(symbol, amendments)
+        return self.orders_amended(items, await self.batch_request("/v5/order/amend-batch", category, items, "Amend Orders"), verbose)
+
+    async def cancel_orders(self, category, symbol, order_ids, verbose=True):
+        items = [{"symbol": symbol, "orderId": order_id} for order_id in order_ids]
+        return self.orders_cancelled(items, await self.batch_request("/v5/order/cancel-batch", category, items, "Cancel Orders"), verbose)
+
+    async def cancel_order(self, order_name, verbose=True):
+        link_id, order_info = self.orders.by_name(order_name)
+        if order_info:
+            response = await self.http_request("/v5/order/cancel", "POST", self.cancel_payload(link_id, order_info), "Cancel Order")
+            return self.order_cancelled(order_name, link_id, response, verbose)
+        if verbose:
+            print(f"Order {order_name} not found.")
+        return {"error": "Order not found"}
+
+    async def iter_pages(self, endpoint, params, page_size=50, prefetch=False, info=""):
+        """Async generator over each page's 'list'; with prefetch the next page is requested while this one is consumed."""
+        async def fetch(cursor):
+            payload = dict(params, limit=page_size)
+            if cursor:
+                payload["cursor"] = cursor
+            response = await self.http_request(endpoint, "GET", payload, info)
+            if response.get("retCode") != 0:
+                raise Exception(f"Error fetching {endpoint}: {response.get('retMsg')}")
+            result = response.get("result", {})
+            return result.get("list", []), result.get("nextPageCursor") or None
+        pending = asyncio.ensure_future(fetch(None))
+        try:
+            while pending is not None:
+                items, cursor = await pending
+                pending = None
+                if cursor:
+                    pending = asyncio.ensure_future(fetch(cursor)) if prefetch else fetch(cursor)
+                yield items
+        finally:
+            if isinstance(pending, asyncio.Future):
+                pending.cancel()
+            elif pending is not None:
+                pending.close()  # an unawaited coroutine
+
+    async def iter_orders(self, category, page_size=50, prefetch=False, **filters):
+        params = {"category": category, "openOnly": 0}
+        params.update(filters)
+        async for page in self.iter_pages("/v5/order/realtime", params, page_size, prefetch, "Get Open Orders"):
+            for order in page:
+                yield order
+
+    async def iter_executions(self, category, symbol=None, start=None, end=None, page_size=100, prefetch=False):
+        params = {"category": category}
+        if symbol:
+            params["symbol"] = symbol
+        if start is not None:
+            params["startTime"] = int(start)
+        if end is not None:
+            params["endTime"] = int(end)
+        async for page in self.iter_pages("/v5/execution/list", params, page_size, prefetch, "Get Executions"):
+            for execution in page:
+                yield execution
+
+    async def get_executions(self, category, symbol=None, start=None, end=None, window=24 * 3600 * 1000):
+        """Every fill between start and end (ms, default the last 7 days), oldest first; all slices paged concurrently."""
+        end = int(time.time() * 1000) if end is None else int(end)
+        start = end - 7 * 24 * 3600 * 1000 if start is None else int(start)
+        slices = [(t, min(t + window - 1, end)) for t in range(start, end + 1, window)]
+        async def fetch(a, b):
+            return [e async for e in self.iter_executions(category, symbol, a, b, prefetch=True)]
+        parts = await asyncio.gather(*(fetch(a, b) for a, b in slices))
+        executions = {e.get("execId"): e for part in parts for e in part}
+        return sorted(executions.values(), key=lambda e: int(e.get("execTime", 0)))
+
+    async def get_order(self, category, order_id):
+        for endpoint in ("/v5/order/realtime", "/v5/order/history"):
+            try:
+                response = await self.http_request(endpoint, "GET", {"category": category, "orderId": order_id}, "Get Order")
+            except Exception:
+                return None
+            if response.get("retCode") != 0:
+                return None
+            found = response.get("result", {}).get("list", [])
+            if found:
+                return found[0]
+        return None
+
+    async def get_orders(self, category, order_ids):
+        order_ids = list(order_ids)
+        found = await asyncio.gather(*(self.get_order(category, order_id) for order_id in order_ids))
+        return dict(zip(order_ids, found))
+
+    async def get_open_orders(self, category, verbose=True, prefetch=False):
+        if category not in ['spot', 'linear', 'inverse', 'option']:
+            if verbose:
+                print("Invalid category specified")
+            return {"error": "Invalid category specified"}
+        try:
+            open_orders = [order async for order in self.iter_orders(category, prefetch=prefetch)]
+        except Exception as e:
+            # never mark anything fulfilled from a partial listing
+            if verbose:
+                print(e)
+            return {"retCode": -1, "retMsg": str(e)}
+        return self.sync_open_orders(category, open_orders)
+
+    async def show_orders(self, category=None, verbose=True):
+        if category:
+            await self.get_open_orders(category)
+        if verbose:
+            for link_id, order in self.orders.select(category=category):
+                details = order['details']
+                print(f"{order['name']}: Symbol={details['symbol']}, Qty={details['qty']}, Price={details.get('price', 'N/A')}, Status={order['status']}")
+
+    def order_updates(self, maxsize=0):
+        """Subscribe to the private order stream; use as `async for order in trader.order_updates()`."""
+        stream = OrderStream(self, maxsize).start()
+        self.streams.append(stream)
+        return stream
+
@@ -0,0 +1,213 @@
+import os
+import csv
+import shutil
+import json
+import time
+import heapq
+import uuid
+import argparse
+import numpy as np
+import napilib as na
+import tapelib
+from gridTrader import GridTrader
+
+# Replays a recorded trade tape through GridTrader's own decision and
+# accounting code, with a simulated exchange in place of BybitTrader.
+# No network is touched: Notion writes go to NullNotion.
+
+
+class SimTrader:
+    """Matching engine with the slice of the BybitTrader interface GridTrader uses.
+
+    Resting limit orders fill in full at their limit price as soon as a
+    trade prints through them; fills are reported to `callback` as Bybit
+    order-stream messages.
+    """
+
+    def __init__(self, fee_rate=0.001):
+        self.fee_rate = fee_rate
+        self.price = None
+        self.time = None
+        self.callback = None
+        self.buys = []  # heap of (-price, seq, order_id)
+        self.sells = []  # heap of (price, seq, order_id)
+        self.resting = {}  # order_id -> order
+        self.seq = 0
+        self.fills = 0
+        self.fees = 0.0
+
+    def get_last_price(self, symbol, category="spot", max_age=None):
+        return self.price
+
+    def get_index_price(self, symbol, category="spot"):
+        return self.price
+
+    def create_order(self, category, symbol, side, order_type, qty, price=None, time_in_force="GTC", reduce_only=False, verbose=True, priority=None,
+                     link_prefix=''):
+        self.seq += 1
+        order_id = f"sim-{self.seq}"
+        self.resting[order_id] = {'orderId': order_id, 'symbol': symbol, 'side': side, 'price': float(price), 'qty': float(qty)}
+        if side == 'Buy':
+            heapq.heappush(self.buys, (-float(price), self.seq, order_id))
+        else:
+            heapq.heappush(self.sells, (float(price), self.seq, order_id))
+        return order_id
+
+    def cancel(self, order_id):
+        return self.resting.pop(order_id, None) is not None  # its heap entry is skipped when reached
+
+    def apply_order_update(self, order):  # no order registry to keep
+        pass
+
+    def create_orders(self, category, orders, verbose=True, link_prefix=''):
+        return [self.create_order(category, o['symbol'], o['side'], o.get('order_type', 'Limit'), o['qty'], o.get('price'))
+                for o in orders]
+
+    def cancel_orders(self, category, symbol, order_ids, verbose=True):
+        return [self.cancel(order_id) for order_id in order_ids]
+
+    def tick(self, ts, price):
+        """Advance to a new print and fill every resting order it trades through."""
+        self.time = ts
+        self.price = price
+        while True:
+            filled = []
+            while self.buys and -self.buys[0][0] >= price:
+                filled.append(heapq.heappop(self.buys)[2])
+            while self.sells and self.sells[0][0] <= price:
+                filled.append(heapq.heappop(self.sells)[2])
+            filled = [self.resting.pop(o) for o in filled if o in self.resting]
+            if not filled:
+                return
+            for order in filled:
+                self.fill(order)  # may place new orders, so match again afterwards
+
+    def fill(self, order):
+        fee = order['price'] * order['qty'] * self.fee_rate
+        self.fills += 1
+        self.fees += fee
+        if self.callback:
+            self.callback({'topic': 'order', 'data': [{
+                'orderId': order['orderId'],
+                'symbol': order['symbol'],
+                'side': order['side'],
+                'orderStatus': 'Filled',
+                'price': str(order['price']),
+                'avgPrice': str(order['price']),
+                'cumExecQty': str(order['qty']),
+                'cumExecFee': str(fee),
+                'updatedTime': str(self.time),
+            }]})
+
+
+class NullNotion:
+    """Drop-in for napilib.writer that sends nothing."""
+
+    def register(self, *databases):
+        pass
+
+    def add(self, database, row, keep=True):
+        return 'pending-' + uuid.uuid4().hex
+
+    def update(self, page, row, database, last=False):
+        pass
+
+    def close(self, timeout=0):
+        return True
+
+
+def load_ticks(path):
+    """Yield (T, price) from a TickStore directory, an .ndjson tape or a *_records.json file."""
+    if os.path.isdir(path):
+        base_dir, name = os.path.split(os.path.normpath(path))
+        columns = tapelib.TickStore(base_dir, name[:-len('_ticks')] if name.endswith('_ticks') else name).query()
+        step = 1000000
+        for i in range(0, len(columns['ts']), step):
+            yield from zip(columns['ts'][i:i + step].tolist(), columns['price'][i:i + step].tolist())
+    elif path.endswith('.ndjson'):
+        for item in tapelib.iter_tape(path):
+            yield int(item['T']), float(item['p'])
+    else:
+        with open(path, 'r') as f:
+            for item in json.load(f):
+                yield int(item['T']), float(item['p'])
+
+
+def run_backtest(tape, grid_size, buy_size, initial_price, symbol='ETHUSDT', fee_rate=0.001, balance=2000.0,
+                 out_dir='backtest', sample_every=60000, session='backtest'):
+    """Replay `tape` and write trades_record.csv (plus its ledger, trades_record_ledger/) and portfolio.csv into out_dir. Returns a summary dict."""
+    os.makedirs(out_dir, exist_ok=True)
+    for name in ('buy_orders.json', 'sell_orders.json', 'order_tracking.json', 'portfolio.json', 'open_orders.json', 'trades_record.csv'):
+        if os.path.exists(os.path.join(out_dir, name)):
+            os.remove(os.path.join(out_dir, name))  # always start from an empty grid
+    shutil.rmtree(os.path.join(out_dir, 'trades_record_ledger'), ignore_errors=True)
+
+    ticks = iter(load_ticks(tape))
+    first = next(ticks, None)
+    if first is None:
+        raise ValueError(f"{tape} has no trades")
+    sim = SimTrader(fee_rate)
+    sim.tick(*first)
+    gt = GridTrader(None, None, na.db('', ''), grid_size, buy_size, initial_price, symbol, session=session,
+                    trader=sim, notion=NullNotion(), state_dir=out_dir,
+                    csv_file=os.path.join(out_dir, 'trades_record.csv'), install_signals=False)
+    gt.balance = balance
+    gt.batch_size = 1000
+    sim.callback = gt.handle_filled_order_callback
+
+    series = []
+    next_sample = first[0]
+    count = 0
+    start = time.perf_counter()
+    gt.check_price(first[1])
+    for ts, price in ticks:
+        sim.tick(ts, price)
+        gt.check_price(price)
+        count += 1
+        if ts >= next_sample:
+            series.append((ts, price, gt.balance + gt.eth_holdings * price, gt.balance, gt.eth_holdings, gt.cumulative_income))
+            next_sample = ts + sample_every
+    elapsed = time.perf_counter() - start
+    last_ts, last_price = sim.time, sim.price
+    series.append((last_ts, last_price, gt.balance + gt.eth_holdings * last_price, gt.balance, gt.eth_holdings, gt.cumulative_income))
+    if gt.pending_updates:
+        gt.flush_updates()
+    gt.checkpoint_state()
+    gt.ledger.to_csv(os.path.join(out_dir, 'trades_record.csv'))  # same trades CSV as a live run used to write
+
+    with open(os.path.join(out_dir, 'portfolio.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Time', 'Price', 'Portfolio Value', 'Balance', 'ETH Holdings', 'Cumulative Income'])
+        writer.writerows(series)
+
+    values = np.array([s[2] for s in series])
+    drawdown = float((np.maximum.accumulate(values) - values).max()) if len(values) else 0.0
+    span = (last_ts - first[0]) / 1000.0
+    return {
+        'ticks': count + 1,
+        'fills': sim.fills,
+        'fees': sim.fees,
+        'open_pairs': len(gt.order_tracking),
+        'cumulative_income': gt.cumulative_income,
+        'final_value': series[-1][2],
+        'max_drawdown': drawdown,
+        'elapsed_s': elapsed,
+        'ticks_per_s': (count + 1) / elapsed if elapsed else None,
+        'speedup': span / elapsed if elapsed else None,  # tape seconds replayed per wall-clock second
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay a recorded trade tape through GridTrader.')
+    parser.add_argument('tape', help='*_records.json, *_records.ndjson or a *_ticks directory')
+    parser.add_argument('--grid-size', type=float, default=7)
+    parser.add_argument('--buy-size', type=float, default=0.001)
+    parser.add_argument('--initial-price', type=float, default=0)
+    parser.add_argument('--symbol', default='ETHUSDT')
+    parser.add_argument('--fee-rate', type=float, default=0.001)
+    parser.add_argument('--balance', type=float, default=2000.0)
+    parser.add_argument('--out-dir', default='backtest')
+    args = parser.parse_args()
+    summary = run_backtest(args.tape, args.grid_size, args.buy_size, args.initial_price, args.symbol,
+                           args.fee_rate, args.balance, args.out_dir)
+    print(json.dumps(summary, indent=4))
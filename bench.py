@@ -0,0 +1,307 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+import numpy as np
+import tapelib
+import metrics
+import logpipe
+from bybitTrader import BybitTrader
+from backtest import NullNotion
+import napilib as na
+
+# Benchmarks for the hot paths: recording trades (bbSocket.handle_message),
+# querying the tape (retrieve_recent_data / calculate_moving_averages) and
+# processing fills (GridTrader.handle_filled_order_callback). Everything runs
+# on synthetic data with the network stubbed out. Results are written as
+# JSON so two runs (e.g. two commits) can be compared with --compare.
+#
+#   python bench.py --out before.json
+#   python bench.py --out after.json --compare before.json
+
+TRADE_RATE = 100  # synthetic trades per second, about ETHUSDT spot on a busy day
+BATCH = 5  # trades per websocket message
+
+
+def synthetic_trades(n, end_ms=None, rate=TRADE_RATE, seed=1):
+    """n Bybit-style trade dicts, evenly spaced at `rate` per second and ending at end_ms (default now)."""
+    rng = np.random.default_rng(seed)
+    end_ms = end_ms or int(time.time() * 1000)
+    ts = end_ms - ((n - 1 - np.arange(n)) * 1000 // rate)
+    price = np.round(2500 + np.cumsum(rng.normal(0, 0.05, n)), 2)
+    qty = np.round(rng.exponential(0.05, n) + 0.0001, 4)
+    side = np.where(rng.random(n) < 0.5, 'Buy', 'Sell')
+    return [{'T': int(t), 's': 'ETHUSDT', 'S': s, 'v': str(q), 'p': str(p), 'i': str(i), 'BT': False}
+            for i, (t, p, q, s) in enumerate(zip(ts.tolist(), price.tolist(), qty.tolist(), side.tolist()))]
+
+
+def trade_messages(trades, batch=BATCH):
+    for i in range(0, len(trades), batch):
+        yield {'topic': 'publicTrade.ETHUSDT', 'type': 'snapshot', 'ts': trades[i]['T'], 'data': trades[i:i + batch]}
+
+
+class StubTrader:
+    """Order entry that answers instantly, for GridTrader fill handling."""
+
+    def __init__(self):
+        self.seq = 0
+        self.last = None
+
+    def create_order(self, category, symbol, side, order_type, qty, price=None, time_in_force="GTC", reduce_only=False, verbose=True, priority=None,
+                     link_prefix=''):
+        self.seq += 1
+        self.last = f'stub-{self.seq}'
+        return self.last
+
+    def get_last_price(self, symbol, category="spot", max_age=None):
+        return 2500.0
+
+    def apply_order_update(self, order):
+        pass
+
+
+def fill_message(order_id, side, price, qty=0.001, fee_rate=0.001):
+    return {'topic': 'order', 'creationTime': int(time.time() * 1000), 'data': [{
+        'orderId': order_id, 'symbol': 'ETHUSDT', 'side': side, 'orderStatus': 'Filled', 'price': str(price),
+        'avgPrice': str(price), 'cumExecQty': str(qty), 'cumExecFee': str(price * qty * fee_rate),
+        'updatedTime': str(int(time.time() * 1000))}]}
+
+
+def socket_for(base_dir, tape_mode, capacity):
+    trader = BybitTrader('bench', 'bench', base_dir=base_dir, tape_mode=tape_mode)
+    ws = trader.websocket
+    ws.buffer_capacity = capacity
+    ws.symbol = 'ETHUSDT'
+    ws.target = 'ETHUSDT_spot_trade'
+    ws.callback = lambda message: None
+    return ws
+
+
+# benchmarks: each takes (n, scratch dir) and returns (records processed, per-operation seconds)
+
+def bench_handle_message(mode):
+    def run(n, tmp):
+        ws = socket_for(tmp, mode, n)
+        messages = list(trade_messages(synthetic_trades(n)))
+        samples = []
+        clock = time.perf_counter
+        for message in messages:
+            start = clock()
+            ws.handle_message(message)
+            samples.append(clock() - start)
+        if ws.tape:
+            start = clock()
+            ws.tape.close()
+            samples[-1] += clock() - start
+        return n, samples
+    return run
+
+
+def write_tape(tmp, mode, trades):
+    target = 'ETHUSDT_spot_trade'
+    if mode == 'json':
+        with open(os.path.join(tmp, f'{target}_records.json'), 'w') as f:
+            json.dump(trades, f)
+    else:
+        with open(os.path.join(tmp, f'{target}_records.ndjson'), 'w') as f:
+            f.writelines(json.dumps(t, separators=(',', ':')) + '\n' for t in trades)
+    if mode == 'tickstore':
+        tapelib.convert_records(os.path.join(tmp, f'{target}_records.ndjson'), tmp, target)
+
+
+def bench_query(source, query, seconds=3600, repeat=None):
+    def run(n, tmp):
+        trades = synthetic_trades(n)
+        if source == 'buffer':
+            ws = socket_for(tmp, 'ndjson', n)
+            buffer = tapelib.RingBuffer(n)
+            buffer.since = trades[0]['T'] - seconds * 1000  # as if recording started before the window
+            for t in trades:
+                buffer.append_trade(t)
+            ws.buffers[ws.target] = buffer
+        else:
+            write_tape(tmp, 'json' if source == 'json' else 'ndjson', trades)
+            if source == 'tickstore':
+                write_tape(tmp, 'tickstore', trades)
+            ws = socket_for(tmp, 'json' if source == 'json' else 'ndjson', n)
+        if query == 'range':
+            fn = lambda target, seconds: ws.retrieve_range(target, time.time() * 1000 - seconds * 1000)['price'].mean()
+        else:
+            fn = ws.retrieve_recent_data if query == 'recent_data' else ws.calculate_moving_averages
+        rounds = repeat or max(3, min(50, 2000000 // n))
+        samples = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            fn(ws.target, seconds)
+            samples.append(time.perf_counter() - start)
+        return rounds, samples
+    return run
+
+
+def bench_fills(backend, logs='file'):
+    def run(n, tmp):
+        from gridTrader import GridTrader
+        root = logging.getLogger()
+        root_level = root.level
+        if logs == 'queue':  # logpipe: the fill path only enqueues, a listener thread writes the file
+            pipeline = logpipe.LogPipeline(os.path.join(tmp, 'grid_trader.log'), console=False).install(root, lean=True)
+        else:
+            handler = logging.FileHandler(os.path.join(tmp, 'grid_trader.log'))
+            root.addHandler(handler)
+        root.setLevel(logging.INFO)  # production logs every fill at INFO, so that cost is part of the path
+        try:
+            stub = StubTrader()
+            gt = GridTrader(None, None, na.db('', ''), 7, 0.001, 0, 'ETHUSDT', trader=stub, notion=NullNotion(),
+                            state_dir=tmp, csv_file=os.path.join(tmp, 'trades_record.csv'), install_signals=False,
+                            state_backend=backend)
+            samples = []
+            clock = time.perf_counter
+            for i in range(n // 2):
+                level = 2002.0 + (i % 500) * 7
+                gt.buy_orders[level] = f'buy-{i}'
+                start = clock()
+                gt.handle_filled_order_callback(fill_message(f'buy-{i}', 'Buy', level))
+                samples.append(clock() - start)
+                start = clock()
+                gt.handle_filled_order_callback(fill_message(stub.last, 'Sell', level + 7))
+                samples.append(clock() - start)
+            if gt.pending_updates:
+                gt.flush_updates()
+            gt.state_manager.close()
+        finally:
+            if logs == 'queue':
+                pipeline.close()
+            else:
+                root.removeHandler(handler)
+                handler.close()
+            root.setLevel(root_level)
+        return len(samples), samples
+    return run
+
+
+BENCHMARKS = [
+    ('handle_message', 'json', 'records', bench_handle_message('json')),
+    ('handle_message', 'ndjson', 'records', bench_handle_message('ndjson')),
+    ('retrieve_recent_data', 'buffer', 'queries', bench_query('buffer', 'recent_data')),
+    ('retrieve_recent_data', 'ndjson', 'queries', bench_query('ndjson', 'recent_data')),
+    ('retrieve_recent_data', 'json', 'queries', bench_query('json', 'recent_data')),
+    ('calculate_moving_averages', 'buffer', 'queries', bench_query('buffer', 'moving_average')),
+    ('calculate_moving_averages', 'ndjson', 'queries', bench_query('ndjson', 'moving_average')),
+    ('calculate_moving_averages', 'json', 'queries', bench_query('json', 'moving_average')),
+    ('retrieve_range', 'tickstore', 'queries', bench_query('tickstore', 'range')),
+    ('handle_filled_order_callback', 'json', 'fills', bench_fills('json')),
+    ('handle_filled_order_callback', 'journal', 'fills', bench_fills('journal')),
+    ('handle_filled_order_callback', 'sqlite', 'fills', bench_fills('sqlite')),
+    ('handle_filled_order_callback', 'journal+logpipe', 'fills', bench_fills('journal', logs='queue')),
+]
+
+
+def measure(component, case, unit, n, run, memory=True):
+    tmp = tempfile.mkdtemp(prefix='bench-')
+    try:
+        start = time.perf_counter()
+        count, samples = run(n, tmp)
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    peak = None
+    if memory:
+        tmp = tempfile.mkdtemp(prefix='bench-')
+        tracemalloc.start()
+        try:
+            run(n, tmp)
+            peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+            shutil.rmtree(tmp, ignore_errors=True)
+    ops = np.array(samples) * 1e6
+    busy = float(ops.sum()) / 1e6
+    return {
+        'component': component,
+        'case': case,
+        'n': n,
+        'ops': len(samples),
+        'unit': unit,
+        'per_s': count / busy if busy else None,
+        'p50_us': float(np.percentile(ops, 50)),
+        'p99_us': float(np.percentile(ops, 99)),
+        'max_us': float(ops.max()),
+        'wall_s': elapsed,
+        'peak_mb': peak,
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'commit': commit, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+            'platform': platform.platform(), 'cpus': os.cpu_count(), 'numpy': np.__version__}
+
+
+def run_all(sizes, only=None, memory=True, verbose=True):
+    results = []
+    metrics.registry.enabled = False  # measure the code paths, not the instrumentation's bookkeeping growth
+    try:
+        for component, case, unit, run in BENCHMARKS:
+            if only and not any(o in f'{component}/{case}' for o in only):
+                continue
+            for n in sizes:
+                r = measure(component, case, unit, n, run, memory)
+                results.append(r)
+                if verbose:
+                    print(f"{component:<30} {case:<10} n={n:<8} {r['per_s']:>14,.0f} {unit}/s  "
+                          f"p50={r['p50_us']:>10.1f}us  p99={r['p99_us']:>10.1f}us  "
+                          f"peak={'-' if r['peak_mb'] is None else round(r['peak_mb'], 1)}MB", flush=True)
+    finally:
+        metrics.registry.enabled = True
+    return results
+
+
+def compare(results, baseline, threshold=0.2):
+    """Print throughput/p99 changes against a baseline run. Returns the regressions beyond threshold."""
+    old = {(r['component'], r['case'], r['n']): r for r in baseline['results']}
+    regressions = []
+    print(f"\nagainst {baseline['environment'].get('commit')} ({baseline['environment'].get('time')}):")
+    for r in results:
+        b = old.get((r['component'], r['case'], r['n']))
+        if not b or not b['per_s'] or not r['per_s']:
+            continue
+        speed = r['per_s'] / b['per_s'] - 1
+        tail = r['p99_us'] / b['p99_us'] - 1 if b['p99_us'] else 0.0
+        flag = ''
+        if speed < -threshold:
+            flag = '  REGRESSION'
+            regressions.append(r)
+        print(f"{r['component']:<30} {r['case']:<10} n={r['n']:<8} throughput {speed:+7.1%}  p99 {tail:+7.1%}{flag}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the tape, query and fill-handling hot paths.')
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='comma separated record counts')
+    parser.add_argument('--only', nargs='*', help='substrings of component/case to run, e.g. handle_message sqlite')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc pass (halves the run time)')
+    parser.add_argument('--out', default='bench_results.json')
+    parser.add_argument('--compare', metavar='BASELINE', help='earlier --out file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='throughput drop that counts as a regression')
+    args = parser.parse_args()
+    logging.getLogger().addHandler(logging.NullHandler())
+    sizes = [int(s) for s in args.sizes.split(',')]
+    results = run_all(sizes, args.only, not args.no_memory)
+    with open(args.out, 'w') as f:
+        json.dump({'environment': environment(), 'sizes': sizes, 'results': results}, f, indent=1)
+    print(f"wrote {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        sys.exit(1 if regressions else 0)
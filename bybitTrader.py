@@ -1,4 +1,4 @@
-import requests
+import httppool
 import time
 import hashlib
 import hmac
@@ -7,13 +7,38 @@ import uuid
 import urllib.parse
 import os
 import datetime
+import tapelib
+import orders
+import metrics
+import ratelimit
+from concurrent.futures import ThreadPoolExecutor
 from pybit.unified_trading import WebSocket
 
-class BybitTrader:
+
+class LocalWebSocket(WebSocket):
+    """pybit WebSocket pointed at an arbitrary ws:// base URL instead of stream(-testnet).bybit.com."""
+    def __init__(self, stream_url, channel_type, **kwargs):
+        path = '/v5/private' if channel_type == 'private' else f'/v5/public/{channel_type}'
+        self.local_url = stream_url.rstrip('/') + path
+        super().__init__(channel_type=channel_type, **kwargs)
+
+    def _connect(self, url):
+        super()._connect(self.local_url)
+
+
+class BybitCore:
+    """The parts of a Bybit v5 client that do no I/O, shared by BybitTrader and asyncTrader.AsyncBybitTrader.
+
+    Keys and signing, order payloads, the order registry and how responses
+    are folded into it, the rate limit scheduler and the websocket. The
+    subclasses only add the requests, blocking or awaited.
+    """
+
     class bbSocket:
-        def __init__(self, parent, testnet=True):
+        def __init__(self, parent, testnet=True, tape_mode='json', buffer_capacity=100000, stream_url=None):
             self.parent = parent
             self.base_url = None
+            self.stream_url = stream_url  # e.g. ws://127.0.0.1:8766 for mockbybit; None uses Bybit's own streams
             self.ws = None
             self.testnet = testnet
             self.running = False
@@ -25,7 +50,15 @@ class BybitTrader:
             self.callback = None
             self.base_dir = parent.base_dir
             self.data_folder = 'records'
-            self.metrics_file = 'metrics.json'
+            self.metrics_file = 'metrics.json'  # written by start_metrics()
+            self.tape_mode = tape_mode  # 'json' rewrites {target}_records.json, 'ndjson' appends to {target}_records.ndjson
+            self.tape = tapelib.TapeWriter(self.base_dir) if tape_mode == 'ndjson' else None
+            self.buffer_capacity = buffer_capacity
+            self.buffers = {}  # target -> tapelib.RingBuffer of recent trades
+            self.stores = {}  # target -> tapelib.TickStore of converted history
+            self.ticker_ws = None  # public stream feeding the price cache, separate from self.ws
+            self.prices = {}  # symbol -> (last price, local receive time in seconds)
+            self.price_listeners = []  # fn(symbol, price, received) called on every price update
             self.set_testnet(testnet)
             
         def set_testnet(self, isTest):
@@ -36,6 +69,17 @@ class BybitTrader:
             """Handle incoming WebSocket messages."""
             self.callback(message)
             data = message
+            if data['data']:
+                metrics.lag('trade', data['data'][-1].get('T'))
+            if self.target not in self.buffers:
+                self.buffers[self.target] = tapelib.RingBuffer(self.buffer_capacity)
+            self.buffers[self.target].append_trades(data['data'])
+            if data['data']:
+                newest = max(data['data'], key=lambda entry: int(entry['T']))
+                self.set_price(self.symbol, float(newest['p']))
+            if self.tape:
+                self.tape.write(self.target, data['data'])  # one buffered append for the whole batch
+                return
             for entries in data['data']:
                 self.append_data_to_file([entries])
             # self.append_data_to_file([data['data']])
@@ -63,19 +107,21 @@ class BybitTrader:
             self.symbol = symbol
             self.streamType = streamType
             self.target = f'{symbol}_{channel}_{streamType}'
-            self.ws = WebSocket(
-                api_key=self.parent.api_key,
-                api_secret=self.parent.secret_key,
-                testnet=self.testnet,
-                channel_type=channel
-            )
+            self.ws = self.connect(channel, api_key=self.parent.api_key, api_secret=self.parent.secret_key)
             self.running = True
 
+        def connect(self, channel, **kwargs):
+            if self.stream_url:
+                return LocalWebSocket(self.stream_url, channel, testnet=self.testnet, **kwargs)
+            return WebSocket(testnet=self.testnet, channel_type=channel, **kwargs)
+
         def close(self):
             """Close the WebSocket connection and thread cleanly."""
             if self.running:
                 self.ws.ws.close()
                 self.running = False
+            if self.tape:
+                self.tape.flush()
 
         def subscribe_to_trades(self, channel, symbol, callback=None):
             self.callback = callback
@@ -86,6 +132,43 @@ class BybitTrader:
             self.switchTarget("private", symbol, 'update')
             self.ws.order_stream(callback=callback)
 
+        def set_price(self, symbol, price):
+            received = time.time()
+            self.prices[symbol] = (price, received)
+            for listener in self.price_listeners:
+                listener(symbol, price, received)
+
+        def get_price(self, symbol, max_age=None):
+            """Cached last price, or None if missing or older than max_age seconds."""
+            cached = self.prices.get(symbol)
+            if cached is None or (max_age is not None and time.time() - cached[1] > max_age):
+                return None
+            return cached[0]
+
+        def handle_ticker(self, message):
+            data = message.get('data', {})
+            metrics.lag('ticker', message.get('ts'))
+            if data.get('lastPrice'):
+                self.set_price(data['symbol'], float(data['lastPrice']))
+
+        def subscribe_to_ticker(self, symbol, channel='spot'):
+            """Keep self.prices[symbol] current from the public ticker stream."""
+            if self.ticker_ws is None:
+                self.ticker_ws = self.connect(channel)
+            self.ticker_ws.ticker_stream(symbol, callback=self.handle_ticker)
+
+        def start_metrics(self, interval=10.0, port=None):
+            """Export metrics to base_dir/metrics_file every interval seconds, and serve them on port if given."""
+            metrics.add_source('http_pool', self.parent.http.stats)
+            metrics.start_exporter(os.path.join(self.base_dir, self.metrics_file), interval)
+            if port:
+                metrics.serve(port)
+
+        def close_ticker(self):
+            if self.ticker_ws is not None:
+                self.ticker_ws.exit()
+                self.ticker_ws = None
+
         def parseTrade(self,message):
             for data in message['data']:
                 side = data.get('S', 'N/A')  # S is for side, could be 'Buy' or 'Sell'
@@ -110,6 +193,12 @@ class BybitTrader:
                 target = self.target
             current_time = time.time() * 1000  # Current time in milliseconds
             threshold_time = current_time - (seconds * 1000)
+            buffer = self.buffers.get(target)
+            if buffer is not None and buffer.covers(threshold_time):
+                return buffer.records(threshold_time)
+            if self.tape:
+                self.tape.flush(target)  # include trades still sitting in the buffer
+                return tapelib.read_tape(self.tape.path(target), since=threshold_time)
             file_path = os.path.join(self.base_dir, f'{target}_records.json')
             recent_data = []
             try:
@@ -120,8 +209,24 @@ class BybitTrader:
             except Exception as e:
                 return []
 
+        def tick_store(self, target=None):
+            target = target or self.target
+            if target not in self.stores:
+                self.stores[target] = tapelib.TickStore(self.base_dir, target)
+            return self.stores[target]
+
+        def retrieve_range(self, target=None, start=None, end=None):
+            """Columns (ts, price, qty, side) of the columnar history for start <= T < end, as memory-mapped views."""
+            return self.tick_store(target).query(start, end)
+
         def calculate_moving_averages(self, target=None, seconds=3600):
             """Calculate moving average based on time."""
+            if not target:
+                target = self.target
+            threshold_time = time.time() * 1000 - (seconds * 1000)
+            buffer = self.buffers.get(target)
+            if buffer is not None and buffer.covers(threshold_time):
+                return buffer.mean_price(threshold_time)  # answered from memory, no file access
             data = self.retrieve_recent_data(target, seconds)
             if not data:
                 return None
@@ -129,53 +234,57 @@ class BybitTrader:
             count = len(data)
             return total / count if count > 0 else None
 
-    def __init__(self, api_key, secret_key,base_dir = './', testnet=True):
+    def __init__(self, api_key, secret_key,base_dir = './', testnet=True, tape_mode='json', http_pool=None, keep_terminal=1000, order_archive=None,
+                 base_url=None, stream_url=None, scheduler=None):
         self.api_key = api_key
         self.secret_key = secret_key
-        self.url = "https://api-testnet.bybit.com" if testnet else "https://api.bybit.com"
-        self.orders = {}
+        self.url = base_url or ("https://api-testnet.bybit.com" if testnet else "https://api.bybit.com")  # base_url/stream_url point at e.g. mockbybit
+        self.orders = orders.OrderRegistry(keep_terminal, archive_file=order_archive, base_dir=base_dir)  # orderLinkId -> order, indexed by name/orderId/status/category
         self.order_index = 1
         self.base_dir = base_dir
-        self.websocket = self.bbSocket(self, testnet)
+        self.http = http_pool or httppool.pool  # shared keep-alive sessions
+        self.scheduler = scheduler or ratelimit.RequestScheduler()  # per-endpoint budgets and priorities for this account
+        self.rate_limit_retries = 5  # times a request answered with 10006 goes back in the queue
+        self.websocket = self.bbSocket(self, testnet, tape_mode, stream_url=stream_url)
+        self.price_max_age = 5.0  # seconds a cached price is trusted before falling back to REST
 
-    def http_request(self, endpoint, method, params="", info="", verbose=True):
-        timestamp = str(int(time.time() * 1000))
+    def encode_request(self, endpoint, method, params):
         params_encoded = urllib.parse.urlencode(params) if method == "GET" else json.dumps(params)
-        signature = self.generate_signature(params_encoded, timestamp)
-        headers = {
+        url = f"{self.url}{endpoint}"
+        if method == "GET":
+            url += f"?{params_encoded}"
+        return url, params_encoded
+
+    def signed_headers(self, params_encoded):
+        timestamp = str(int(time.time() * 1000))
+        return {
             'X-BAPI-API-KEY': self.api_key,
-            'X-BAPI-SIGN': signature,
+            'X-BAPI-SIGN': self.generate_signature(params_encoded, timestamp),
             'X-BAPI-TIMESTAMP': timestamp,
             'X-BAPI-RECV-WINDOW': '5000',
             'Content-Type': 'application/json'
         }
-        url = f"{self.url}{endpoint}"
-        if method == "GET":
-            url += f"?{params_encoded}"
-            response = requests.get(url, headers=headers)
-        else:
-            response = requests.post(url, headers=headers, data=params_encoded)
-        return response.json()
 
     def generate_signature(self, payload, timestamp):
         query_string = timestamp + self.api_key + '5000' + payload
         signature = hmac.new(bytes(self.secret_key, "utf-8"), query_string.encode("utf-8"), hashlib.sha256).hexdigest()
         return signature
-    def get_index_price(self, symbol, category="spot"):
-        endpoint = "/v5/market/tickers"
-        params = {
-            "symbol": symbol,
-            "category": category
-        }
-        response = self.http_request(endpoint, "GET", params=params, info="Get Index Price")
+
+    def parse_index_price(self, response):
         if response.get('retCode') == 0:
             index_price = response['result']['list'][0]['lastPrice']
             return float(index_price)
         else:
             print(f"Error fetching index price: {response['retMsg']}")
             raise Exception(f"Error fetching index price: {response['retMsg']}") 
-    def create_order(self, category, symbol, side, order_type, qty, price=None, time_in_force="GTC", reduce_only=False, verbose=True):
-        order_link_id = uuid.uuid4().hex
+
+    @staticmethod
+    def new_link_id(prefix=''):
+        """Fresh orderLinkId (at most 36 characters); a prefix lets its owner recognise the order later."""
+        return prefix + uuid.uuid4().hex[:36 - len(prefix)]
+
+    def order_payload(self, category, symbol, side, order_type, qty, price=None, time_in_force="GTC", reduce_only=False, link_prefix=''):
+        order_link_id = self.new_link_id(link_prefix)
         order_payload = {
             "category": category,
             "symbol": symbol,
@@ -188,83 +297,346 @@ class BybitTrader:
         }
         if price:
             order_payload["price"] = str(price)
-        response = self.http_request("/v5/order/create", "POST", order_payload, "Create Order")
+        return order_payload
+
+    def order_created(self, order_payload, response, verbose=True):
+        """Register a /v5/order/create answer in self.orders. Returns the orderId, None if rejected."""
         if response['retCode'] == 0:
-            order_name = f"{symbol}-{self.order_index:04d}"
+            order_name = f"{order_payload['symbol']}-{self.order_index:04d}"
             self.order_index += 1
             order_id = response['result']['orderId']
-            self.orders[order_link_id] = {
+            self.orders[order_payload["orderLinkId"]] = {
                 "name": order_name,
                 "details": order_payload,
                 "status": 'open',
                 "order_id": order_id
             }
             if verbose:
-                print(f"Order {order_name} created: Type={order_type}, Price={price if price else 'Market'}, Category={category}")
+                print(f"Order {order_name} created: Type={order_payload['orderType']}, Price={order_payload.get('price', 'Market')}, Category={order_payload['category']}")
             return order_id
         else:
             if verbose:
                 print(f"Failed to create order: {response['retMsg']}")
             return None
 
-    def cancel_order(self, order_name, verbose=True):
-        for link_id, order_info in self.orders.items():
-            if order_info["name"] == order_name:
-                payload = {
-                    "category": order_info['details']['category'],
-                    "symbol": order_info['details']['symbol'],
-                    "orderLinkId": link_id
+    @staticmethod
+    def batch_results(chunk, response):
+        if response.get('retCode') != 0:
+            return [(None, {'code': response.get('retCode'), 'msg': response.get('retMsg')}) for _ in chunk]
+        listed = response.get('result', {}).get('list', [])
+        ext = response.get('retExtInfo', {}).get('list', [])
+        return [(listed[j] if j < len(listed) else None, ext[j] if j < len(ext) else {'code': 0}) for j in range(len(chunk))]
+
+    def batch_order_payloads(self, orders, link_prefix=''):
+        payloads = []
+        for o in orders:
+            payload = {
+                "symbol": o["symbol"],
+                "side": o["side"],
+                "orderType": o.get("order_type", "Limit"),
+                "qty": str(o["qty"]),
+                "orderLinkId": self.new_link_id(link_prefix),
+                "timeInForce": o.get("time_in_force", "GTC")
+            }
+            if o.get("price"):
+                payload["price"] = str(o["price"])
+            payloads.append(payload)
+        return payloads
+
+    def orders_created(self, category, payloads, results, verbose=True):
+        order_ids = []
+        for payload, (result, ext) in zip(payloads, results):
+            if ext.get('code', 0) == 0 and result and result.get('orderId'):
+                order_name = f"{payload['symbol']}-{self.order_index:04d}"
+                self.order_index += 1
+                self.orders[payload["orderLinkId"]] = {
+                    "name": order_name,
+                    "details": dict(payload, category=category),
+                    "status": 'open',
+                    "order_id": result['orderId']
                 }
-                response = self.http_request("/v5/order/cancel", "POST", payload, "Cancel Order")
-                if response['retCode'] == 0:
-                    self.orders[link_id]['status'] = 'cancelled'
-                    if verbose:
-                        print(f"Order {order_name} cancelled successfully.")
-                else:
-                    if verbose:
-                        print(f"Failed to cancel order {order_name}: {response['retMsg']}")
-                return response
+                order_ids.append(result['orderId'])
+                if verbose:
+                    print(f"Order {order_name} created: Price={payload.get('price', 'Market')}, Category={category}")
+            else:
+                order_ids.append(None)
+                if verbose:
+                    print(f"Failed to create order at {payload.get('price', 'Market')}: {ext.get('msg')}")
+        return order_ids
+
+    @staticmethod
+    def amend_items(symbol, amendments):
+        items = []
+        for a in amendments:
+            item = {"symbol": symbol, "orderId": a["orderId"]}
+            if a.get("price") is not None:
+                item["price"] = str(a["price"])
+            if a.get("qty") is not None:
+                item["qty"] = str(a["qty"])
+            items.append(item)
+        return items
+
+    def orders_amended(self, items, results, verbose=True):
+        done = []
+        for item, (result, ext) in zip(items, results):
+            ok = ext.get('code', 0) == 0 and result is not None
+            done.append(ok)
+            link_id, entry = self.orders.by_order_id(item["orderId"])
+            if ok and entry:
+                entry['details'].update({k: v for k, v in item.items() if k in ('price', 'qty')})
+            elif not ok and verbose:
+                print(f"Failed to amend order {item['orderId']}: {ext.get('msg')}")
+        return done
+
+    def orders_cancelled(self, items, results, verbose=True):
+        done = []
+        for item, (result, ext) in zip(items, results):
+            ok = ext.get('code', 0) == 0 and result is not None
+            done.append(ok)
+            link_id, entry = self.orders.by_order_id(item["orderId"])
+            if ok and entry:
+                self.orders.set_status(link_id, 'cancelled')
+            elif not ok and verbose:
+                print(f"Failed to cancel order {item['orderId']}: {ext.get('msg')}")
+        return done
+
+    @staticmethod
+    def cancel_payload(link_id, order_info):
+        return {
+            "category": order_info['details']['category'],
+            "symbol": order_info['details']['symbol'],
+            "orderLinkId": link_id
+        }
+
+    def order_cancelled(self, order_name, link_id, response, verbose=True):
+        if response['retCode'] == 0:
+            self.orders.set_status(link_id, 'cancelled')
+            if verbose:
+                print(f"Order {order_name} cancelled successfully.")
+        else:
+            if verbose:
+                print(f"Failed to cancel order {order_name}: {response['retMsg']}")
+        return response
+
+    def sync_open_orders(self, category, open_orders):
+        """Fold a complete open order listing into self.orders; tracked orders missing from it are marked fulfilled."""
+        for order in open_orders:
+            order_link_id = order.get("orderLinkId")
+            if order_link_id in self.orders:
+                self.orders[order_link_id]['details'].update(order)
+            else:
+                order_name = f"{order['symbol']}-{self.order_index:04d}"
+                self.order_index += 1
+                order.update({'category':category})
+                self.orders.add(order_link_id, {'name': order_name, 'details': order, 'status': 'open'})
+        for link_id in self.orders.link_ids('open', category) - set([tempO.get('orderLinkId') for tempO in open_orders]):
+            self.orders.set_status(link_id, 'fulfilled')
+        return {"retCode": 0, "retMsg": "OK", "result": {"category": category, "list": open_orders}}
+
+    def apply_order_update(self, order):
+        """Fold one order stream update into self.orders; a fill or cancel makes the order terminal, so retention can archive it."""
+        link_id = order.get('orderLinkId')
+        if link_id not in self.orders:
+            return
+        self.orders[link_id]['details'].update({k: v for k, v in order.items() if k in ('price', 'qty', 'orderStatus', 'cumExecQty', 'avgPrice')})
+        status = orders.STREAM_STATUS.get(order.get('orderStatus'))
+        if status and self.orders[link_id]['status'] == 'open':
+            self.orders.set_status(link_id, status)
+
+
+class BybitTrader(BybitCore):
+    """Bybit v5 REST client: BybitCore plus blocking I/O through the shared sessions and the scheduler."""
+
+    def http_request(self, endpoint, method, params="", info="", verbose=True, priority=None):
+        """Signed request, sent when the scheduler gives this endpoint and priority a slot."""
+        url, params_encoded = self.encode_request(endpoint, method, params)
+        for attempt in range(self.rate_limit_retries + 1):
+            waited = self.scheduler.acquire(endpoint, priority)
+            if waited:
+                metrics.observe('ratelimit_wait_ms', waited * 1000, endpoint=endpoint)
+            headers = self.signed_headers(params_encoded)  # signed after the wait so recv_window still holds
+            try:
+                with metrics.timer('rest_ms', endpoint=endpoint):
+                    if method == "GET":
+                        response = self.http.get(url, headers=headers)
+                    else:
+                        response = self.http.post(url, headers=headers, data=params_encoded)
+                    result = response.json()
+            except Exception:
+                metrics.inc('rest_errors', endpoint=endpoint, kind='exception')
+                raise
+            self.scheduler.update(endpoint, response.headers, result.get('retCode'))
+            if result.get('retCode', 0) != 0:
+                metrics.inc('rest_errors', endpoint=endpoint, kind=str(result.get('retCode')))
+            if result.get('retCode') != ratelimit.RATE_LIMITED:
+                break
+        return result
+
+    def get_index_price(self, symbol, category="spot"):
+        endpoint = "/v5/market/tickers"
+        params = {
+            "symbol": symbol,
+            "category": category
+        }
+        response = self.http_request(endpoint, "GET", params=params, info="Get Index Price")
+        return self.parse_index_price(response)
+
+    def get_last_price(self, symbol, category="spot", max_age=None):
+        """Last price from the websocket cache, REST only when the cache is older than max_age."""
+        price = self.websocket.get_price(symbol, self.price_max_age if max_age is None else max_age)
+        if price is None:
+            price = self.get_index_price(symbol, category)
+            self.websocket.set_price(symbol, price)
+        return price
+
+    def create_order(self, category, symbol, side, order_type, qty, price=None, time_in_force="GTC", reduce_only=False, verbose=True, priority=None,
+                     link_prefix=''):
+        order_payload = self.order_payload(category, symbol, side, order_type, qty, price, time_in_force, reduce_only, link_prefix)
+        response = self.http_request("/v5/order/create", "POST", order_payload, "Create Order", priority=priority)
+        return self.order_created(order_payload, response, verbose)
+
+    def batch_request(self, endpoint, category, items, info, batch_size=10):
+        """Send items through a v5 batch endpoint, batch_size per request.
+
+        Returns one (result, ext) pair per item, in input order. A rejected
+        request gives every item in it ext = {'code': retCode, 'msg': retMsg}.
+        """
+        results = []
+        for i in range(0, len(items), batch_size):
+            chunk = items[i:i + batch_size]
+            response = self.http_request(endpoint, "POST", {"category": category, "request": chunk}, info)
+            results.extend(self.batch_results(chunk, response))
+        return results
+
+    def create_orders(self, category, orders, verbose=True, link_prefix=''):
+        """Batch version of create_order.
+
+        orders: dicts with symbol, side, order_type, qty and optionally price,
+        time_in_force. Returns the orderIds in input order, None where an
+        item was rejected.
+        """
+        payloads = self.batch_order_payloads(orders, link_prefix)
+        results = self.batch_request("/v5/order/create-batch", category, payloads, "Create Orders")
+        return self.orders_created(category, payloads, results, verbose)
+
+    def amend_orders(self, category, symbol, amendments, verbose=True):
+        """Batch amend. amendments: dicts with orderId and the new price and/or qty. Returns True/False per item."""
+        items = self.amend_items(symbol, amendments)
+        return self.orders_amended(items, self.batch_request("/v5/order/amend-batch", category, items, "Amend Orders"), verbose)
+
+    def cancel_orders(self, category, symbol, order_ids, verbose=True):
+        """Batch cancel by orderId. Returns True/False per item."""
+        items = [{"symbol": symbol, "orderId": order_id} for order_id in order_ids]
+        return self.orders_cancelled(items, self.batch_request("/v5/order/cancel-batch", category, items, "Cancel Orders"), verbose)
+
+    def cancel_order(self, order_name, verbose=True):
+        link_id, order_info = self.orders.by_name(order_name)
+        if order_info:
+            payload = self.cancel_payload(link_id, order_info)
+            response = self.http_request("/v5/order/cancel", "POST", payload, "Cancel Order")
+            return self.order_cancelled(order_name, link_id, response, verbose)
         if verbose:
             print(f"Order {order_name} not found.")
         return {"error": "Order not found"}
 
-    def get_open_orders(self, category, verbose=True):
+    def iter_pages(self, endpoint, params, page_size=50, prefetch=False, info=""):
+        """Yield the 'list' of each page of a cursor-paginated v5 GET endpoint."""
+        def fetch(cursor):
+            payload = dict(params, limit=page_size)
+            if cursor:
+                payload["cursor"] = cursor
+            response = self.http_request(endpoint, "GET", payload, info)
+            if response.get("retCode") != 0:
+                raise Exception(f"Error fetching {endpoint}: {response.get('retMsg')}")
+            result = response.get("result", {})
+            return result.get("list", []), result.get("nextPageCursor") or None
+        return httppool.paginate(fetch, prefetch)
+
+    def iter_orders(self, category, page_size=50, prefetch=False, **filters):
+        """Stream every open order of a category across all pages, one page in memory at a time."""
+        params = {"category": category, "openOnly": 0}
+        params.update(filters)
+        for page in self.iter_pages("/v5/order/realtime", params, page_size, prefetch, "Get Open Orders"):
+            yield from page
+
+    def iter_executions(self, category, symbol=None, start=None, end=None, page_size=100, prefetch=False):
+        """Stream fills with start <= execTime <= end (ms, at most 7 days apart), newest first."""
+        params = {"category": category}
+        if symbol:
+            params["symbol"] = symbol
+        if start is not None:
+            params["startTime"] = int(start)
+        if end is not None:
+            params["endTime"] = int(end)
+        for page in self.iter_pages("/v5/execution/list", params, page_size, prefetch, "Get Executions"):
+            yield from page
+
+    def get_executions(self, category, symbol=None, start=None, end=None, window=24 * 3600 * 1000, workers=4):
+        """Every fill between start and end (ms, default the last 7 days), oldest first.
+
+        The range is cut into `window`-ms slices that are paged through in
+        parallel, so a long lookback costs about as much as its busiest slice.
+        """
+        end = int(time.time() * 1000) if end is None else int(end)
+        start = end - 7 * 24 * 3600 * 1000 if start is None else int(start)
+        slices = [(t, min(t + window - 1, end)) for t in range(start, end + 1, window)]
+        with ThreadPoolExecutor(min(workers, len(slices)) or 1) as executor:
+            parts = list(executor.map(lambda s: list(self.iter_executions(category, symbol, s[0], s[1], prefetch=True)), slices))
+        executions = {}
+        for part in parts:
+            for e in part:
+                executions[e.get("execId")] = e  # slices share no edges, but never count a fill twice
+        return sorted(executions.values(), key=lambda e: int(e.get("execTime", 0)))
+
+    def get_order(self, category, order_id):
+        """Current state of one order, open or closed: /v5/order/realtime by orderId, then /v5/order/history.
+
+        None when the exchange knows no such order or could not be asked.
+        """
+        for endpoint in ("/v5/order/realtime", "/v5/order/history"):
+            try:
+                response = self.http_request(endpoint, "GET", {"category": category, "orderId": order_id}, "Get Order")
+            except Exception:
+                return None
+            if response.get("retCode") != 0:
+                return None
+            found = response.get("result", {}).get("list", [])
+            if found:
+                return found[0]
+        return None
+
+    def get_orders(self, category, order_ids, workers=4):
+        """{orderId: get_order()} for several orders, looked up in parallel."""
+        order_ids = list(order_ids)
+        if not order_ids:
+            return {}
+        with ThreadPoolExecutor(min(workers, len(order_ids))) as executor:
+            return dict(zip(order_ids, executor.map(lambda order_id: self.get_order(category, order_id), order_ids)))
+
+    def get_open_orders(self, category, verbose=True, prefetch=False):
         if category not in ['spot', 'linear', 'inverse', 'option']:
             if verbose:
                 print("Invalid category specified")
             return {"error": "Invalid category specified"}
-        payload = {
-            "category": category,
-            "openOnly": 0,
-            "limit": 50
-        }
-        response = self.http_request("/v5/order/realtime", "GET", payload, "Get Open Orders")
-        if response.get("retCode") == 0:
-            open_orders = response.get("result", {}).get("list", [])
-            existing_link_ids = set(self.orders.keys())
-            for order in open_orders:
-                order_link_id = order.get("orderLinkId")
-                if order_link_id in self.orders:
-                    self.orders[order_link_id]['details'].update(order)
-                else:
-                    order_name = f"{order['symbol']}-{self.order_index:04d}"
-                    self.order_index += 1
-                    order.update({'category':category})
-                    self.orders[order_link_id] = {'name': order_name, 'details': order, 'status': 'open'}
-            for link_id in existing_link_ids - set([tempO.get('orderLinkId') for tempO in open_orders]):
-                if self.orders[link_id]['status'] == 'open' and self.orders[link_id]['details']['category'] == category:
-                    self.orders[link_id]['status'] = 'fulfilled'
-        return response
+        open_orders = []
+        try:
+            for order in self.iter_orders(category, prefetch=prefetch):
+                open_orders.append(order)
+        except Exception as e:
+            # never mark anything fulfilled from a partial listing
+            if verbose:
+                print(e)
+            return {"retCode": -1, "retMsg": str(e)}
+        return self.sync_open_orders(category, open_orders)
 
     def show_orders(self, category=None, verbose=True):
         """Show orders filtered by category."""
         if category:
             self.get_open_orders(category)  # Update the list of orders for the specified category
         if verbose:
-            for order in self.orders.values():
-                if category is None or order['details']['category'] == category:
-                    details = order['details']
-                    print(f"{order['name']}: Symbol={details['symbol']}, Qty={details['qty']}, Price={details.get('price', 'N/A')}, Status={order['status']}")
+            for link_id, order in self.orders.select(category=category):
+                details = order['details']
+                print(f"{order['name']}: Symbol={details['symbol']}, Qty={details['qty']}, Price={details.get('price', 'N/A')}, Status={order['status']}")
 
 # This script is now set up to conditionally print information based on the `verbose` parameter, focusing only on the critical details needed for clarity and brevity.
 # from bybitTrader import BybitTrader
@@ -0,0 +1,928 @@
+import csv
+import numpy as np
+from bybitTrader import BybitTrader
+from statestore import StateManager, JournalStateManager, SqliteStateManager
+from ledger import TradeLedger
+import time
+import os
+import hashlib
+import napilib as na
+import metrics
+import ratelimit
+import logpipe
+import signal
+import sys
+import random, socket
+import logging, threading
+import requests as requests
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def get_latest_logs(file_name, num_lines=30):
+    try:
+        return logpipe.tail(num_lines, file_name)  # from memory under logpipe.setup(), else read from the file's end
+    except Exception as e:
+        logging.error(f"Error reading log file {file_name}: {e}")
+        return []
+
+def retry_with_backoff(retries=8, backoff_in_seconds=1, max_backoff=60):
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            owner = args[0] if args and hasattr(args[0], 'graceful_shutdown') else None  # the GridTrader being called
+            max_retries = retries
+            for attempt in range(max_retries):
+                try:
+                    return func(*args, **kwargs)
+                except (requests.exceptions.RequestException, ConnectionError, TimeoutError, socket.gaierror, socket.timeout) as e:
+                    metrics.inc('retries', func=func.__name__, kind='connection')
+                    # rate limits are absorbed by BybitTrader's scheduler, so this only waits out outages
+                    wait_time = min(backoff_in_seconds * (2 ** attempt), max_backoff) + random.uniform(0, 1)
+                    logging.error(f"Connection error: {e}. Retrying in {wait_time:.2f} seconds...")
+                    time.sleep(wait_time)
+                except Exception as e:
+                    if "insufficient" in str(e).lower():
+                        metrics.inc('retries', func=func.__name__, kind='insufficient')
+                        logging.error(f"Insufficient balance: {e}. Retrying in {wait_time:.2f} seconds...")
+                        time.sleep(wait_time)
+                    elif "nodename nor servname provided" in str(e).lower():
+                        metrics.inc('retries', func=func.__name__, kind='dns')
+                        logging.error(f"DNS resolution error: {e}. Retrying in {wait_time:.2f} seconds...")
+                        time.sleep(wait_time)
+                    else:
+                        logging.critical(f"Unhandled error: {e}. Aborting operation.")
+                        metrics.inc('errors', func=func.__name__)
+                        if owner:
+                            owner.graceful_shutdown()
+                        raise
+                time.sleep(3)
+            logging.critical("Max retries exceeded. Could not complete the request.")
+            metrics.inc('errors', func=func.__name__)
+            if owner:
+                owner.graceful_shutdown()
+            raise
+        return wrapper
+    return decorator
+
+class GridTrader:
+    def __init__(self, api_key, secret_key,naDB,grid_size, buy_size, initial_price, symbol, polling_interval=5, testnet=True,session='2', event_driven=False, debounce=1.0,
+                 trader=None, notion=None, state_dir='./', csv_file='trades_record.csv', install_signals=True, state_namespace=None, state_backend='json',
+                 metrics_port=None, trade_log='ledger'):
+        # trader/notion/state_dir/csv_file let a backtest swap in a simulated exchange and scratch files
+        self.trader = trader or BybitTrader(api_key, secret_key, testnet=testnet)
+        self.db = naDB
+        self.logDB = na.db(naDB.secret,'36458b82ef9740b68eb401b732136476')
+        self.OpenOrderDB = na.db(naDB.secret,'06fd76415bf4441f81aeaeb1f8fd12b2')
+        self.notion = notion or na.writer(spill_file=os.path.join(state_dir, 'notion_queue.jsonl'))  # all Notion writes go through here, off the order path
+        self.notion.register(self.db, self.logDB, self.OpenOrderDB)  # tokens stay in memory, the spill file only names the databases
+        self.grid_size = grid_size
+        self.buy_size = buy_size
+        self.initial_price = initial_price
+        self.symbol = symbol
+        self.lock = threading.Lock()
+        self.host = None  # set when run inside a GridHost
+        self.metrics_port = metrics_port  # serve Prometheus text on localhost:metrics_port while running
+
+        # Initialize state manager and load states
+        # 'json' rewrites whole files on checkpoint, 'journal' also appends every mutation as it happens,
+        # 'sqlite' keeps state and the trade ledger in an indexed database
+        if state_backend == 'journal':
+            self.state_manager = JournalStateManager(state_dir, state_namespace)
+        elif state_backend == 'sqlite':
+            self.state_manager = SqliteStateManager(state_dir, state_namespace, csv_file=csv_file)
+        else:
+            self.state_manager = StateManager(state_dir, state_namespace)
+        self.buy_orders = self.state_manager.load_state('buy_orders', {})
+        self.sell_orders = self.state_manager.load_state('sell_orders', {})
+        self.order_tracking = self.state_manager.load_state('order_tracking', {})
+        portfolio_data = self.state_manager.load_state('portfolio', {'cumulative_income': 0.0, 'balance': 2000.0, 'eth_holdings': 0.0})
+
+        self.cumulative_income = portfolio_data['cumulative_income']
+        self.balance = portfolio_data['balance']
+        self.eth_holdings = portfolio_data['eth_holdings']
+        self.portfolio_value = self.get_portfolio_value()
+
+        self.csv_file = csv_file
+        # 'ledger' appends pair trades to a columnar TradeLedger next to csv_file ({name}_ledger/), 'csv' to csv_file itself
+        self.trade_log = trade_log
+        self.ledger = None
+        self.batch_size = 3  # How often to batch save
+        self.pending_updates = []
+        self.polling_interval = polling_interval
+        self.session = session
+        self.openOrders = self.state_manager.load_state('open_orders', {})
+        self.event_driven = event_driven  # react to ticker updates instead of polling the REST price
+        self.debounce = debounce  # seconds before re-entering a grid cell counts as a new crossing
+        self.current_level = None
+        self.level_entered = {}  # grid level -> time price last moved into it
+        self.recheck_at = None  # when a debounced cell is looked at again
+        self.latest_price = None  # (price, receive time) last pushed by the ticker stream
+        self.price_event = threading.Event()  # set by on_price, wakes the price worker
+        self.price_thread = None
+        self.stopping = False
+        self.shutdown_requested = threading.Event()  # set off the main thread, where sys.exit cannot stop the process
+        self.tick_to_order_ms = deque(maxlen=1000)  # price receipt -> buy order acknowledged
+        self.replayed = set()  # orderIds whose fill reconcile() booked; their late stream update is skipped
+        # orderLinkIds this grid sends start with this, so reconcile() adopts only our own orders (stable across restarts)
+        self.link_prefix = 'g' + hashlib.sha1(f'{session}:{symbol}'.encode()).hexdigest()[:6] + '-'
+
+        if trade_log == 'ledger':
+            self.ledger = TradeLedger(os.path.splitext(csv_file)[0] + '_ledger')
+            if not self.ledger.exists() and os.path.exists(csv_file):
+                logging.info(f"Imported {self.ledger.import_csv(csv_file)} trades from {csv_file} into {self.ledger.dir}")
+        # Initialize CSV if it doesn't exist
+        elif not os.path.exists(self.csv_file):
+            with open(self.csv_file, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['Buy Price', 'Sell Price', 'Quantity', 'Pair Profit', 'Cumulative Income', 'Portfolio Value', 'Balance', 'ETH Holdings', 'session'])
+
+        # Signal handling for graceful shutdown
+        if install_signals:
+            signal.signal(signal.SIGINT, self.graceful_shutdown)
+            signal.signal(signal.SIGTERM, self.graceful_shutdown)
+
+
+    @retry_with_backoff(retries=8, backoff_in_seconds=1)
+    def place_buy_order(self, price):
+        try:
+            if price not in self.buy_orders:
+                order_id = self.trader.create_order("spot", self.symbol, "Buy", "limit", self.buy_size, price=price, link_prefix=self.link_prefix)
+                if order_id:
+                    self.buy_orders[price] = order_id
+                    # self.state_manager.save_state('buy_orders', self.buy_orders)
+                    logging.info(f"Placed buy order at {price}, Order ID: {order_id}")
+                else:
+                    logging.warning(f"Failed to place buy order at {price}, no Order ID returned.")
+            else:
+                logging.info(f"{price} buy order already exists")
+        except:
+            logging.error(f"Exception occurred while placing buy order at {price}: {e}")
+            logging.error(f"Error occurred on line {traceback.format_exc().splitlines()[-2]}")
+            raise
+
+    def place_sell_order(self, buy_price, qty):
+        try:
+            sell_price = round(buy_price + self.grid_size, 2)
+            if sell_price not in self.sell_orders:
+                sell_order_id = self.send_sell_order(sell_price, qty)
+                if sell_order_id:
+                    self.sell_orders[sell_price] = sell_order_id
+                    # self.state_manager.save_state('sell_orders', self.sell_orders)
+                    self.note_open_sell(sell_order_id, sell_price, qty)
+                    logging.info(f"Placed sell order at {sell_price}")
+                    return sell_order_id
+                else:
+                    logging.warning(f"Failed to place sell order at {sell_price}, no Order ID returned.")
+            else:
+                logging.info(f"Sell order at {sell_price} already exists.")
+        except Exception as e:
+            logging.error(f"Exception occurred while placing sell order at {sell_price}: {e}")
+            logging.error(f"Error occurred on line {traceback.format_exc().splitlines()[-2]}")
+            raise
+            # logging.error(f"Stack trace: {traceback.format_exc()}")
+
+    @retry_with_backoff(retries=8, backoff_in_seconds=1)
+    def send_sell_order(self, sell_price, qty):
+        """REST part of place_sell_order: the new sell's orderId, or None. Touches no grid state."""
+        return self.trader.create_order("spot", self.symbol, "Sell", "limit", qty, price=sell_price,
+                                        priority=ratelimit.HIGH, link_prefix=self.link_prefix)  # ahead of new buys and price polls
+
+    @retry_with_backoff(retries=8, backoff_in_seconds=1)
+    def send_sell_orders(self, pairs):
+        """REST part of place_sell_orders: one batch of sells for (buy_price, qty) pairs, orderIds in order, None where rejected."""
+        if not pairs:
+            return []
+        return self.trader.create_orders("spot", [
+            {"symbol": self.symbol, "side": "Sell", "order_type": "limit", "qty": qty, "price": round(buy_price + self.grid_size, 2)}
+            for buy_price, qty in pairs], verbose=False, link_prefix=self.link_prefix)
+
+    def place_sell_orders(self, pairs):
+        """Batch place_sell_order. pairs: (buy_price, qty). Returns sell orderIds in order, None where none was placed."""
+        sell_prices = [round(buy_price + self.grid_size, 2) for buy_price, qty in pairs]
+        todo = [i for i, price in enumerate(sell_prices) if price not in self.sell_orders]
+        sell_ids = [None] * len(pairs)
+        if not todo:
+            return sell_ids
+        order_ids = self.send_sell_orders([pairs[i] for i in todo])
+        for i, order_id in zip(todo, order_ids):
+            if order_id:
+                self.sell_orders[sell_prices[i]] = order_id
+                self.note_open_sell(order_id, sell_prices[i], pairs[i][1])
+                sell_ids[i] = order_id
+            else:
+                logging.warning(f"Failed to place sell order at {sell_prices[i]} in batch")
+        logging.info(f"Placed {sum(1 for x in sell_ids if x)}/{len(todo)} sell orders in batch")
+        return sell_ids
+
+    def note_open_sell(self, sell_order_id, sell_price, qty):
+        temp = na.row()
+        temp.set('Name', "open", 'title')
+        temp.set('side', 'Sell', 'select')
+        temp.set('session', self.session, 'select')
+        temp.set('price', sell_price, 'number')
+        temp.set('qty', qty, 'number')
+        temp.set('status','open','select')
+        self.openOrders.update({sell_order_id:self.notion.add(self.OpenOrderDB, temp)})
+
+    @retry_with_backoff(retries=8, backoff_in_seconds=1)
+    def place_ladder(self, levels):
+        """Place buy orders at every level that has none, in batches instead of one request each."""
+        levels = [float(round(level, 2)) for level in levels]  # plain floats, not np.float64, as keys and in the payloads
+        levels = [level for level in levels if level not in self.buy_orders]
+        if not levels:
+            return []
+        order_ids = self.trader.create_orders("spot", [
+            {"symbol": self.symbol, "side": "Buy", "order_type": "limit", "qty": self.buy_size, "price": level}
+            for level in levels], verbose=False, link_prefix=self.link_prefix)
+        placed = []
+        for level, order_id in zip(levels, order_ids):
+            if order_id:
+                self.buy_orders[level] = order_id
+                placed.append(level)
+            else:
+                logging.warning(f"Failed to place buy order at {level} in batch")
+        logging.info(f"Placed {len(placed)}/{len(levels)} ladder buy orders: {placed}")
+        return placed
+
+    def seed_ladder(self, current_price, depth):
+        """Lay down buys on the `depth` grid levels at and below current_price."""
+        top = self.calculate_next_buy_level(current_price)
+        return self.place_ladder([top - k * self.grid_size for k in range(depth)])
+
+    @retry_with_backoff(retries=8, backoff_in_seconds=1)
+    def cancel_ladder(self, levels=None):
+        """Cancel resting buys (all of them by default). Levels whose buy already filled are left alone."""
+        filled = {details['buy-price'] for details in self.order_tracking.values()}
+        levels = list(self.buy_orders) if levels is None else [float(round(level, 2)) for level in levels]
+        levels = [level for level in levels if level in self.buy_orders and level not in filled]
+        if not levels:
+            return []
+        results = self.trader.cancel_orders("spot", self.symbol, [self.buy_orders[level] for level in levels], verbose=False)
+        cancelled = []
+        for level, ok in zip(levels, results):
+            if ok:
+                self.buy_orders.pop(level, None)
+                cancelled.append(level)
+            else:
+                logging.warning(f"Failed to cancel buy order at {level} in batch")
+        logging.info(f"Cancelled {len(cancelled)}/{len(levels)} ladder buy orders")
+        return cancelled
+
+    def update_portfolio(self, price, qty, fee, side):
+        if side == 'Buy':
+            self.balance -= (price * qty) + fee
+            self.eth_holdings += qty
+        elif side == 'Sell':
+            self.balance += (price * qty) - fee
+            self.eth_holdings -= qty
+        self.get_portfolio_value()
+        self.state_manager.note('portfolio', self.portfolio_state())
+
+    def portfolio_state(self):
+        return {
+            'cumulative_income': self.cumulative_income,
+            'balance': self.balance,
+            'eth_holdings': self.eth_holdings
+        }
+
+    def get_portfolio_value(self):
+        current_eth_price = self.trader.get_last_price(self.symbol)  # cached ticker price, REST only if stale
+        portfolio_value = self.balance + (self.eth_holdings * current_eth_price)
+        self.portfolio_value = portfolio_value
+        return portfolio_value
+
+    def record_trade(self, buy_price, sell_price, qty, pair_profit, ts=None, buy_ts=None):
+        # ts / buy_ts: sell and buy fill times in ms, kept by the ledger for time-based analytics
+        self.cumulative_income += pair_profit
+        self.state_manager.note('portfolio', self.portfolio_state())
+        portfolio_value = self.get_portfolio_value()
+        trade = [buy_price, sell_price, qty, pair_profit, self.cumulative_income, portfolio_value, self.balance, self.eth_holdings, self.session]
+        ts = ts or int(time.time() * 1000)
+        self.pending_updates.append((trade, ts, buy_ts))
+        self.state_manager.add_trade(trade, int(float(ts)))
+        if len(self.pending_updates) >= self.batch_size:
+            self.flush_updates()
+
+    def flush_updates(self):
+        try:
+            if self.ledger is not None:
+                self.ledger.extend(self.pending_updates)
+            else:
+                with open(self.csv_file, 'a', newline='') as f:
+                    writer = csv.writer(f)
+                    writer.writerows([trade for trade, ts, buy_ts in self.pending_updates])  # Write all pending updates at once
+            self.pending_updates.clear()
+            logging.info("Flushed pending trades to the trade log.")
+        except Exception as e:
+            logging.error(f"Error flushing updates: {e}")
+
+    @metrics.timed('callback_ms', handler='order_fill')
+    def handle_filled_order_callback(self, message):
+        with metrics.locked(self.lock, 'grid'):
+            self.process_order_updates(message)
+
+    def process_order_updates(self, message):  # caller holds self.lock
+        if not message:
+            return
+        try:
+            for order in message['data']:
+                order_status = order.get('orderStatus')
+                order_id = order.get('orderId')
+                metrics.lag('order', order.get('updatedTime'))
+                self.trader.apply_order_update(order)  # filled and cancelled orders become terminal in the registry
+                logging.info(f"Processing order with ID: {order_id}, Status: {order_status}")
+
+                if order_status == 'Filled' and order_id in self.replayed:
+                    self.replayed.discard(order_id)  # already accounted for by reconcile()
+                    logging.info(f"Order {order_id} was replayed at startup, skipping")
+                elif order_status == 'Filled':
+                    filled_price = float(order['avgPrice'])
+                    qty = float(order['cumExecQty'])
+                    fee = float(order['cumExecFee'])
+                    logging.info(f"Order filled - ID: {order_id}, Side: {order['side']}, Price: {filled_price}, Qty: {qty}")
+                    
+                    if order['side'] == 'Buy':
+                        sell_order_id = self.place_sell_order(float(order['price']), qty)
+                        self.track_buy_fill(order, sell_order_id)
+                        logging.info(f"Placed corresponding sell order with ID: {sell_order_id}")
+
+                    elif order['side'] == 'Sell':
+                        contribution = filled_price * qty - fee
+                        buy_order_details = self.order_tracking.pop(order_id, None)
+                        if buy_order_details:
+                            pair_profit = contribution + buy_order_details['contribution']
+                            self.record_trade(
+                                buy_order_details['filled_price'], 
+                                filled_price, 
+                                qty, 
+                                pair_profit,
+                                order.get('updatedTime'),
+                                buy_order_details.get('filled_time')
+                            )
+                            self.update_portfolio(filled_price, qty, fee, 'Sell')
+                            logging.info(f"Processed filled sell order - Pair Profit: {pair_profit}")
+                            # self.state_manager.save_state('order_tracking', self.order_tracking)
+                            
+                            temp = na.row()
+                            temp.set('Name', "filled", 'title')
+                            temp.set('side', order['side'], 'select')
+                            temp.set('contribution', contribution, 'number')
+                            temp.set('pair_profit', pair_profit, 'number')
+                            temp.set('price', round(float(order['price']), 2), 'number')
+                            temp.set('session', self.session, 'select')
+                            temp.set('pair', f"buy price: {buy_order_details['buy-price']}", 'rich_text')
+                            temp.set('qty', qty, 'number')
+                            temp.set('crypto_holding', self.eth_holdings, 'number')
+                            temp.set('portfolio_value',self.portfolio_value, 'number')
+                            self.notion.add(self.db, temp, keep=False)
+                            logging.info(f"Queued filled sell order for database")
+                            
+                            try:
+                                openRowID = self.openOrders[order_id]
+                                openSellOrder = na.row()
+                                openSellOrder.set('status','filled','select')
+                                self.notion.update(openRowID, openSellOrder, self.OpenOrderDB, last=True)  # PATCH only the status, no GET needed
+                                logging.info(f'queued mark for sell order {openRowID}')
+                            except Exception as e:
+                                logging.error(f'Failed to mark sell order as closed: {e}')
+                                logging.error(f'Exception type: {type(e).__name__}')
+                                # logging.error(f'Traceback: {traceback.format_exc()}')
+                            self.buy_orders.pop(buy_order_details["buy-price"], None)
+                            self.sell_orders.pop(round(float(order["price"]), 2))
+                        else:
+                            logging.warning('Caught sell order with no matching buy pair.')
+
+        except KeyError as e:
+            logging.error(f"KeyError in filled order callback: {e}")
+            logging.error(f'Error occurred on line {traceback.format_exc().splitlines()[-2]}')
+            logging.error(f'Traceback: {traceback.format_exc()}')
+            raise
+        except TypeError as e:
+            logging.error(f"TypeError occurred: {e}")
+            logging.error(f'Error occurred on line {traceback.format_exc().splitlines()[-2]}')
+            logging.error(f'Traceback: {traceback.format_exc()}')
+            raise
+        except Exception as e:
+            logging.error(f"Unhandled error in filled order callback: {e}")
+            logging.error(f'Error occurred on line {traceback.format_exc().splitlines()[-2]}')
+            logging.error(f'Traceback: {traceback.format_exc()}')
+            raise
+
+    def track_buy_fill(self, order, sell_order_id):
+        """Pair a filled buy with the sell that closes it, and book the buy."""
+        filled_price = float(order['avgPrice'])
+        qty = float(order['cumExecQty'])
+        fee = float(order['cumExecFee'])
+        contribution = - (filled_price * qty) - fee
+        self.order_tracking[sell_order_id] = {
+            'filled_price': filled_price,
+            'buy-price': round(float(order['price']), 2),
+            'qty': qty,
+            'fee': fee,
+            'contribution': contribution,
+            'filled_time': int(order.get('updatedTime') or time.time() * 1000)
+        }
+        self.update_portfolio(filled_price, qty, fee, 'Buy')
+        # self.state_manager.save_state('order_tracking', self.order_tracking)
+
+        temp = na.row()
+        temp.set('Name', "filled", 'title')
+        temp.set('side', order['side'], 'select')
+        temp.set('contribution', contribution, 'number')
+        temp.set('session', self.session, 'select')
+        temp.set('price', round(float(order['price']), 2), 'number')
+        temp.set('qty', qty, 'number')
+        temp.set('crypto_holding', self.eth_holdings, 'number')
+        temp.set('portfolio_value',self.portfolio_value, 'number')
+        self.notion.add(self.db, temp, keep=False)
+        logging.info(f"Queued filled buy order for database")
+
+    @metrics.timed('reconcile_ms')
+    def reconcile(self, lookback=7 * 24 * 3600, workers=4):
+        """Bring the checkpointed state in line with the exchange before trading resumes.
+
+        Open orders and the last `lookback` seconds of fills are fetched in
+        parallel (the fills in day-sized slices, each paged on its own).
+        Buys that filled while we were down are replayed through the normal
+        fill handling, or paired with a sell that was already placed; sells
+        that filled are replayed as pair trades. A tracked order that is
+        neither open nor in the fills is looked up on its own before
+        anything is decided: a buy is dropped only if it was cancelled with
+        nothing executed, a sell is placed again only if it was cancelled,
+        and only for what it did not sell. Orders whose fate is unknown are
+        left as they are. Sells are sent without holding the grid lock.
+        """
+        if not hasattr(self.trader, 'get_executions'):
+            return None  # simulated exchange, nothing to reconcile against
+        started = time.time()
+        now_ms = int(started * 1000)
+        with ThreadPoolExecutor(2) as pool:
+            open_future = pool.submit(lambda: list(self.trader.iter_orders("spot", prefetch=True, symbol=self.symbol)))
+            fills_future = pool.submit(self.trader.get_executions, "spot", self.symbol, now_ms - lookback * 1000, now_ms, workers=workers)
+            open_orders, executions = open_future.result(), fills_future.result()
+        filled = self.filled_orders(executions)
+        with metrics.locked(self.lock, 'grid'):
+            unaccounted = self.unaccounted_orders({o['orderId'] for o in open_orders}, filled)
+        statuses = self.trader.get_orders("spot", unaccounted, workers=workers) if unaccounted else {}
+        with metrics.locked(self.lock, 'grid'):
+            report, to_sell, to_replace = self.apply_reconciliation(open_orders, executions, statuses)
+        pairs = [(float(o['price']), float(o['cumExecQty'])) for o in to_sell] + [(d['buy-price'], d['qty']) for _, d in to_replace]
+        sell_ids = self.send_sell_orders(pairs)
+        sell_ids = [sell_id or self.send_sell_order(round(buy_price + self.grid_size, 2), qty)
+                    for sell_id, (buy_price, qty) in zip(sell_ids, pairs)]
+        with metrics.locked(self.lock, 'grid'):
+            self.book_reconciled_sells(report, to_sell, to_replace, sell_ids)
+            self.checkpoint_state()
+        report['seconds'] = round(time.time() - started, 3)
+        logging.info(f"Reconciled {self.symbol} against the exchange: {report}")
+        return report
+
+    @staticmethod
+    def filled_orders(executions):
+        """Fold executions (oldest first) into one 'Filled' order update per fully filled order."""
+        fills = {}
+        for e in executions:
+            f = fills.setdefault(e['orderId'], {'orderId': e['orderId'], 'orderLinkId': e.get('orderLinkId'), 'symbol': e.get('symbol'),
+                                                'side': e['side'], 'price': e['orderPrice'], 'qty': float(e['orderQty']),
+                                                'value': 0.0, 'cumExecQty': 0.0, 'cumExecFee': 0.0})
+            f['cumExecQty'] += float(e['execQty'])
+            f['cumExecFee'] += float(e['execFee'])
+            f['value'] += float(e['execPrice']) * float(e['execQty'])
+            f['updatedTime'] = e['execTime']
+        filled = {}
+        for order_id, f in fills.items():
+            if f['cumExecQty'] > 0 and f['cumExecQty'] >= f['qty'] - 1e-12:
+                filled[order_id] = dict(f, orderStatus='Filled', avgPrice=str(f['value'] / f['cumExecQty']),
+                                        cumExecQty=str(f['cumExecQty']), cumExecFee=str(f['cumExecFee']), qty=str(f['qty']))
+        return filled
+
+    def unaccounted_orders(self, open_ids, filled):  # caller holds self.lock
+        """Tracked orders that are neither open nor filled in the window, whose final state must be looked up."""
+        buy_prices = {details['buy-price'] for details in self.order_tracking.values()}
+        ids = [order_id for level, order_id in self.buy_orders.items()
+               if order_id not in open_ids and order_id not in filled and round(float(level), 2) not in buy_prices]
+        return ids + [sell_id for sell_id in self.order_tracking if sell_id not in open_ids and sell_id not in filled]
+
+    @staticmethod
+    def final_state(order):
+        """'filled' (fully, or partly and then cancelled), 'cancelled' (nothing executed) or None (still live, or unknown)."""
+        if not order or order.get('orderStatus') in ('New', 'PartiallyFilled', 'Untriggered', 'Created'):
+            return None
+        if float(order.get('cumExecQty') or 0) > 0:
+            return 'filled'
+        if order.get('orderStatus') in ('Cancelled', 'Rejected', 'Deactivated', 'PartiallyFilledCanceled'):
+            return 'cancelled'
+        return None
+
+    def apply_reconciliation(self, open_orders, executions, statuses=None):  # caller holds self.lock
+        """Book what happened while we were down. Returns (report, missed buy fills that need a sell, (old sell id, pair) to sell again)."""
+        statuses = statuses or {}
+        report = {'open_orders': len(open_orders), 'executions': len(executions), 'buy_fills': 0, 'sell_fills': 0,
+                  'paired': 0, 'adopted': 0, 'dropped': 0, 'replaced': 0, 'partial': 0, 'unconfirmed': 0}
+        for book in (self.buy_orders, self.sell_orders):  # the json backend hands price keys back as strings
+            for key in [k for k in book if not isinstance(k, float)]:
+                book[round(float(key), 2)] = book.pop(key)
+        open_by_id = {o['orderId']: o for o in open_orders}
+        filled = self.filled_orders(executions)
+        for sell_id, details in self.order_tracking.items():  # sell_orders is only a price index of order_tracking
+            self.sell_orders[round(details['buy-price'] + self.grid_size, 2)] = sell_id
+        tracked = set(self.order_tracking)
+        untracked_sells = {}  # sell price -> open or filled sell order we hold no pair for
+        for o in list(open_orders) + [f for f in filled.values()]:
+            if o['side'] == 'Sell' and o['orderId'] not in tracked:
+                untracked_sells.setdefault(round(float(o['price']), 2), o)
+
+        # buys that filled while we were not listening
+        buy_prices = {details['buy-price'] for details in self.order_tracking.values()}
+        missed = []
+        for level, order_id in list(self.buy_orders.items()):
+            if order_id in open_by_id or level in buy_prices:
+                continue
+            if order_id in filled:
+                missed.append(filled[order_id])
+                continue
+            state = self.final_state(statuses.get(order_id))
+            if state == 'filled':  # before the window, or partly filled and then cancelled
+                missed.append(dict(statuses[order_id], orderStatus='Filled'))
+                if statuses[order_id].get('orderStatus') != 'Filled':
+                    report['partial'] += 1
+            elif state == 'cancelled':
+                self.buy_orders.pop(level)  # the grid places it again
+                report['dropped'] += 1
+            else:
+                logging.warning(f"Buy {order_id} at {level} is not open and its final state is unknown, leaving it tracked")
+                report['unconfirmed'] += 1
+        to_sell = []
+        for order in sorted(missed, key=lambda o: int(o['updatedTime'])):
+            sell_price = round(float(order['price']) + self.grid_size, 2)
+            sell = untracked_sells.get(sell_price)
+            if sell is not None and int(sell.get('createdTime') or sell['updatedTime']) >= int(order['updatedTime']):
+                # the sell went out after this buy filled, but before the last checkpoint caught it
+                del untracked_sells[sell_price]
+                self.track_buy_fill(order, sell['orderId'])
+                self.sell_orders[sell_price] = sell['orderId']
+                report['paired'] += 1
+            else:
+                to_sell.append(order)
+            self.replayed.add(order['orderId'])
+            report['buy_fills'] += 1
+
+        # sells that filled, or were cancelled, while we were not listening
+        to_replace = []
+        def fill_time(item):
+            return int((filled.get(item[0]) or statuses.get(item[0]) or {}).get('updatedTime', 0))
+        for sell_id, details in sorted(self.order_tracking.items(), key=fill_time):
+            if sell_id in open_by_id:
+                continue
+            fill = filled.get(sell_id)
+            if fill is None:
+                state = self.final_state(statuses.get(sell_id))
+                if state is None:
+                    logging.warning(f"Sell {sell_id} for the buy at {details['buy-price']} is not open and its final state is unknown, leaving it tracked")
+                    report['unconfirmed'] += 1
+                    continue
+                if state == 'cancelled':
+                    logging.warning(f"Sell {sell_id} for the buy at {details['buy-price']} was cancelled on the exchange, placing it again")
+                    self.sell_orders.pop(round(details['buy-price'] + self.grid_size, 2), None)
+                    to_replace.append((sell_id, details))
+                    continue
+                fill = dict(statuses[sell_id], orderStatus='Filled')
+            sold = float(fill['cumExecQty'])
+            rest = None
+            if sold < details['qty'] - 1e-12:  # cancelled part way: book what sold, sell the rest again
+                share = sold / details['qty']
+                self.order_tracking[sell_id] = dict(details, qty=sold, fee=details['fee'] * share, contribution=details['contribution'] * share)
+                rest = dict(details, qty=details['qty'] - sold, fee=details['fee'] * (1 - share), contribution=details['contribution'] * (1 - share))
+                buy_id = self.buy_orders.get(details['buy-price'])
+            self.process_order_updates({'data': [fill]})
+            self.replayed.add(sell_id)
+            report['sell_fills'] += 1
+            if rest is not None:
+                if buy_id is not None:
+                    self.buy_orders[details['buy-price']] = buy_id  # the level stays taken until the rest is sold
+                self.openOrders.pop(sell_id, None)
+                to_replace.append((sell_id, rest))
+                report['partial'] += 1
+
+        # grid buys this grid placed after the last checkpoint
+        known = set(self.buy_orders.values())
+        for o in open_orders:
+            level = round(float(o['price']), 2)
+            if o['side'] == 'Buy' and o['orderId'] not in known and level not in self.buy_orders \
+                    and str(o.get('orderLinkId') or '').startswith(self.link_prefix) \
+                    and self.calculate_next_buy_level(level) == level:
+                self.buy_orders[level] = o['orderId']
+                report['adopted'] += 1
+        for sell_id in [k for k in self.openOrders if k not in self.order_tracking and k not in open_by_id]:
+            self.openOrders.pop(sell_id)  # Notion rows of pairs that are closed
+        return report, to_sell, to_replace
+
+    def book_reconciled_sells(self, report, to_sell, to_replace, sell_ids):  # caller holds self.lock
+        """Record the sells reconcile() sent (sell_ids line up with to_sell + to_replace)."""
+        for order, sell_id in zip(to_sell, sell_ids):
+            sell_price = round(float(order['price']) + self.grid_size, 2)
+            if sell_id:
+                self.sell_orders[sell_price] = sell_id
+                self.note_open_sell(sell_id, sell_price, float(order['cumExecQty']))
+            else:
+                logging.error(f"Could not place the sell at {sell_price} for missed buy {order['orderId']}")
+            self.track_buy_fill(order, sell_id)
+        for (old_id, details), sell_id in zip(to_replace, sell_ids[len(to_sell):]):
+            sell_price = round(details['buy-price'] + self.grid_size, 2)
+            self.order_tracking.pop(old_id, None)
+            self.order_tracking[sell_id or old_id] = details  # kept under the old id if it failed, so the next start retries
+            if not sell_id:
+                logging.error(f"Could not place the sell at {sell_price} again for the buy at {details['buy-price']}")
+                continue
+            self.sell_orders[sell_price] = sell_id
+            self.note_open_sell(sell_id, sell_price, details['qty'])
+            row_id = self.openOrders.pop(old_id, None)
+            if row_id:
+                cancelled = na.row()
+                cancelled.set('status', 'cancelled', 'select')
+                self.notion.update(row_id, cancelled, self.OpenOrderDB, last=True)
+            report['replaced'] += 1
+
+    @metrics.timed('checkpoint_ms')
+    def checkpoint_state(self):
+        self.state_manager.save_all({
+            'buy_orders': self.buy_orders,
+            'sell_orders': self.sell_orders,
+            'order_tracking': self.order_tracking,
+            'open_orders': self.openOrders,
+            'portfolio': self.portfolio_state()
+        })
+        logging.info("State checkpointed successfully.")
+        
+    def calculate_next_buy_level(self, current_price):
+        n = np.floor((current_price - self.initial_price) / self.grid_size)
+        next_level = self.initial_price + n * self.grid_size
+        return round(next_level, 2)
+
+    def on_price(self, symbol, price, received):
+        """Price stream listener, on pybit's ticker thread: only records the price and wakes the price worker."""
+        if symbol != self.symbol:
+            return
+        self.latest_price = (price, received)
+        self.price_event.set()
+
+    def handle_price(self, price, received):
+        """Act on a streamed price when it moved into a new grid cell (price worker thread).
+
+        A cell re-entered within `debounce` seconds is not given up but
+        looked at again once the price has stayed there that long.
+        """
+        level = self.calculate_next_buy_level(price)
+        now = time.time()
+        if level != self.current_level:
+            self.current_level = level
+            last = self.level_entered.get(level)
+            self.level_entered[level] = now
+            self.recheck_at = None
+            if last is not None and now - last < self.debounce:
+                self.recheck_at = now + self.debounce  # price is chattering around a boundary
+                return
+        elif self.recheck_at is None or now < self.recheck_at:
+            return
+        self.recheck_at = None
+        with metrics.locked(self.lock, 'grid'):
+            if level in self.buy_orders:
+                return
+            self.place_buy_order(level)
+        self.tick_to_order_ms.append((time.time() - received) * 1000)
+        metrics.observe('tick_to_order_ms', self.tick_to_order_ms[-1], symbol=self.symbol)
+        logging.info(f"Price {price} crossed into level {level}, tick-to-order {self.tick_to_order_ms[-1]:.1f} ms")
+
+    def price_worker(self):
+        """Event mode loop: handles the newest streamed price, and polls like check_price while the stream is stale."""
+        while not self.stopping:
+            wait = self.polling_interval if self.recheck_at is None else max(self.recheck_at - time.time(), 0.0)
+            self.price_event.wait(wait)
+            self.price_event.clear()
+            if self.stopping:
+                break
+            try:
+                if self.latest_price is None or self.trader.websocket.get_price(self.symbol, self.trader.price_max_age) is None:
+                    self.check_price(self.trader.get_last_price(self.symbol))  # nothing streamed yet or the ticker went quiet: poll
+                else:
+                    self.handle_price(*self.latest_price)
+            except Exception as e:
+                logging.error(f"Price worker for {self.symbol} failed to act on a price: {e}")
+            if self.shutdown_requested.is_set():
+                break
+
+    def start_price_worker(self):
+        if self.price_thread is None or not self.price_thread.is_alive():
+            self.stopping = False
+            self.current_level = None
+            self.price_thread = threading.Thread(target=self.price_worker, name=f'price-{self.symbol}', daemon=True)
+            self.price_thread.start()
+
+    def stop_price_worker(self, timeout=5.0):
+        self.stopping = True
+        self.price_event.set()
+        if self.price_thread is not None and self.price_thread is not threading.current_thread():
+            self.price_thread.join(timeout)
+        self.price_thread = None
+
+    def check_price(self, current_price):
+        """One polling step: make sure the grid level under current_price has a buy order."""
+        next_buy_level = self.calculate_next_buy_level(current_price)
+        with metrics.locked(self.lock, 'grid'):
+            if next_buy_level not in self.buy_orders:
+                self.place_buy_order(next_buy_level)
+
+    def latency_stats(self):
+        """p50/p99/max tick-to-order latency in ms over the last 1000 orders."""
+        if not self.tick_to_order_ms:
+            return None
+        samples = np.array(self.tick_to_order_ms)
+        return {'count': len(samples), 'p50': float(np.percentile(samples, 50)), 'p99': float(np.percentile(samples, 99)), 'max': float(samples.max())}
+
+    @retry_with_backoff(retries=12, backoff_in_seconds=1)
+    def run(self):
+        count = 0
+        self.trader.websocket.start_metrics(port=self.metrics_port)
+        for i in range(30):
+            try:
+                self.trader.websocket.subscribe_to_order_updates(self.symbol, self.handle_filled_order_callback)
+                break
+            except Exception as e:
+                logging.error(f"Failed to subscribe to WebSocket updates: {e}")
+                logging.error(f"Error occurred on line {traceback.format_exc().splitlines()[-2]}")
+                if i == 29:
+                    logging.critical("Max retries reached. Could not subscribe to WebSocket updates.")
+                    raise
+                else:
+                    time.sleep(5)
+        self.reconcile()  # subscribed first, so no fill falls between the two
+        try:
+            self.trader.websocket.subscribe_to_ticker(self.symbol)
+        except Exception as e:
+            logging.error(f"Failed to subscribe to ticker, prices will come from REST: {e}")
+            if self.event_driven:
+                raise
+        if self.event_driven:
+            if self.on_price not in self.trader.websocket.price_listeners:
+                self.trader.websocket.price_listeners.append(self.on_price)
+            self.start_price_worker()
+            self.on_price(self.symbol, self.trader.get_last_price(self.symbol), time.time())
+        while True:
+            if not self.trader.websocket.ws.is_connected():
+                raise
+            else:
+                print('connected')
+            if not self.event_driven:
+                self.check_price(self.trader.get_last_price(self.symbol))
+            else:
+                stats = self.latency_stats()
+                if stats and count >= 12:
+                    logging.info(f"Tick-to-order latency: {stats}")
+            if count >= 12:
+                self.checkpoint_state()
+                count = 0
+            count += 1
+            if self.shutdown_requested.wait(self.polling_interval):
+                self.graceful_shutdown()
+
+
+    def graceful_shutdown(self, signum=None, frame=None):
+        if self.host:
+            return self.host.graceful_shutdown(signum, frame)  # stop every grid in the process, not just this one
+        if threading.current_thread() is not threading.main_thread():
+            logging.critical("Shutdown requested off the main thread, handing it to the run loop")
+            self.shutdown_requested.set()  # sys.exit here would only end this thread
+            return
+        logging.info("Shutting down gracefully...")
+        self.stop_price_worker()
+        if self.pending_updates:
+            self.flush_updates()
+        self.checkpoint_state()
+        metrics.export(os.path.join(self.trader.base_dir, self.trader.websocket.metrics_file))
+        self.state_manager.close()
+        temp = na.row()
+        temp.set('Name','shutdown','title')
+        temp.set('detail','\n'.join(get_latest_logs('grid_trader.log',15)),'rich_text')
+        temp
+        self.notion.add(self.logDB, temp, keep=False)
+        self.notion.close(timeout=20)  # whatever is not sent by then stays in the spill file
+        sys.exit(0)
+
+
+class GridHost:
+    """Runs several GridTraders (one per symbol) in one process.
+
+    All grids share one BybitTrader, so one private order stream, one
+    ticker socket, one HTTP pool and one Notion writer. Order updates are
+    split by symbol and handed to the grid trading that symbol. Each grid
+    keeps its own state files, prefixed with its symbol.
+    """
+    def __init__(self, api_key, secret_key, naDB, testnet=True, polling_interval=5, state_dir='./', session='2', state_backend='json', metrics_port=None,
+                 trader=None, notion=None, install_signals=True):
+        self.trader = trader or BybitTrader(api_key, secret_key, testnet=testnet)
+        self.naDB = naDB
+        self.notion = notion or na.writer(spill_file=os.path.join(state_dir, 'notion_queue.jsonl'))
+        self.polling_interval = polling_interval
+        self.state_dir = state_dir
+        self.session = session
+        self.state_backend = state_backend
+        self.metrics_port = metrics_port
+        self.grids = {}  # symbol -> GridTrader
+        self.shutdown_requested = threading.Event()
+        if install_signals:
+            signal.signal(signal.SIGINT, self.graceful_shutdown)
+            signal.signal(signal.SIGTERM, self.graceful_shutdown)
+
+    def add(self, symbol, grid_size, buy_size, initial_price, event_driven=False, debounce=1.0, session=None):
+        grid = GridTrader(None, None, self.naDB, grid_size, buy_size, initial_price, symbol,
+                          polling_interval=self.polling_interval, session=session or self.session,
+                          event_driven=event_driven, debounce=debounce, trader=self.trader, notion=self.notion,
+                          state_dir=self.state_dir, csv_file=os.path.join(self.state_dir, f'{symbol}_trades_record.csv'),
+                          install_signals=False, state_namespace=symbol, state_backend=self.state_backend)
+        grid.host = self
+        self.grids[symbol] = grid
+        return grid
+
+    def dispatch(self, message):
+        """Private order stream callback: hand each grid only its own symbol's orders."""
+        if not message:
+            return
+        by_symbol = {}
+        for order in message.get('data', []):
+            by_symbol.setdefault(order.get('symbol'), []).append(order)
+        for symbol, orders in by_symbol.items():
+            grid = self.grids.get(symbol)
+            if grid:
+                try:
+                    grid.handle_filled_order_callback(dict(message, data=orders))
+                except Exception as e:  # one grid's failure must not cost the others their updates
+                    logging.error(f"Grid {symbol} failed to process its order updates: {e}")
+            else:
+                logging.warning(f"Order update for unmanaged symbol {symbol}")
+
+    @retry_with_backoff(retries=12, backoff_in_seconds=1)
+    def run(self):
+        stream = self.trader.websocket
+        stream.start_metrics(port=self.metrics_port)
+        for i in range(30):
+            try:
+                stream.subscribe_to_order_updates('ALL', self.dispatch)
+                break
+            except Exception as e:
+                logging.error(f"Failed to subscribe to WebSocket updates: {e}")
+                if i == 29:
+                    logging.critical("Max retries reached. Could not subscribe to WebSocket updates.")
+                    raise
+                time.sleep(5)
+        with ThreadPoolExecutor(max(len(self.grids), 1)) as pool:
+            list(pool.map(lambda grid: grid.reconcile(), self.grids.values()))
+        for symbol, grid in self.grids.items():
+            try:
+                stream.subscribe_to_ticker(symbol)
+            except Exception as e:
+                logging.error(f"Failed to subscribe to {symbol} ticker, prices will come from REST: {e}")
+            if grid.event_driven:
+                if grid.on_price not in stream.price_listeners:
+                    stream.price_listeners.append(grid.on_price)
+                grid.start_price_worker()  # one per grid, so a slow order on one symbol never holds up another's prices
+                grid.on_price(symbol, self.trader.get_last_price(symbol), time.time())
+        count = 0
+        while True:
+            if not stream.ws.is_connected():
+                raise ConnectionError("Order stream disconnected")
+            for symbol, grid in self.grids.items():
+                if not grid.event_driven:
+                    try:
+                        grid.check_price(self.trader.get_last_price(symbol))
+                    except Exception as e:
+                        logging.error(f"Grid {symbol} failed to act on its price: {e}")
+            if count >= 12:
+                for grid in self.grids.values():
+                    grid.checkpoint_state()
+                count = 0
+            count += 1
+            if self.shutdown_requested.wait(self.polling_interval):
+                self.graceful_shutdown()
+
+    def graceful_shutdown(self, signum=None, frame=None):
+        if threading.current_thread() is not threading.main_thread():
+            logging.critical("Shutdown requested off the main thread, handing it to the run loop")
+            self.shutdown_requested.set()
+            return
+        logging.info(f"Shutting down {len(self.grids)} grids gracefully...")
+        for grid in self.grids.values():
+            grid.stop_price_worker()
+        for grid in self.grids.values():
+            if grid.pending_updates:
+                grid.flush_updates()
+            grid.checkpoint_state()
+            grid.state_manager.close()
+        metrics.export(os.path.join(self.trader.base_dir, self.trader.websocket.metrics_file))
+        temp = na.row()
+        temp.set('Name', 'shutdown', 'title')
+        temp.set('detail', '\n'.join(get_latest_logs('grid_trader.log', 15)), 'rich_text')
+        if self.grids:
+            self.notion.add(next(iter(self.grids.values())).logDB, temp, keep=False)
+        self.notion.close(timeout=20)
+        sys.exit(0)
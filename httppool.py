@@ -0,0 +1,124 @@
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+# Shared keep-alive HTTP sessions for BybitTrader and napilib.
+# One requests.Session per host keeps TCP/TLS connections open between calls.
+
+
+class SessionPool:
+    def __init__(self, pool_size=4, max_size=16, timeout=(3.05, 10), keep_alive=True, block=False):
+        self.pool_size = pool_size  # number of host pools each adapter caches
+        self.max_size = max_size  # connections kept open per host
+        self.timeout = timeout  # (connect, read) seconds, used when a call passes none
+        self.keep_alive = keep_alive
+        self.block = block  # wait for a free connection instead of opening an extra one
+        self.lock = threading.Lock()
+        self.sessions = {}  # host -> requests.Session
+        self.counts = {}  # host -> {'requests', 'errors', 'seconds'}
+
+    def configure(self, **kwargs):
+        """Change pool settings. Existing sessions are closed and rebuilt lazily."""
+        with self.lock:
+            for key, value in kwargs.items():
+                if not hasattr(self, key):
+                    raise AttributeError(f"Unknown pool setting: {key}")
+                setattr(self, key, value)
+            for s in self.sessions.values():
+                s.close()
+            self.sessions = {}
+
+    def session(self, url):
+        host = requests.utils.urlparse(url).netloc
+        with self.lock:
+            if host not in self.sessions:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.max_size, pool_block=self.block)
+                s.mount('https://', adapter)
+                s.mount('http://', adapter)
+                if not self.keep_alive:
+                    s.headers['Connection'] = 'close'
+                self.sessions[host] = s
+                self.counts[host] = {'requests': 0, 'errors': 0, 'seconds': 0.0}
+            return host, self.sessions[host]
+
+    def request(self, method, url, **kwargs):
+        host, s = self.session(url)
+        kwargs.setdefault('timeout', self.timeout)
+        counts = self.counts[host]
+        try:
+            response = s.request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            counts['errors'] += 1
+            raise
+        counts['requests'] += 1
+        counts['seconds'] += response.elapsed.total_seconds()
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def stats(self):
+        """Per host request counts plus connection pool usage from urllib3."""
+        report = {}
+        with self.lock:
+            for host, s in self.sessions.items():
+                counts = dict(self.counts[host])
+                counts['avg_ms'] = counts['seconds'] * 1000 / counts['requests'] if counts['requests'] else None
+                opened, served, idle = 0, 0, 0
+                for adapter in set(s.adapters.values()):
+                    for key in adapter.poolmanager.pools.keys():
+                        pool = adapter.poolmanager.pools[key]
+                        opened += pool.num_connections
+                        served += pool.num_requests
+                        idle += pool.pool.qsize() if pool.pool else 0
+                counts.update({'connections_opened': opened, 'pool_requests': served, 'idle_slots': idle})
+                report[host] = counts
+        return report
+
+    def close(self):
+        with self.lock:
+            for s in self.sessions.values():
+                s.close()
+            self.sessions = {}
+
+
+pool = SessionPool()  # the process-wide default
+
+
+def configure(**kwargs):
+    pool.configure(**kwargs)
+
+
+def request(method, url, **kwargs):
+    return pool.request(method, url, **kwargs)
+
+
+def stats():
+    return pool.stats()
+
+
+def paginate(fetch, prefetch=False):
+    """Yield pages from a cursor-paginated API, holding at most two pages at a time.
+
+    fetch(cursor) returns (items, next_cursor) and is first called with None.
+    With prefetch the next page is requested in a background thread while the
+    caller works through the current one.
+    """
+    if not prefetch:
+        cursor = None
+        while True:
+            items, cursor = fetch(cursor)
+            yield items
+            if not cursor:
+                return
+    with ThreadPoolExecutor(1) as executor:
+        future = executor.submit(fetch, None)
+        while future is not None:
+            items, cursor = future.result()
+            future = executor.submit(fetch, cursor) if cursor else None
+            yield items
@@ -0,0 +1,245 @@
+import os
+import csv
+import json
+import numpy as np
+
+# Append-only columnar ledger of completed grid pairs, in place of
+# trades_record.csv. One fixed-width file per column inside the ledger
+# directory (like tapelib.TickStore), session names dictionary-encoded in
+# sessions.json. Reads are memory-mapped, and every analytic below is a
+# handful of whole-column NumPy passes, so millions of pairs take
+# milliseconds instead of a CSV re-parse.
+
+# trades_record.csv columns, in order
+CSV_HEADER = ['Buy Price', 'Sell Price', 'Quantity', 'Pair Profit', 'Cumulative Income', 'Portfolio Value', 'Balance', 'ETH Holdings', 'session']
+CSV_FIELDS = ['buy_price', 'sell_price', 'qty', 'pair_profit', 'cumulative_income', 'portfolio_value', 'balance', 'eth_holdings', 'session']
+
+
+class TradeLedger:
+    """Columns of every pair trade, oldest first.
+
+    ts and buy_ts are the sell and buy fill times in ms (0 where unknown,
+    e.g. rows imported from a CSV). session is an index into sessions().
+    """
+
+    COLUMNS = {
+        'ts': np.int64,
+        'buy_ts': np.int64,
+        'buy_price': np.float64,
+        'sell_price': np.float64,
+        'qty': np.float64,
+        'pair_profit': np.float64,
+        'cumulative_income': np.float64,
+        'portfolio_value': np.float64,
+        'balance': np.float64,
+        'eth_holdings': np.float64,
+        'session': np.int32,
+    }
+
+    def __init__(self, path):
+        self.dir = path
+        self.maps = None
+        self.names = None
+        self.repair()
+
+    def column_path(self, name):
+        return os.path.join(self.dir, f'{name}.bin')
+
+    def exists(self):
+        return os.path.exists(self.column_path('ts'))
+
+    def __len__(self):
+        if not self.exists():
+            return 0
+        return min(os.path.getsize(self.column_path(name)) // np.dtype(dtype).itemsize if os.path.exists(self.column_path(name)) else 0
+                   for name, dtype in self.COLUMNS.items())
+
+    def repair(self):
+        """Cut every column back to the shortest one, dropping a row torn by a crash mid-append."""
+        n = len(self)
+        for name, dtype in self.COLUMNS.items():
+            path = self.column_path(name)
+            if os.path.exists(path) and os.path.getsize(path) > n * np.dtype(dtype).itemsize:
+                with open(path, 'r+b') as f:
+                    f.truncate(n * np.dtype(dtype).itemsize)
+
+    # sessions
+    def sessions(self):
+        if self.names is None:
+            path = os.path.join(self.dir, 'sessions.json')
+            self.names = []
+            if os.path.exists(path):
+                with open(path, 'r') as f:
+                    self.names = json.load(f)
+        return self.names
+
+    def session_code(self, name):
+        names = self.sessions()
+        name = str(name)
+        if name not in names:
+            names.append(name)
+            tmp = os.path.join(self.dir, 'sessions.json.tmp')
+            with open(tmp, 'w') as f:
+                json.dump(names, f)
+            os.replace(tmp, os.path.join(self.dir, 'sessions.json'))
+        return names.index(name)
+
+    # writing
+    def extend(self, rows):
+        """Append rows of (csv_row, ts, buy_ts); csv_row in trades_record.csv column order."""
+        if not rows:
+            return 0
+        os.makedirs(self.dir, exist_ok=True)
+        columns = {name: [] for name in self.COLUMNS}
+        for row, ts, buy_ts in rows:
+            columns['ts'].append(int(float(ts)) if ts else 0)
+            columns['buy_ts'].append(int(float(buy_ts)) if buy_ts else 0)
+            for field, value in zip(CSV_FIELDS[:-1], row[:8]):
+                columns[field].append(float(value))
+            columns['session'].append(self.session_code(row[8]))
+        for name, dtype in self.COLUMNS.items():
+            with open(self.column_path(name), 'ab') as f:
+                np.asarray(columns[name], dtype=dtype).tofile(f)
+        self.maps = None  # file sizes changed, remap on next read
+        return len(rows)
+
+    # reading
+    def open(self):
+        if self.maps is None:
+            n = len(self)
+            if n == 0:
+                return False
+            self.maps = {name: np.memmap(self.column_path(name), dtype=dtype, mode='r', shape=(n,)) for name, dtype in self.COLUMNS.items()}
+        return True
+
+    def columns(self, session=None, start=None, end=None):
+        """{column: array} for one session (name) and/or start <= ts < end (ms). Unfiltered columns are views of the files."""
+        if not self.open():
+            return {name: np.empty(0, dtype=dtype) for name, dtype in self.COLUMNS.items()}
+        if session is None and start is None and end is None:
+            return dict(self.maps)
+        mask = np.ones(len(self.maps['ts']), dtype=bool)
+        if session is not None:
+            names = self.sessions()
+            mask &= self.maps['session'] == (names.index(str(session)) if str(session) in names else -1)
+        if start is not None:
+            mask &= self.maps['ts'] >= start
+        if end is not None:
+            mask &= self.maps['ts'] < end
+        return {name: col[mask] for name, col in self.maps.items()}
+
+    # analytics
+    def equity_curve(self, session=None, start=None, end=None):
+        """(ts, cumulative realized pair profit) after every trade."""
+        c = self.columns(session, start, end)
+        return c['ts'], np.cumsum(c['pair_profit'])
+
+    def drawdown(self, session=None, start=None, end=None):
+        """Largest fall of the realized equity curve from a previous high, with where it happened."""
+        ts, equity = self.equity_curve(session, start, end)
+        if not len(equity):
+            return {'max_drawdown': 0.0, 'peak_ts': None, 'trough_ts': None, 'series': equity}
+        equity = np.concatenate(([0.0], equity))  # the curve starts flat, so a first losing trade is a drawdown
+        series = np.maximum.accumulate(equity) - equity
+        trough = int(series.argmax())
+        peak = int(equity[:trough + 1].argmax())
+        return {'max_drawdown': float(series[trough]), 'peak_ts': int(ts[peak - 1]) if peak else None,
+                'trough_ts': int(ts[trough - 1]) if trough else None, 'series': series[1:]}
+
+    def holding_times(self, session=None, start=None, end=None):
+        """Seconds between the buy and the sell fill, for the trades where both are known."""
+        c = self.columns(session, start, end)
+        known = (c['buy_ts'] > 0) & (c['ts'] > 0)
+        return (c['ts'][known] - c['buy_ts'][known]) / 1000.0
+
+    def turnover(self, session=None, start=None, end=None):
+        c = self.columns(session, start, end)
+        return float((c['qty'] * (c['buy_price'] + c['sell_price'])).sum())
+
+    def profit_by(self, interval_ms, session=None, start=None, end=None):
+        """Realized profit and pair count per interval_ms bucket of sell time: (bucket starts, profit, pairs)."""
+        c = self.columns(session, start, end)
+        buckets, index = np.unique(c['ts'] // interval_ms, return_inverse=True)
+        return (buckets * interval_ms, np.bincount(index, weights=c['pair_profit'], minlength=len(buckets)),
+                np.bincount(index, minlength=len(buckets)))
+
+    def session_summary(self):
+        """{session: aggregates}, every session at once from one pass over the columns."""
+        if not self.open():
+            return {}
+        c = self.maps
+        code = np.asarray(c['session'])
+        k = len(self.sessions())
+        profit = np.asarray(c['pair_profit'])
+        pairs = np.bincount(code, minlength=k)
+        total = np.bincount(code, weights=profit, minlength=k)
+        wins = np.bincount(code, weights=profit > 0, minlength=k)
+        turnover = np.bincount(code, weights=c['qty'] * (c['buy_price'] + c['sell_price']), minlength=k)
+        known = (c['buy_ts'] > 0) & (c['ts'] > 0)
+        held = np.bincount(code[known], weights=(c['ts'][known] - c['buy_ts'][known]) / 1000.0, minlength=k)
+        held_n = np.bincount(code[known], minlength=k)
+        order = np.argsort(code, kind='stable')  # rows grouped by session, still in time order inside each
+        present, starts, drawdowns = self.session_drawdowns(code[order], profit[order])
+        ts = np.asarray(c['ts'])[order]
+        first = np.full(k, -1, dtype=np.int64)
+        last = np.full(k, -1, dtype=np.int64)
+        drawdown = np.zeros(k)
+        if len(present):
+            first[present] = np.minimum.reduceat(np.where(ts > 0, ts, np.iinfo(np.int64).max), starts)
+            last[present] = np.maximum.reduceat(ts, starts)
+            drawdown[present] = drawdowns
+        summary = {}
+        for i, name in enumerate(self.sessions()):
+            if not pairs[i]:
+                continue
+            summary[name] = {
+                'pairs': int(pairs[i]),
+                'profit': float(total[i]),
+                'mean_profit': float(total[i] / pairs[i]),
+                'win_rate': float(wins[i] / pairs[i]),
+                'turnover': float(turnover[i]),
+                'mean_holding_s': float(held[i] / held_n[i]) if held_n[i] else None,
+                'max_drawdown': float(drawdown[i]),
+                'first_ts': int(first[i]) if 0 < first[i] < np.iinfo(np.int64).max else None,
+                'last_ts': int(last[i]) if last[i] > 0 else None,
+            }
+        return summary
+
+    @staticmethod
+    def session_drawdowns(code, profit):
+        """Max drawdown of every session's own equity curve, for rows already grouped by session.
+
+        Returns (sessions present, start row of each, their drawdowns) without a Python loop over sessions.
+        """
+        if not len(code):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+        boundary = np.r_[True, code[1:] != code[:-1]]
+        starts = np.flatnonzero(boundary)
+        equity = np.cumsum(profit)
+        equity -= np.repeat(equity[starts] - profit[starts], np.diff(np.r_[starts, len(code)]))  # restart at every session
+        # lift each session above everything before it, so one running max never carries over a boundary
+        span = float(np.abs(equity).max()) * 2 + 1
+        lift = np.cumsum(boundary) * span
+        peaks = np.maximum(np.maximum.accumulate(equity + lift) - lift, 0.0)  # every curve starts at 0
+        return code[starts], starts, np.maximum.reduceat(peaks - equity, starts)
+
+    # conversion
+    def import_csv(self, csv_file):
+        """Append every row of a trades_record.csv (no timestamps there, so ts = buy_ts = 0)."""
+        if not os.path.exists(csv_file):
+            return 0
+        with open(csv_file, 'r', newline='') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # header
+            rows = [(r, 0, 0) for r in reader if len(r) >= 9]
+        return self.extend(rows)
+
+    def to_csv(self, csv_file, session=None):
+        """Write the ledger out in trades_record.csv layout."""
+        c = self.columns(session)
+        names = self.sessions()
+        with open(csv_file, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_HEADER)
+            for i in range(len(c['ts'])):
+                writer.writerow([float(c[field][i]) for field in CSV_FIELDS[:-1]] + [names[c['session'][i]]])
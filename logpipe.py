@@ -0,0 +1,238 @@
+import os
+import queue
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from logging.handlers import QueueHandler, RotatingFileHandler
+
+# Non-blocking logging for the trading process. Loggers only put records on
+# a queue; one listener thread formats them and does the file and console
+# I/O, a whole batch per write. The last records are also kept in memory,
+# unformatted, so the shutdown report reads them without touching the log
+# file.
+#
+#   logpipe.setup('grid_trader.log')      # once, at startup
+#   logpipe.tail(15)                      # last 15 lines, formatted
+
+FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+# record attributes nobody reads unless the format asks for them, with the switch that skips collecting each
+# (logging HOWTO, "Optimization"); the caller lookup walks the stack on every call
+LEAN = (('_srcfile', ('pathname', 'filename', 'module', 'funcName', 'lineno')),
+        ('logThreads', ('thread', 'threadName')),
+        ('logProcesses', ('process',)),
+        ('logMultiprocessing', ('processName',)))
+
+
+class LogRing(logging.Handler):
+    """The last `capacity` records, formatted only when tail() asks for them."""
+    def __init__(self, capacity=1000, formatter=None):
+        super().__init__()
+        self.records = deque(maxlen=capacity)
+        self.setFormatter(formatter or logging.Formatter(FORMAT))
+
+    def handle(self, record):  # no handler lock needed, deque.append is atomic
+        if self.filter(record):
+            self.records.append(record)
+            return True
+        return False
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def tail(self, num_lines=30):
+        records = list(self.records)[-num_lines:] if num_lines > 0 else []
+        return [self.format(record) for record in records]
+
+
+class FastQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener.
+
+    The stdlib prepare() formats every record on the calling thread. Here
+    only what cannot wait is done: the message is frozen if it has args
+    (they may change later) and a traceback is rendered while it exists.
+    """
+    def handle(self, record):  # SimpleQueue.put is thread safe, skip the handler lock
+        if self.filter(record):
+            self.queue.put(self.prepare(record))
+            return True
+        return False
+
+    def prepare(self, record):
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_STOP = object()
+
+
+class LogListener:
+    """Drains the queue on one thread. Every wakeup takes all queued records
+    (up to batch_size), and stream handlers get them as one write and one
+    flush instead of a write, flush and rollover check per record. Between
+    batches it sleeps `interval` seconds, so a burst of fills costs one
+    wakeup instead of one GIL handoff per record."""
+    def __init__(self, q, handlers, batch_size=1024, interval=0.05):
+        self.queue = q
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.interval = interval
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='logpipe', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.queue.put(_STOP)
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [r for r in batch if r is not _STOP]
+            for handler in self.handlers:
+                self.write(handler, records)
+            if len(records) != len(batch):
+                return
+            if self.interval:
+                time.sleep(self.interval)
+
+    @staticmethod
+    def write(handler, records):
+        records = [r for r in records if r.levelno >= handler.level]
+        if not records:
+            return
+        if not isinstance(handler, logging.StreamHandler):
+            for record in records:
+                handler.handle(record)
+            return
+        try:
+            text = ''.join(handler.format(r) + handler.terminator for r in records)
+            handler.acquire()
+            try:
+                if isinstance(handler, RotatingFileHandler) and handler.maxBytes > 0 and handler.stream is not None:
+                    handler.stream.seek(0, os.SEEK_END)
+                    if handler.stream.tell() + len(text) >= handler.maxBytes:
+                        handler.doRollover()
+                if handler.stream is None:  # a FileHandler opened with delay=True, or just rolled over
+                    handler.stream = handler._open()
+                handler.stream.write(text)
+                handler.flush()
+            finally:
+                handler.release()
+        except Exception:
+            handler.handleError(records[0])
+
+
+class LogPipeline:
+    def __init__(self, file_name='grid_trader.log', level=logging.INFO, max_bytes=5 * 1024 * 1024, backup_count=5,
+                 console=True, ring_size=1000, fmt=FORMAT):
+        formatter = logging.Formatter(fmt)
+        self.fmt = fmt
+        self.saved = {}  # logging module switches changed by install(lean=True)
+        self.file_name = file_name
+        self.level = level
+        self.handlers = []
+        if file_name:
+            self.handlers.append(RotatingFileHandler(file_name, maxBytes=max_bytes, backupCount=backup_count))
+        if console:
+            self.handlers.append(logging.StreamHandler())
+        for handler in self.handlers:
+            handler.setLevel(level)
+            handler.setFormatter(formatter)
+        self.queue = queue.SimpleQueue()
+        self.queue_handler = FastQueueHandler(self.queue)
+        self.ring = LogRing(ring_size, formatter)
+        self.listener = LogListener(self.queue, self.handlers)
+        self.logger = None
+
+    def install(self, logger=None, lean=False):
+        """Route logger (the root logger by default) through the queue and start the listener thread.
+
+        lean stops logging from collecting record attributes the format
+        never prints. It is process wide, and undone by close().
+        """
+        if lean:
+            for switch, fields in LEAN:
+                if not any(f'%({field})' in self.fmt for field in fields):
+                    self.saved[switch] = getattr(logging, switch)
+                    setattr(logging, switch, None if switch == '_srcfile' else False)
+        self.logger = logger or logging.getLogger()
+        self.logger.setLevel(self.level)
+        self.logger.addHandler(self.ring)
+        self.logger.addHandler(self.queue_handler)
+        self.listener.start()
+        return self
+
+    def tail(self, num_lines=30):
+        return self.ring.tail(num_lines)
+
+    def close(self):
+        """Detach, then drain the queue and close the files."""
+        if self.logger is None:
+            return
+        self.logger.removeHandler(self.queue_handler)
+        self.logger.removeHandler(self.ring)
+        self.logger = None
+        self.listener.stop()
+        for handler in self.handlers:
+            handler.close()
+        for switch, value in self.saved.items():
+            setattr(logging, switch, value)
+        self.saved = {}
+
+
+pipeline = None  # the process-wide pipeline, set by setup()
+
+
+def setup(file_name='grid_trader.log', lean=True, **kwargs):
+    """Install a LogPipeline on the root logger, replacing one set up earlier."""
+    global pipeline
+    if pipeline is not None:
+        pipeline.close()
+    else:
+        atexit.register(close)  # drain whatever is still queued when the process exits
+    pipeline = LogPipeline(file_name, **kwargs).install(lean=lean)
+    return pipeline
+
+
+def close():
+    if pipeline is not None:
+        pipeline.close()
+
+
+def tail(num_lines=30, file_name=None):
+    """Last lines of the log: from memory when file_name is the pipeline's own log, else read from the file's end."""
+    if pipeline is not None and pipeline.logger is not None and \
+            (file_name is None or not pipeline.file_name or os.path.abspath(file_name) == os.path.abspath(pipeline.file_name)):
+        return pipeline.tail(num_lines)
+    return tail_file(file_name or 'grid_trader.log', num_lines)
+
+
+def tail_file(file_name, num_lines=30, block_size=8192):
+    """Last num_lines lines of a text file, reading backwards in blocks instead of the whole file."""
+    with open(file_name, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        data = b''
+        while end > 0 and data.count(b'\n') <= num_lines:
+            start = max(0, end - block_size)
+            f.seek(start)
+            data = f.read(end - start) + data
+            end = start
+    lines = data.decode('utf-8', errors='replace').splitlines()
+    return lines[-num_lines:] if num_lines > 0 else []
@@ -0,0 +1,334 @@
+import os
+import json
+import time
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# In-process latency histograms and counters for the trading hot paths.
+# Recording is a bucket increment under a per-series lock, cheap enough to
+# leave on in production. Readings go to metrics.json on a timer and can be
+# scraped as Prometheus text from a local HTTP endpoint.
+
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)  # ms upper bounds
+
+
+class Histogram:
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.bounds, value)
+        self.lock.acquire()  # cheaper than a with-block on the hot path
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+        if value < self.min:
+            self.min = value
+        self.lock.release()
+
+    def percentile(self, q, counts=None, total=None, low=None, high=None):
+        """Estimate from the buckets, interpolating linearly inside the one holding the q-th value.
+
+        Clamped to the observed [low, high] (min and max by default), which
+        a wide bucket would otherwise overshoot.
+        """
+        counts = counts or self.counts
+        total = self.count if total is None else total
+        low = self.min if low is None else low
+        high = self.max if high is None else high
+        if not total:
+            return None
+        rank = q / 100.0 * total
+        seen = 0
+        value = high
+        for i, n in enumerate(counts):
+            if n and seen + n >= rank:
+                lo = self.bounds[i - 1] if i > 0 else 0.0
+                hi = self.bounds[i] if i < len(self.bounds) else high
+                value = lo + (hi - lo) * (rank - seen) / n
+                break
+            seen += n
+        return min(max(value, low), high)
+
+    def snapshot(self):
+        with self.lock:
+            counts, total, sum_, min_, max_ = list(self.counts), self.count, self.sum, self.min, self.max
+        return {
+            'count': total,
+            'sum': sum_,
+            'avg': sum_ / total if total else None,
+            'p50': self.percentile(50, counts, total, min_, max_),
+            'p99': self.percentile(99, counts, total, min_, max_),
+            'min': min_ if total else None,
+            'max': max_,
+            'buckets': counts,
+        }
+
+
+class Timer:
+    __slots__ = ('metrics', 'key', 'start')
+
+    def __init__(self, metrics, key):
+        self.metrics = metrics
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.series(self.key).observe((time.perf_counter() - self.start) * 1000)
+        return False
+
+
+class Metrics:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.histograms = {}  # (name, labels) -> Histogram, values in ms
+        self.counters = {}  # (name, labels) -> int
+        self.sources = {}  # name -> fn() returning extra JSON-able readings, called at export time
+        self.started = time.time()
+        self.exporter = None
+        self.server = None
+
+    @staticmethod
+    def key(name, labels):
+        if not labels:
+            return (name, ())
+        return (name, tuple(sorted(labels.items())) if len(labels) > 1 else tuple(labels.items()))
+
+    def series(self, key):
+        h = self.histograms.get(key)
+        if h is None:
+            with self.lock:
+                h = self.histograms.setdefault(key, Histogram())
+        return h
+
+    # recording
+    def observe(self, name, ms, **labels):
+        if self.enabled:
+            self.series(self.key(name, labels)).observe(ms)
+
+    def inc(self, name, n=1, **labels):
+        if self.enabled:
+            key = self.key(name, labels)
+            with self.lock:
+                self.counters[key] = self.counters.get(key, 0) + n
+
+    def lag(self, stream, exchange_ms):
+        """Websocket lag: local receipt time against the exchange's timestamp (ms)."""
+        if self.enabled and exchange_ms:
+            self.observe('ws_lag_ms', time.time() * 1000 - float(exchange_ms), stream=stream)
+
+    def timer(self, name, **labels):
+        """with metrics.timer('checkpoint_ms'): ..."""
+        return Timer(self, self.key(name, labels)) if self.enabled else _NULL_TIMER
+
+    def timed(self, name, **labels):
+        """Decorator recording the wrapped call's duration (exceptions included)."""
+        def decorator(func):
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with Timer(self, self.key(name, labels)):
+                    return func(*args, **kwargs)
+            wrapper.__name__ = func.__name__
+            wrapper.__doc__ = func.__doc__
+            return wrapper
+        return decorator
+
+    def locked(self, lock, name):
+        """Acquire lock, recording the wait as lock_wait_ms{lock=name}."""
+        return _TimedLock(self, lock, name)
+
+    def add_source(self, name, fn):
+        self.sources[name] = fn
+
+    # export
+    def snapshot(self):
+        with self.lock:
+            histograms = list(self.histograms.items())
+            counters = dict(self.counters)
+        report = {'time': time.time(), 'uptime_s': time.time() - self.started, 'bucket_bounds_ms': list(BUCKETS),
+                  'histograms': {}, 'counters': {}}
+        for (name, labels), h in histograms:
+            report['histograms'].setdefault(name, []).append(dict(labels=dict(labels), **h.snapshot()))
+        for (name, labels), n in counters.items():
+            report['counters'].setdefault(name, []).append({'labels': dict(labels), 'value': n})
+        for name, fn in list(self.sources.items()):
+            try:
+                report[name] = fn()
+            except Exception as e:
+                report[name] = {'error': str(e)}
+        return report
+
+    def export(self, path):
+        """Write snapshot() to path atomically."""
+        tmp = f'{path}.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(self.snapshot(), f, indent=1, default=str)
+            os.replace(tmp, path)
+        except IOError as e:
+            print(f"Error writing metrics to {path}: {e}")
+
+    def start_exporter(self, path, interval=10.0):
+        """Export to path every interval seconds from a daemon thread (once per process)."""
+        if self.exporter and self.exporter.is_alive():
+            return
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.export(path)
+        self.exporter = threading.Thread(target=loop, daemon=True)
+        self.exporter.start()
+
+    def prometheus(self):
+        """Prometheus text exposition format."""
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}' if pairs else ''
+        with self.lock:
+            histograms = sorted(self.histograms.items(), key=lambda x: x[0])
+            counters = sorted(self.counters.items())
+        lines = []
+        typed = set()
+        for (name, labels), h in histograms:
+            if name not in typed:
+                lines.append(f'# TYPE {name} histogram')
+                typed.add(name)
+            with h.lock:
+                counts, total, sum_ = list(h.counts), h.count, h.sum
+            cumulative = 0
+            for bound, n in zip(list(h.bounds) + ['+Inf'], counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{fmt(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{fmt(labels)} {sum_}')
+            lines.append(f'{name}_count{fmt(labels)} {total}')
+        for (name, labels), n in counters:
+            if name not in typed:
+                lines.append(f'# TYPE {name}_total counter')
+                typed.add(name)
+            lines.append(f'{name}_total{fmt(labels)} {n}')
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port=9108, host='127.0.0.1'):
+        """Serve /metrics (Prometheus text) and /metrics.json from a daemon thread."""
+        if self.server:
+            return self.server
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith('/metrics.json'):
+                    body, ctype = json.dumps(metrics.snapshot(), default=str).encode(), 'application/json'
+                elif self.path.startswith('/metrics'):
+                    body, ctype = metrics.prometheus().encode(), 'text/plain; version=0.0.4'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', ctype)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # keep scrapes out of the trading log
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server
+
+    def close(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _TimedLock:
+    __slots__ = ('metrics', 'lock', 'name')
+
+    def __init__(self, metrics, lock, name):
+        self.metrics = metrics
+        self.lock = lock
+        self.name = name
+
+    def __enter__(self):
+        start = time.perf_counter()
+        self.lock.acquire()
+        self.metrics.observe('lock_wait_ms', (time.perf_counter() - start) * 1000, lock=self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.lock.release()
+        return False
+
+
+registry = Metrics()  # the process-wide default
+
+
+def observe(name, ms, **labels):
+    registry.observe(name, ms, **labels)
+
+
+def inc(name, n=1, **labels):
+    registry.inc(name, n, **labels)
+
+
+def lag(stream, exchange_ms):
+    registry.lag(stream, exchange_ms)
+
+
+def timer(name, **labels):
+    return registry.timer(name, **labels)
+
+
+def timed(name, **labels):
+    return registry.timed(name, **labels)
+
+
+def locked(lock, name):
+    return registry.locked(lock, name)
+
+
+def add_source(name, fn):
+    registry.add_source(name, fn)
+
+
+def snapshot():
+    return registry.snapshot()
+
+
+def export(path):
+    registry.export(path)
+
+
+def start_exporter(path, interval=10.0):
+    registry.start_exporter(path, interval)
+
+
+def serve(port=9108, host='127.0.0.1'):
+    return registry.serve(port, host)
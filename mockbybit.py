@@ -0,0 +1,640 @@
+import json
+import time
+import uuid
+import heapq
+import queue
+import base64
+import random
+import socket
+import struct
+import hashlib
+import argparse
+import threading
+import socketserver
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the parts of Bybit v5 that BybitTrader and GridTrader use,
+# for load and latency tests on one box without touching the exchange:
+#   REST  /v5/market/tickers, /v5/order/create|amend|cancel, their -batch
+#         variants, /v5/order/realtime, /v5/order/history, /v5/execution/list
+#   WS    /v5/private (order topic), /v5/public/<channel> (tickers.*, publicTrade.*)
+# A price path drives a matching engine; fills go out on the private stream.
+# Latency, error responses and rate limiting can be injected.
+#
+#   mock = MockBybit(prices=...).start()
+#   trader = BybitTrader('k', 's', base_url=mock.rest_url, stream_url=mock.stream_url)
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+WEEK_MS = 7 * 24 * 3600 * 1000  # widest startTime..endTime window /v5/execution/list accepts
+ACK_DELAY = 0.01  # pybit records a subscription only after sending it, so an instant localhost ack can beat it
+
+
+def random_walk(start=2500.0, step=1.0, seed=None):
+    rng = random.Random(seed)
+    price = start
+    while True:
+        price = max(round(price + rng.gauss(0, step), 2), 0.01)
+        yield price
+
+
+class MockExchange:
+    """Order book state and matching, no I/O.
+
+    Resting limit orders fill in full at their limit price once the price path
+    trades through them, like backtest.SimTrader. `publish(topic, message)`
+    is called for every order update and every price step.
+    """
+
+    def __init__(self, prices=None, symbol='ETHUSDT', fee_rate=0.001, publish=None):
+        self.prices = iter(prices) if prices is not None else random_walk()
+        self.symbol = symbol
+        self.fee_rate = fee_rate
+        self.publish = publish or (lambda topic, message: None)
+        self.lock = threading.RLock()
+        self.price = next(self.prices)
+        self.orders = {}  # orderId -> order in /v5/order/realtime format, open ones only
+        self.closed = {}  # orderId -> filled or cancelled order, for /v5/order/history
+        self.link_ids = {}  # orderLinkId -> orderId
+        self.buys = []  # heap of (-price, seq, orderId); stale entries are skipped by seq
+        self.sells = []
+        self.seq = 0
+        self.trade_id = 0
+        self.steps = 0
+        self.fills = 0
+        self.executions = []  # every fill, oldest first
+
+    @staticmethod
+    def now_ms():
+        return int(time.time() * 1000)
+
+    def step(self):
+        """Advance the price path by one print and match. Returns False at the end of a finite path."""
+        with self.lock:
+            try:
+                self.price = next(self.prices)
+            except StopIteration:
+                return False
+            self.steps += 1
+            self.trade_id += 1
+            ts = self.now_ms()
+            self.publish(f'publicTrade.{self.symbol}', {
+                'topic': f'publicTrade.{self.symbol}', 'type': 'snapshot', 'ts': ts,
+                'data': [{'T': ts, 's': self.symbol, 'S': 'Buy', 'v': '0.01', 'p': str(self.price), 'i': str(self.trade_id), 'BT': False}]})
+            self.publish(f'tickers.{self.symbol}', {
+                'topic': f'tickers.{self.symbol}', 'type': 'snapshot', 'ts': ts, 'cs': self.trade_id,
+                'data': {'symbol': self.symbol, 'lastPrice': str(self.price)}})
+            self.match()
+            return True
+
+    def match(self):
+        while self.buys and -self.buys[0][0] >= self.price:
+            self.fill(heapq.heappop(self.buys))
+        while self.sells and self.sells[0][0] <= self.price:
+            self.fill(heapq.heappop(self.sells))
+
+    def fill(self, entry):
+        order = self.orders.get(entry[2])
+        if order is None or order['_seq'] != entry[1]:
+            return  # cancelled or amended since this heap entry was pushed
+        del self.orders[entry[2]]
+        self.execute(order, float(order['qty']) - float(order['cumExecQty']))
+        order.update({'orderStatus': 'Filled', 'cumExecQty': order['qty'], 'leavesQty': '0'})
+        self.closed[order['orderId']] = order
+        self.fills += 1
+        self.emit(order)
+
+    def execute(self, order, qty):  # caller holds self.lock
+        price = float(order['price'])
+        fee = price * qty * self.fee_rate
+        ts = str(self.now_ms())
+        done = float(order['cumExecQty']) + qty
+        order.update({'avgPrice': str(price), 'cumExecQty': str(done), 'leavesQty': str(float(order['qty']) - done),
+                      'cumExecValue': str(float(order['cumExecValue']) + price * qty),
+                      'cumExecFee': str(float(order['cumExecFee']) + fee), 'updatedTime': ts})
+        self.executions.append({'symbol': order['symbol'], 'orderId': order['orderId'], 'orderLinkId': order['orderLinkId'],
+                                'side': order['side'], 'orderPrice': order['price'], 'orderQty': order['qty'],
+                                'execId': uuid.uuid4().hex, 'execPrice': str(price), 'execQty': str(qty),
+                                'execFee': str(fee), 'execType': 'Trade', 'execTime': ts, 'category': order['category']})
+
+    def partial_fill(self, order_id, qty):
+        """Execute part of a resting order at its price; it stays open as PartiallyFilled."""
+        with self.lock:
+            order = self.orders[order_id]
+            self.execute(order, qty)
+            order['orderStatus'] = 'PartiallyFilled'
+            self.emit(order)
+
+    def emit(self, order):
+        self.publish('order', {'id': uuid.uuid4().hex, 'topic': 'order', 'creationTime': self.now_ms(),
+                               'data': [{k: v for k, v in order.items() if not k.startswith('_')}]})
+
+    def push(self, order):
+        self.seq += 1
+        order['_seq'] = self.seq
+        if order['side'] == 'Buy':
+            heapq.heappush(self.buys, (-float(order['price']), self.seq, order['orderId']))
+        else:
+            heapq.heappush(self.sells, (float(order['price']), self.seq, order['orderId']))
+
+    # order entry: each returns (result, (code, msg))
+    def create(self, category, item):
+        missing = [k for k in ('symbol', 'side', 'orderType', 'qty') if not item.get(k)]
+        if missing:
+            return None, (10001, f"params error: {', '.join(missing)} required")
+        if item['orderType'].lower() == 'limit' and not item.get('price'):
+            return None, (10001, 'params error: price required for limit orders')
+        link_id = item.get('orderLinkId') or uuid.uuid4().hex
+        with self.lock:
+            if link_id in self.link_ids:
+                return None, (10001, 'Duplicate orderLinkId')
+            ts = str(self.now_ms())
+            order = {'orderId': str(uuid.uuid4().int >> 64), 'orderLinkId': link_id, 'symbol': item['symbol'],
+                     'side': item['side'], 'orderType': item['orderType'].capitalize(), 'category': category,
+                     'price': str(item.get('price') or self.price), 'qty': str(item['qty']),
+                     'timeInForce': item.get('timeInForce', 'GTC'), 'orderStatus': 'New', 'avgPrice': '',
+                     'leavesQty': str(item['qty']), 'cumExecQty': '0', 'cumExecValue': '0', 'cumExecFee': '0',
+                     'createdTime': ts, 'updatedTime': ts}
+            self.orders[order['orderId']] = order
+            self.link_ids[link_id] = order['orderId']
+            self.emit(order)
+            self.push(order)
+            if order['orderType'] == 'Market':
+                self.match()
+        return {'orderId': order['orderId'], 'orderLinkId': link_id}, (0, 'OK')
+
+    def lookup(self, item):
+        order_id = item.get('orderId') or self.link_ids.get(item.get('orderLinkId'))
+        return self.orders.get(order_id)
+
+    def amend(self, category, item):
+        with self.lock:
+            order = self.lookup(item)
+            if order is None:
+                return None, (110001, 'Order does not exist.')
+            if item.get('price'):
+                order['price'] = str(item['price'])
+            if item.get('qty'):
+                order['qty'] = order['leavesQty'] = str(item['qty'])
+            order['updatedTime'] = str(self.now_ms())
+            self.emit(order)
+            self.push(order)  # the old heap entry goes stale
+        return {'orderId': order['orderId'], 'orderLinkId': order['orderLinkId']}, (0, 'OK')
+
+    def cancel(self, category, item):
+        with self.lock:
+            order = self.lookup(item)
+            if order is None:
+                return None, (110001, 'Order does not exist.')
+            del self.orders[order['orderId']]
+            status = 'PartiallyFilledCanceled' if float(order['cumExecQty']) > 0 else 'Cancelled'
+            order.update({'orderStatus': status, 'updatedTime': str(self.now_ms())})
+            self.closed[order['orderId']] = order
+            self.emit(order)
+        return {'orderId': order['orderId'], 'orderLinkId': order['orderLinkId']}, (0, 'OK')
+
+    def open_orders(self, symbol=None, order_id=None, link_id=None):
+        with self.lock:
+            found = [o for o in self.orders.values()
+                     if (not symbol or o['symbol'] == symbol) and (not order_id or o['orderId'] == order_id)
+                     and (not link_id or o['orderLinkId'] == link_id)]
+        return sorted(({k: v for k, v in o.items() if not k.startswith('_')} for o in found),
+                      key=lambda o: o['createdTime'], reverse=True)
+
+    def order_history(self, symbol=None, order_id=None, link_id=None):
+        with self.lock:
+            found = [o for o in self.closed.values()
+                     if (not symbol or o['symbol'] == symbol) and (not order_id or o['orderId'] == order_id)
+                     and (not link_id or o['orderLinkId'] == link_id)]
+        return sorted(({k: v for k, v in o.items() if not k.startswith('_')} for o in found),
+                      key=lambda o: o['updatedTime'], reverse=True)
+
+    def execution_list(self, symbol=None, start=None, end=None, order_id=None):
+        with self.lock:
+            found = [e for e in self.executions
+                     if (not symbol or e['symbol'] == symbol) and (not order_id or e['orderId'] == order_id)
+                     and (start is None or int(e['execTime']) >= start) and (end is None or int(e['execTime']) <= end)]
+        return found[::-1]  # newest first, like Bybit
+
+
+class MockBybit:
+    """MockExchange behind local REST and WebSocket servers, with fault injection.
+
+    latency: seconds added to every REST reply, a number or a (low, high) range.
+    ws_latency: seconds between an event and its push to stream clients.
+    error_rate: share of REST requests answered with retCode 10016.
+    rate_limit: requests per second allowed per endpoint, beyond that retCode 10006.
+    tick_interval: seconds between price steps; None steps only on step().
+    """
+
+    def __init__(self, prices=None, symbol='ETHUSDT', host='127.0.0.1', port=0, ws_port=0, tick_interval=0.05,
+                 latency=0.0, ws_latency=0.0, error_rate=0.0, rate_limit=None, fee_rate=0.001, seed=None):
+        self.exchange = MockExchange(prices, symbol, fee_rate, publish=self.publish)
+        self.host = host
+        self.port = port
+        self.ws_port = ws_port
+        self.tick_interval = tick_interval
+        self.latency = latency
+        self.ws_latency = ws_latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.windows = {}  # endpoint -> (second, requests in it)
+        self.counts = {}  # endpoint -> {'requests', 'errors', 'rate_limited'}
+        self.clients = set()
+        self.ws_sent = 0
+        self.http = None
+        self.ws = None
+        self.running = False
+
+    @property
+    def rest_url(self):
+        return f'http://{self.host}:{self.http.server_address[1]}'
+
+    @property
+    def stream_url(self):
+        return f'ws://{self.host}:{self.ws.server_address[1]}'
+
+    def start(self):
+        self.http = ThreadingHTTPServer((self.host, self.port), _make_rest_handler(self))
+        self.http.daemon_threads = True
+        self.ws = _StreamServer((self.host, self.ws_port), _StreamHandler)
+        self.ws.mock = self
+        for server in (self.http, self.ws):
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.running = True
+        if self.tick_interval is not None:
+            threading.Thread(target=self.price_loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.running = False
+        for client in list(self.clients):
+            client.close()
+        for server in (self.http, self.ws):
+            if server:
+                server.shutdown()
+                server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def price_loop(self):
+        while self.running and self.exchange.step():
+            time.sleep(self.tick_interval)
+
+    def step(self, n=1):
+        for _ in range(n):
+            if not self.exchange.step():
+                return False
+        return True
+
+    def stats(self):
+        with self.lock:
+            counts = {k: dict(v) for k, v in self.counts.items()}
+        return {'price': self.exchange.price, 'steps': self.exchange.steps, 'open_orders': len(self.exchange.orders),
+                'fills': self.exchange.fills, 'ws_clients': len(self.clients), 'ws_sent': self.ws_sent, 'rest': counts}
+
+    # REST
+    def admit(self, endpoint):
+        """Fault injection ahead of the real handler: (retCode, retMsg, headers) or None to proceed."""
+        if self.latency:
+            lo, hi = self.latency if isinstance(self.latency, (tuple, list)) else (self.latency, self.latency)
+            time.sleep(self.random.uniform(lo, hi))
+        with self.lock:
+            counts = self.counts.setdefault(endpoint, {'requests': 0, 'errors': 0, 'rate_limited': 0})
+            counts['requests'] += 1
+            headers = {}
+            if self.rate_limit:
+                second = int(time.time())
+                start, used = self.windows.get(endpoint, (second, 0))
+                used = used + 1 if start == second else 1
+                self.windows[endpoint] = (second, used)
+                headers = {'X-Bapi-Limit': str(self.rate_limit), 'X-Bapi-Limit-Status': str(max(self.rate_limit - used, 0)),
+                           'X-Bapi-Limit-Reset-Timestamp': str((second + 1) * 1000)}
+                if used > self.rate_limit:
+                    counts['rate_limited'] += 1
+                    return 10006, 'Too many visits!', headers
+            if self.error_rate and self.random.random() < self.error_rate:
+                counts['errors'] += 1
+                return 10016, 'Internal system error.', headers
+        return None, None, headers
+
+    def rest(self, method, endpoint, params):
+        ex = self.exchange
+        category = params.get('category', 'spot')
+        if endpoint == '/v5/market/tickers':
+            return {'category': category, 'list': [{'symbol': params.get('symbol', ex.symbol), 'lastPrice': str(ex.price)}]}, None
+        if endpoint in ('/v5/order/realtime', '/v5/order/history'):
+            lookup = ex.open_orders if endpoint == '/v5/order/realtime' else ex.order_history
+            found = lookup(params.get('symbol'), params.get('orderId'), params.get('orderLinkId'))
+            limit = min(int(params.get('limit', 20)), 50)
+            offset = int(params.get('cursor') or 0)
+            page = found[offset:offset + limit]
+            cursor = str(offset + limit) if offset + limit < len(found) else ''
+            return {'category': category, 'list': page, 'nextPageCursor': cursor}, None
+        if endpoint == '/v5/execution/list':
+            end = int(params['endTime']) if params.get('endTime') else ex.now_ms()
+            start = int(params['startTime']) if params.get('startTime') else end - WEEK_MS
+            if end - start > WEEK_MS:
+                return None, (10001, 'The time range between startTime and endTime cannot exceed 7 days')
+            found = ex.execution_list(params.get('symbol'), start, end, params.get('orderId'))
+            limit = min(int(params.get('limit', 50)), 100)
+            offset = int(params.get('cursor') or 0)
+            cursor = str(offset + limit) if offset + limit < len(found) else ''
+            return {'category': category, 'list': found[offset:offset + limit], 'nextPageCursor': cursor}, None
+        single = {'/v5/order/create': ex.create, '/v5/order/amend': ex.amend, '/v5/order/cancel': ex.cancel}
+        if endpoint in single and method == 'POST':
+            result, (code, msg) = single[endpoint](category, params)
+            return result, (code, msg) if code else None
+        batch = {'/v5/order/create-batch': ex.create, '/v5/order/amend-batch': ex.amend, '/v5/order/cancel-batch': ex.cancel}
+        if endpoint in batch and method == 'POST':
+            items = params.get('request') or []
+            if len(items) > 10:
+                return None, (10001, 'Batch size exceeds 10')
+            results, ext = [], []
+            for item in items:
+                result, (code, msg) = batch[endpoint](category, item)
+                results.append(dict(result or {'orderId': '', 'orderLinkId': item.get('orderLinkId', '')},
+                                    category=category, symbol=item.get('symbol', '')))
+                ext.append({'code': code, 'msg': msg})
+            return {'list': results}, ('ext', ext)
+        return None, (10001, f'Unsupported endpoint {method} {endpoint}')
+
+    # streams
+    def publish(self, topic, message):
+        if not self.clients:
+            return
+        data = json.dumps(message)
+        due = time.time() + self.ws_latency
+        for client in list(self.clients):
+            if topic in client.topics:
+                client.outbox.put((due, data))
+
+
+def _make_rest_handler(mock):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+        def reply(self, body, headers=None):
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def serve(self, method):
+            url = urllib.parse.urlparse(self.path)
+            if method == 'GET':
+                params = dict(urllib.parse.parse_qsl(url.query))
+            else:
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    params = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    return self.reply({'retCode': 10001, 'retMsg': 'invalid json', 'result': {}, 'retExtInfo': {}, 'time': MockExchange.now_ms()})
+            code, msg, headers = mock.admit(url.path)
+            if code is None:
+                result, error = mock.rest(method, url.path, params)
+                ext = {}
+                if error and error[0] == 'ext':
+                    ext, error = {'list': error[1]}, None
+                code, msg = error or (0, 'OK')
+            else:
+                result, ext = {}, {}
+            self.reply({'retCode': code, 'retMsg': msg, 'result': result or {}, 'retExtInfo': ext, 'time': MockExchange.now_ms()}, headers)
+
+        def do_GET(self):
+            self.serve('GET')
+
+        def do_POST(self):
+            self.serve('POST')
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class _StreamServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _StreamHandler(socketserver.BaseRequestHandler):
+    """Just enough RFC 6455 for pybit: text frames, ping/pong, close; no fragmentation or extensions."""
+
+    def setup(self):
+        self.mock = self.server.mock
+        self.topics = set()
+        self.outbox = queue.Queue()
+        self.send_lock = threading.Lock()
+        self.conn_id = uuid.uuid4().hex
+        self.open = True
+
+    def handle(self):
+        if not self.handshake():
+            return
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.mock.clients.add(self)
+        threading.Thread(target=self.pump, daemon=True).start()
+        try:
+            while self.open:
+                opcode, payload = self.read_frame()
+                if opcode is None or opcode == 0x8:
+                    break
+                if opcode == 0x9:
+                    self.send_frame(0xA, payload)
+                elif opcode == 0x1:
+                    self.on_text(json.loads(payload))
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.close()
+
+    def handshake(self):
+        data = b''
+        while b'\r\n\r\n' not in data:
+            chunk = self.request.recv(4096)
+            if not chunk:
+                return False
+            data += chunk
+        lines = data.split(b'\r\n\r\n')[0].decode().split('\r\n')
+        self.path = lines[0].split(' ')[1]
+        headers = {k.strip().lower(): v.strip() for k, v in (line.split(':', 1) for line in lines[1:] if ':' in line)}
+        accept = base64.b64encode(hashlib.sha1((headers.get('sec-websocket-key', '') + WS_GUID).encode()).digest()).decode()
+        self.request.sendall(('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                              f'Sec-WebSocket-Accept: {accept}\r\n\r\n').encode())
+        return True
+
+    def on_text(self, message):
+        op = message.get('op')
+        reply = {'success': True, 'ret_msg': '', 'conn_id': self.conn_id, 'req_id': message.get('req_id', ''), 'op': op}
+        if op == 'ping':
+            reply['ret_msg'] = 'pong'
+        elif op not in ('auth', 'subscribe', 'unsubscribe'):
+            reply.update({'success': False, 'ret_msg': f'unknown op {op}'})
+        # replies go through the outbox too, so no push for a topic can overtake its subscribe ack
+        self.outbox.put((time.time() + max(self.mock.ws_latency, ACK_DELAY), json.dumps(reply)))
+        if op == 'subscribe':
+            private = self.path.startswith('/v5/private')
+            self.topics.update(t.split('.')[0] if private else t for t in message.get('args', []))  # order.spot -> order
+        elif op == 'unsubscribe':
+            self.topics.difference_update(message.get('args', []))
+
+    def pump(self):
+        """Send queued pushes, each no earlier than its due time (ws_latency)."""
+        while self.open:
+            try:
+                due, data = self.outbox.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            wait = due - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                self.send_frame(0x1, data.encode())
+                self.mock.ws_sent += 1
+            except OSError:
+                self.close()
+
+    def recv_exact(self, n):
+        data = b''
+        while len(data) < n:
+            chunk = self.request.recv(n - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def read_frame(self):
+        head = self.recv_exact(2)
+        if head is None:
+            return None, None
+        opcode, length = head[0] & 0x0F, head[1] & 0x7F
+        if length == 126:
+            length = struct.unpack('>H', self.recv_exact(2))[0]
+        elif length == 127:
+            length = struct.unpack('>Q', self.recv_exact(8))[0]
+        mask = self.recv_exact(4) if head[1] & 0x80 else None
+        payload = self.recv_exact(length) if length else b''
+        if payload is None:
+            return None, None
+        if mask:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return opcode, payload
+
+    def send_frame(self, opcode, payload):
+        n = len(payload)
+        if n < 126:
+            head = struct.pack('>BB', 0x80 | opcode, n)
+        elif n < 65536:
+            head = struct.pack('>BBH', 0x80 | opcode, 126, n)
+        else:
+            head = struct.pack('>BBQ', 0x80 | opcode, 127, n)
+        with self.send_lock:
+            self.request.sendall(head + payload)
+
+    def close(self):
+        if self.open:
+            self.open = False
+            self.mock.clients.discard(self)
+            try:
+                self.request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+def loadtest(orders=1000, concurrency=8, batch=False, timeout=60.0, **mock_kwargs):
+    """Place `orders` buys just under the price through BybitTrader and wait for their fills.
+
+    Reports orders/s, fills/s and the client-side REST and websocket-lag
+    histograms from the metrics module.
+    """
+    import tempfile
+    import metrics
+    from concurrent.futures import ThreadPoolExecutor
+    from bybitTrader import BybitTrader
+
+    mock_kwargs.setdefault('tick_interval', 0.001)
+    mock_kwargs.setdefault('prices', (2500.0 + (i % 200) * (1 if (i // 200) % 2 else -1) * 0.05 for i in range(10 ** 9)))
+    filled = []
+    done = threading.Event()
+
+    def on_order(message):
+        for order in message['data']:
+            if order.get('orderStatus') == 'Filled':
+                metrics.lag('order', order.get('updatedTime'))
+                filled.append(time.perf_counter())
+        if len(filled) >= orders:
+            done.set()
+
+    with MockBybit(**mock_kwargs) as mock, tempfile.TemporaryDirectory() as tmp:
+        trader = BybitTrader('mock-key', 'mock-secret', base_dir=tmp, base_url=mock.rest_url, stream_url=mock.stream_url)
+        trader.websocket.subscribe_to_order_updates(mock.exchange.symbol, on_order)
+        price = mock.exchange.price
+        levels = [round(price - 0.01 * (1 + i % 100), 2) for i in range(orders)]
+        start = time.perf_counter()
+        if batch:
+            chunks = [[{'symbol': mock.exchange.symbol, 'side': 'Buy', 'order_type': 'Limit', 'qty': 0.001, 'price': p}
+                       for p in levels[i:i + 10]] for i in range(0, orders, 10)]
+            with ThreadPoolExecutor(concurrency) as pool:
+                list(pool.map(lambda c: trader.create_orders('spot', c, verbose=False), chunks))
+        else:
+            with ThreadPoolExecutor(concurrency) as pool:
+                list(pool.map(lambda p: trader.create_order('spot', mock.exchange.symbol, 'Buy', 'Limit', 0.001, p, verbose=False), levels))
+        placed = time.perf_counter() - start
+        done.wait(timeout)
+        elapsed = time.perf_counter() - start
+        trader.websocket.close()
+        report = metrics.snapshot()
+        return {
+            'orders': orders,
+            'fills': len(filled),
+            'orders_per_s': orders / placed,
+            'fills_per_s': len(filled) / elapsed,
+            'rest_ms': report['histograms'].get('rest_ms'),
+            'ws_lag_ms': [h for h in report['histograms'].get('ws_lag_ms', []) if h['labels'].get('stream') == 'order'],
+            'server': mock.stats(),
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local Bybit v5 stand-in for offline load and latency tests.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--ws-port', type=int, default=8766)
+    parser.add_argument('--tape', help='replay prices from a *_records.json / .ndjson tape instead of a random walk')
+    parser.add_argument('--symbol', default='ETHUSDT')
+    parser.add_argument('--tick-interval', type=float, default=0.05)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--ws-latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=int, default=None)
+    parser.add_argument('--loadtest', type=int, metavar='ORDERS', help='run a load test with this many orders and exit')
+    parser.add_argument('--batch', action='store_true', help='load test through the batch endpoint')
+    args = parser.parse_args()
+    options = dict(symbol=args.symbol, tick_interval=args.tick_interval, latency=args.latency,
+                   ws_latency=args.ws_latency, error_rate=args.error_rate, rate_limit=args.rate_limit)
+    if args.tape:
+        from backtest import load_ticks
+        options['prices'] = (p for _, p in load_ticks(args.tape))
+    if args.loadtest:
+        options.pop('tick_interval')
+        print(json.dumps(loadtest(args.loadtest, batch=args.batch, **options), indent=4, default=str))
+    else:
+        mock = MockBybit(port=args.port, ws_port=args.ws_port, **options).start()
+        print(f"REST {mock.rest_url}  WS {mock.stream_url}  (Ctrl-C to stop)")
+        try:
+            while mock.running:
+                time.sleep(5)
+                print(json.dumps(mock.stats()))
+        except KeyboardInterrupt:
+            mock.stop()
@@ -1,24 +1,177 @@
-import requests
+import httppool
+import metrics
+import os
+import copy
+import json
+import time
+import uuid
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from ratelimit import TokenBucket
 
 urlMain = 'https://api.notion.com/v1/'
 
-class db:  # database object
-    NOTION_URL = 'https://api.notion.com/v1/databases/'
-    def req(self,oper, data, url):
-        response = requests.request(
+class NotionError(Exception):  # non-200 answer from the API, keeps the status code
+    def __init__(self, status, text):
+        super().__init__(f"Error {status}: {text}")
+        self.status = status
+
+class limiter:  # token bucket shared by every request, Notion allows about 3 requests/s on average
+    def __init__(self, rate=3.0, burst=3):
+        self.bucket = TokenBucket(rate, burst)
+        self.cond = threading.Condition()
+        self.waits = 0
+    def acquire(self):  # block until a request may go out
+        with self.cond:
+            while True:
+                wait = self.bucket.wait_time(time.monotonic())
+                if wait <= 0:
+                    self.bucket.take()
+                    return
+                self.waits += 1
+                self.cond.wait(wait)
+    def pause(self, seconds):  # the API answered 429: nobody sends until Retry-After has passed
+        with self.cond:
+            self.bucket.block(time.monotonic() + seconds)
+            self.cond.notify_all()
+
+class pagecache:  # LRU of fetched pages, entries expire after ttl seconds
+    def __init__(self, maxsize=512, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.pages = OrderedDict()  # page id -> (time fetched, page json)
+        self.hits = 0
+        self.misses = 0
+    def get(self, page_id):  # a private copy, so callers may edit it
+        with self.lock:
+            entry = self.pages.get(page_id)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self.pages[page_id]
+                self.misses += 1
+                return None
+            self.pages.move_to_end(page_id)
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+    def put(self, page_id, data):
+        with self.lock:
+            self.pages[page_id] = (time.monotonic(), copy.deepcopy(data))
+            self.pages.move_to_end(page_id)
+            while len(self.pages) > self.maxsize:
+                self.pages.popitem(last=False)
+    def invalidate(self, page_id=None):  # one page, or everything
+        with self.lock:
+            if page_id is None:
+                self.pages.clear()
+            else:
+                self.pages.pop(page_id, None)
+
+limit = limiter()
+cache = pagecache()
+_pool = None
+_pool_size = 3
+_pool_lock = threading.Lock()
+
+def workers():  # shared pool for concurrent reads, created on first use
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(_pool_size, thread_name_prefix='notion')
+        return _pool
+
+def configure(rate=None, burst=None, pool_size=None, cache_size=None, ttl=None):
+    global limit, _pool, _pool_size
+    if rate is not None or burst is not None:
+        limit = limiter(rate or limit.bucket.rate, burst or limit.bucket.burst)
+    if pool_size is not None:
+        with _pool_lock:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool, _pool_size = None, pool_size
+    if cache_size is not None:
+        cache.maxsize = cache_size
+    if ttl is not None:
+        cache.ttl = ttl
+
+def request(oper, url, secret, data=None, retries=3):  # every API call goes through here: rate limited, 429s waited out
+    for attempt in range(retries + 1):
+        limit.acquire()
+        response = httppool.request(
             oper,
             url,  # endpoint URL
             headers={
-                "Authorization": f"Bearer {self.secret}",  # authorization
+                "Authorization": f"Bearer {secret}",  # authorization
                 "Notion-Version": "2021-08-16",
                 "Content-Type": "application/json"
             },
             json=data  # json data
         )
         status = response.status_code
+        if status == 429 and attempt < retries:
+            limit.pause(float(response.headers.get('Retry-After', 1)))
+            metrics.inc('notion_throttled')
+            continue
         if status != 200:
-            raise Exception(f"Error {status}: {response.text}")
+            raise NotionError(status, response.text)
         return response
+
+def fetch_page(page_id, secret, fresh=False):  # page json, from the cache unless fresh
+    data = None if fresh else cache.get(page_id)
+    if data is None:
+        data = request("get", urlMain + 'pages/' + page_id, secret).json()
+        cache.put(page_id, data)
+    return data
+
+def fetch_pages(ids, secret):  # {id: page json} for many pages, the uncached ones fetched concurrently
+    found = {}
+    missing = []
+    for page_id in dict.fromkeys(ids):
+        data = cache.get(page_id)
+        if data is None:
+            missing.append(page_id)
+        else:
+            found[page_id] = data
+    for page_id, data in zip(missing, workers().map(lambda i: fetch_page(i, secret, fresh=True), missing)):
+        found[page_id] = data
+    return found
+
+def prefetch_relations(rows, props, secret):  # warm the cache with every page the given relation properties point to
+    ids = []
+    for r in rows:
+        for prop in props:
+            prop_j = r.data_d["properties"].get(prop)
+            if prop_j and prop_j.get("type") == "relation":
+                ids.extend(x['id'] for x in prop_j["relation"])
+    if ids:
+        fetch_pages(ids, secret)
+
+class relation:  # related pages of a row, fetched all at once on first use instead of one GET each up front
+    def __init__(self, ids, secret):
+        self.ids = ids
+        self.secret = secret
+        self.rows = None
+    def resolve(self):
+        if self.rows is None:
+            pages = fetch_pages(self.ids, self.secret)
+            self.rows = [row(raw=pages[i], secret=self.secret) for i in self.ids]
+        return self.rows
+    def __iter__(self):
+        return iter(self.resolve())
+    def __getitem__(self, i):
+        return self.resolve()[i]
+    def __len__(self):
+        return len(self.ids)
+    def __repr__(self):
+        return f"relation({self.ids})"
+
+class db:  # database object
+    NOTION_URL = 'https://api.notion.com/v1/databases/'
+    def req(self,oper, data, url):
+        return request(oper, url, self.secret, data)
     def __init__(self, secret, id):  # instantiation
         self.dbID = id  # its id(can be derived from its URL)
         self.secret = secret
@@ -29,41 +182,71 @@ class db:  # database object
         page_id = response.json()["id"]  # Extract the page ID from the response
         return page_id  # Return the page ID
 
-    def grab(self, filter=None, sort=None):  # retrieve latest data of the database
-        if filter is None and sort is None:  # the filter and sort parameters are for future development
-            self.data_j = self.req('post', {}, urlMain + 'databases/' + self.dbID + '/query').json()  # store the json file they responded into data_j(it would be converted into dict object automatically)
-            self.parseTolist()  # parse data_j into a list of row object and save them
+    def pages(self, filter=None, sort=None, page_size=100, prefetch=False):  # yield the raw results of each query page, following start_cursor
+        def fetch(cursor):
+            body = {"page_size": page_size}
+            if filter is not None:
+                body["filter"] = filter
+            if sort is not None:
+                body["sorts"] = sort
+            if cursor:
+                body["start_cursor"] = cursor
+            data = self.req('post', body, urlMain + 'databases/' + self.dbID + '/query').json()
+            return data["results"], data.get("next_cursor") if data.get("has_more") else None
+        return httppool.paginate(fetch, prefetch)
+
+    def iter(self, filter=None, sort=None, page_size=100, prefetch=False, relations=None):  # lazily yield row objects, one page in memory at a time
+        for page in self.pages(filter, sort, page_size, prefetch):
+            rows = [row(raw=raw, secret=self.secret) for raw in page]
+            if relations:  # fetch every related page of this batch together, so row.get(prop) needs no request
+                prefetch_relations(rows, relations, self.secret)
+            yield from rows
+
+    def grab(self, filter=None, sort=None, compact=False):  # retrieve latest data of the database
+        if compact:  # compactrows straight from each page, the raw results are not kept
+            self.data_j = None
+            self.lrows = list(self.iter_compact(filter, sort))
+            return
+        self.data_j = {"results": []}
+        for page in self.pages(filter, sort):  # every page, not just the first 100 rows
+            self.data_j["results"].extend(page)
+        self.parseTolist()  # parse data_j into a list of row object and save them
 
     def parseTolist(self):  # parse data_j into a list of row object and save them
         self.lrows = list()
         for i in range(len(self.data_j["results"])):  # for each entry
-            self.lrows.append(row(raw=self.data_j["results"][i]))  # create a row object using json data and append it to lrows
+            self.lrows.append(row(raw=self.data_j["results"][i], secret=self.secret))  # create a row object using json data and append it to lrows
+
+    def schema(self, fresh=False):  # property schema of the database, fetched once
+        if fresh or getattr(self, '_schema', None) is None:
+            info = self.req('get', None, urlMain + 'databases/' + self.dbID).json()
+            self._schema = schema.from_database(info, self.secret)
+        return self._schema
+
+    def iter_compact(self, filter=None, sort=None, page_size=100, prefetch=False, fetch_schema=False):  # lazily yield compactrows
+        sch = self.schema() if fetch_schema else getattr(self, '_schema', None)
+        for page in self.pages(filter, sort, page_size, prefetch):
+            for raw in page:
+                if sch is None:
+                    sch = self._schema = schema.from_page(raw, self.secret)  # without a schema fetch, the first result defines it
+                yield sch.row(raw)
+
+    def columns(self, props=None, filter=None, sort=None, numpy=False):  # the whole database (or a filtered part) column-wise
+        return columns(self.iter_compact(filter, sort), props, numpy)
 
 class row:  # a object that represents a row (entry) for the database
     secret = None
     def __init__(self, **kwargs):
+        if kwargs.get('secret'):
+            self.secret = kwargs['secret']
         if kwargs.get("raw"):  # if "raw" is specified, use it as the json data of the row
             self.data_d = kwargs["raw"]
         elif kwargs.get("id"):
-            self.secret = kwargs.get('secret')
-            self.data_d = self.req("get", {}, urlMain + 'pages/' + kwargs["id"]).json()
+            self.data_d = fetch_page(kwargs["id"], self.secret)
         else:
             self.data_d = {"parent": {}, "properties": {}}  # else construct empty json data
     def req(self,oper, data, url):
-        response = requests.request(
-            oper,
-            url,  # endpoint URL
-            headers={
-                "Authorization": f"Bearer {self.secret}",  # authorization
-                "Notion-Version": "2021-08-16",
-                "Content-Type": "application/json"
-            },
-            json=data  # json data
-        )
-        status = response.status_code
-        if status != 200:
-            raise Exception(f"Error {status}: {response.text}")        
-        return response
+        return request(oper, url, self.secret, data)
 
     def getJson(self):
         return self.data_d
@@ -72,24 +255,10 @@ class row:  # a object that represents a row (entry) for the database
         prop_j = self.data_d["properties"][prop]  # location of the prop property
         ptype = prop_j["type"]  # access the type of prop
         # return the queried value from the correct spot in the json data according to its type
-        if ptype == "title" or ptype == "rich_text":
-            return prop_j[ptype][0]["text"]["content"]
-        elif ptype == "number":
-            return prop_j[ptype]
-        elif ptype == "select":
-            return prop_j[ptype]["name"]
-        elif ptype == "multi_select":
-            l = list()
-            for x in prop_j[ptype]:
-                l.append(x["name"])
-            return l  # a list of all selected value
-        elif ptype == "date":
-            try:
-                return prop_j[ptype]['start']  # iso format
-            except:
-                return ''
-        elif ptype == "relation":
-            return [row(id=x['id']) for x in prop_j[ptype]]
+        if ptype == "relation":
+            return relation(decoders[ptype](prop_j), self.secret)  # resolved lazily, in one concurrent batch
+        decode = decoders.get(ptype)
+        return decode(prop_j) if decode else None
 
     def set(self, prop, val, ptype):  # set the value of a property
         # manipulate its json data according to the property name, value to be set with, and the type of the property
@@ -113,9 +282,10 @@ class row:  # a object that represents a row (entry) for the database
 
         # Send the patch request with only the properties section of the data
         try:
-            self.req('patch', data_to_update, 'https://api.notion.com/v1/pages/' + self.data_d["id"])
+            self.req('patch', data_to_update, urlMain + 'pages/' + self.data_d["id"])
         except Exception as e:
             raise
+        cache.invalidate(self.data_d["id"])
 
 
 
@@ -129,6 +299,391 @@ class row:  # a object that represents a row (entry) for the database
     def dup(self):
         return row(raw=self.data_d.copy())
 
+def _text(prop_j):
+    parts = prop_j[prop_j["type"]]
+    return parts[0]["text"]["content"] if parts else ''
+
+def _date(prop_j):
+    try:
+        return prop_j["date"]['start']  # iso format
+    except:
+        return ''
+
+decoders = {  # property type -> fn(property json) -> value, shared by row.get and compiled schemas
+    "title": _text,
+    "rich_text": _text,
+    "number": lambda p: p["number"],
+    "select": lambda p: p["select"]["name"] if p["select"] else None,
+    "multi_select": lambda p: [x["name"] for x in p["multi_select"]],  # a list of all selected value
+    "date": _date,
+    "checkbox": lambda p: p["checkbox"],
+    "relation": lambda p: [x['id'] for x in p["relation"]],  # page ids
+    "people": lambda p: [x['id'] for x in p["people"]],
+    "status": lambda p: p["status"]["name"] if p["status"] else None,
+    "url": lambda p: p["url"],
+    "email": lambda p: p["email"],
+    "formula": lambda p: p["formula"].get(p["formula"].get("type")),
+    "created_time": lambda p: p["created_time"],
+    "last_edited_time": lambda p: p["last_edited_time"],
+}
+
+class schema:  # a database's property layout compiled once into positional accessors
+    def __init__(self, types, secret=None):  # types: {property name: notion type}
+        self.names = list(types)
+        self.types = [types[n] for n in self.names]
+        self.index = {n: i for i, n in enumerate(self.names)}
+        self.decoders = [decoders.get(t, lambda p: None) for t in self.types]
+        self.secret = secret
+    @classmethod
+    def from_page(cls, raw, secret=None):  # infer from one query result, every page carries each property's type
+        return cls({name: p["type"] for name, p in raw["properties"].items()}, secret)
+    @classmethod
+    def from_database(cls, info, secret=None):  # from a GET databases/<id> response
+        return cls({name: p["type"] for name, p in info["properties"].items()}, secret)
+    def row(self, raw):
+        return compactrow(self, raw)
+
+_MISSING = object()
+
+class compactrow:  # a query result holding only its id and properties, each decoded on first access
+    __slots__ = ('schema', 'id', 'raw', 'values')
+    def __init__(self, schema, raw):
+        self.schema = schema
+        self.id = raw.get("id")
+        self.raw = raw["properties"]  # the rest of the page json (parent, urls, users...) is dropped
+        self.values = [_MISSING] * len(schema.names)
+    def get(self, prop):
+        i = self.schema.index[prop]
+        value = self.values[i]
+        if value is _MISSING:
+            prop_j = self.raw.get(prop)
+            value = self.schema.decoders[i](prop_j) if prop_j is not None else None
+            self.values[i] = value
+            if all(v is not _MISSING for v in self.values):
+                self.raw = None  # fully decoded, the json is no longer needed
+        if self.schema.types[i] == "relation" and value is not None:
+            return relation(value, self.schema.secret)
+        return value
+    __getitem__ = get
+    def to_dict(self):
+        return {name: self.get(name) for name in self.schema.names}
+    def __repr__(self):
+        return f"compactrow({self.id})"
+
+def columns(rows, props=None, numpy=False):  # column-wise export of compact rows: {property: list or array}
+    rows = list(rows)
+    if not rows:
+        return {}
+    sch = rows[0].schema
+    props = props or sch.names
+    out = {'id': [r.id for r in rows]}
+    for prop in props:
+        i = sch.index[prop]
+        values = [r.get(prop) for r in rows]
+        if sch.types[i] == "relation":
+            values = [list(v.ids) if v is not None else None for v in values]
+        if numpy:
+            import numpy as np
+            if sch.types[i] == "number":
+                values = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+            elif sch.types[i] == "checkbox":
+                values = np.array([bool(v) for v in values], dtype=bool)
+            else:
+                column = np.empty(len(values), dtype=object)  # filled item by item so list values stay one cell each
+                column[:] = values
+                values = column
+        out[prop] = values
+    return out
+
+class writer:  # write-behind queue for page creates and updates
+    """Send Notion writes from background threads so callers never wait on the API.
+
+    add() and update() return immediately. add() hands back a "pending-..."
+    key that stands in for the page id until the create has gone through;
+    update() accepts either. Every write is appended to a spill file first
+    and marked done there once sent, so writes still queued at exit are
+    replayed on the next start. Writes for one page always go to the same
+    worker, which keeps them in order, and an update for a page whose
+    create is still queued is merged into that create.
+
+    The spill file holds database ids, page keys and properties, never a
+    token: credentials come from the db objects registered with dbs= or
+    register(), which only live in memory. Writes for a database that is
+    not registered yet wait in the spill file until it is. The file is
+    rewritten with only the unsent writes at start and after every
+    `compact_every` sends.
+    """
+    def __init__(self, spill_file='notion_queue.jsonl', workers=2, maxsize=1000, retries=6, backoff=1.0, dbs=(), compact_every=1000):
+        self.spill_file = spill_file
+        self.retries = retries
+        self.backoff = backoff
+        self.compact_every = compact_every
+        self.acked = 0  # 'done' records in the spill file since it was last rewritten
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.queues = [queue.Queue(maxsize) for _ in range(workers)]
+        self.dbs = {}  # dbID -> db, where the token for a write is looked up at send time
+        self.ops = {}  # seq -> op not yet sent
+        self.queued_adds = {}  # key -> op of a create that no worker has picked up yet
+        self.deferred = set()  # seqs only held in the spill file (queue was full, page not created yet, retry pending)
+        self.attempts = {}  # seq -> failed sends so far
+        self.retry_at = {}  # seq -> monotonic time before which a failed op is not resent
+        self.ids = {}  # key -> real page id, kept only while updates may still come for the key
+        self.legacy = {}  # seq -> token of an op recovered from a spill file that still held tokens, memory only
+        self.seq = 0
+        self.sent = 0
+        self.failed = 0
+        self.spill = None
+        self.register(*dbs)
+        self.recover()
+        self.threads = [threading.Thread(target=self.work, args=(q,), daemon=True) for q in self.queues]
+        for t in self.threads:
+            t.start()
+
+    def register(self, *databases):  # make these databases' tokens available to the workers
+        with self.lock:
+            for database in databases:
+                self.dbs[database.dbID] = database
+
+    def database(self, op):  # the registered db an op is sent with, None until it is registered
+        if op.get('db') is None and op['seq'] in self.legacy:  # spill file written before tokens were left out
+            op['db'] = next((d.dbID for d in self.dbs.values() if d.secret == self.legacy[op['seq']]), None)
+        return self.dbs.get(op.get('db'))
+
+    def recover(self):  # reload ops that were never sent and compact the spill file
+        pending = {}
+        if os.path.exists(self.spill_file):
+            with open(self.spill_file, 'r') as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue  # torn write
+                    if 'ids' in rec:
+                        self.ids.update(rec['ids'])
+                    elif 'done' in rec:
+                        pending.pop(rec['done'], None)
+                        if rec.get('id'):
+                            self.ids[rec['key']] = rec['id']
+                        elif rec.get('forget'):
+                            self.ids.pop(rec['key'], None)
+                    elif 'merge' in rec:
+                        if rec['merge'] in pending:
+                            pending[rec['merge']]['properties'].update(rec['properties'])
+                            if 'keep' in rec:
+                                pending[rec['merge']]['keep'] = rec['keep']
+                    else:
+                        pending[rec['seq']] = rec
+        for seq, op in list(pending.items()):  # older files carried the token itself: keep it in memory only
+            secret = op.pop('secret', None)
+            if op.get('db') is None:
+                if secret is None:
+                    logging.error(f"Dropping recovered Notion {op['op']} {seq}: no database to send it with")
+                    del pending[seq]
+                    continue
+                self.legacy[seq] = secret
+        self.seq = max(pending, default=0)
+        for op in pending.values():
+            self.ops[op['seq']] = op
+            self.deferred.add(op['seq'])
+        self.compact()
+        if pending:
+            logging.info(f"Recovered {len(pending)} unsent Notion writes from {self.spill_file}")
+
+    def compact(self):  # rewrite the spill file as the page ids plus the unsent ops (call with self.lock held)
+        tmp = self.spill_file + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(json.dumps({'ids': self.ids}) + '\n')
+            for seq in sorted(self.ops):
+                f.write(json.dumps(self.ops[seq]) + '\n')
+        os.replace(tmp, self.spill_file)
+        if self.spill is not None:
+            self.spill.close()
+        self.spill = open(self.spill_file, 'a')
+        self.acked = 0
+
+    def log(self, rec):  # call with self.lock held
+        if self.spill.closed:
+            return
+        self.spill.write(json.dumps(rec) + '\n')
+        self.spill.flush()
+        if 'done' in rec:
+            self.acked += 1
+            if self.acked >= self.compact_every:
+                self.compact()
+
+    def route(self, key):
+        return self.queues[hash(key) % len(self.queues)]
+
+    def submit(self, op):
+        with self.lock:
+            self.seq += 1
+            op['seq'] = self.seq
+            self.ops[op['seq']] = op
+            self.log(op)
+            try:
+                self.route(op['key']).put_nowait(op['seq'])
+                if op['op'] == 'add':
+                    self.queued_adds[op['key']] = op
+            except queue.Full:
+                self.deferred.add(op['seq'])  # stays in the spill file, reloaded when a worker goes idle
+                logging.warning(f"Notion queue full, deferred write {op['seq']}")
+
+    def add(self, database, row, keep=True):  # queue a page create, returns a key usable in update()
+        """keep=False for rows that are never updated: their page id is not remembered."""
+        self.register(database)
+        key = 'pending-' + uuid.uuid4().hex
+        self.submit({'op': 'add', 'key': key, 'db': database.dbID, 'keep': keep,
+                     'properties': dict(row.getJson()['properties'])})
+        return key
+
+    def update(self, page, row, database, last=False):  # queue a property update for a page id or a key from add()
+        """last=True once no further update will come for the page, so its id is forgotten after this one."""
+        self.register(database)
+        props = dict(row.getJson()['properties'])
+        with self.lock:
+            pending = self.queued_adds.get(page)
+            if pending is not None:
+                pending['properties'].update(props)  # create not sent yet: fold the update into it
+                rec = {'merge': pending['seq'], 'properties': props}
+                if last:
+                    pending['keep'] = rec['keep'] = False  # the create carries the final state, no id to remember
+                self.log(rec)
+                return
+        self.submit({'op': 'update', 'key': page, 'db': database.dbID, 'last': last, 'properties': props})
+
+    def resolve(self, key):  # real page id for a key, None while the create is pending
+        if not str(key).startswith('pending-'):
+            return key
+        return self.ids.get(key)
+
+    def send(self, op, database):
+        if op['op'] == 'add':
+            temp = row()
+            temp.data_d['properties'] = op['properties']
+            return database.add(temp)
+        temp = row()
+        temp.secret = database.secret
+        temp.data_d = {'id': self.resolve(op['key']), 'properties': op['properties']}
+        temp.update()
+
+    def blocked(self, seq, op):  # why an op cannot go out yet, None if it can (call with self.lock held)
+        if self.database(op) is None:
+            return 'database not registered'
+        if self.retry_at.get(seq, 0) > time.monotonic():
+            return 'retry pending'
+        if op['op'] == 'update' and self.resolve(op['key']) is None:
+            return 'page not created yet'
+        if any(s < seq and o['key'] == op['key'] for s, o in self.ops.items() if s in self.retry_at or s in self.deferred):
+            return 'an earlier write for the page is still waiting'  # keep one page's writes in order
+        return None
+
+    def work(self, q):
+        last_reload = time.monotonic()
+        while not self.stopping.is_set():
+            if self.deferred and time.monotonic() - last_reload > 0.5:  # retries come due even while the queue is busy
+                self.reload()
+                last_reload = time.monotonic()
+            try:
+                seq = q.get(timeout=0.5)
+            except queue.Empty:
+                self.reload()
+                last_reload = time.monotonic()
+                continue
+            if seq is None:
+                continue  # woken by close()
+            with self.lock:
+                op = self.ops.get(seq)
+                if op is None:
+                    continue
+                if op['op'] == 'add':
+                    self.queued_adds.pop(op['key'], None)
+                if self.blocked(seq, op):
+                    self.deferred.add(seq)  # reload() queues it again once it can go
+                    continue
+                database = self.database(op)
+            page_id = None
+            try:
+                with metrics.timer('notion_ms', op=op['op']):
+                    page_id = self.send(op, database)
+                self.sent += 1
+            except Exception as e:
+                metrics.inc('notion_errors', op=op['op'], status=str(getattr(e, 'status', 'exception')))
+                permanent = isinstance(e, NotionError) and 400 <= e.status < 500 and e.status != 429
+                with self.lock:
+                    attempt = self.attempts.get(seq, 0)
+                    if not permanent and attempt < self.retries:
+                        # back off without holding up the other writes on this worker
+                        self.attempts[seq] = attempt + 1
+                        self.retry_at[seq] = time.monotonic() + min(self.backoff * (2 ** attempt), 60)
+                        self.deferred.add(seq)
+                        continue
+                self.failed += 1
+                logging.error(f"Dropping Notion {op['op']} after {attempt + 1} attempts: {e}")
+            self.finish(seq, op, page_id)
+
+    def finish(self, seq, op, page_id):
+        with self.lock:
+            self.ops.pop(seq, None)
+            self.attempts.pop(seq, None)
+            self.retry_at.pop(seq, None)
+            self.legacy.pop(seq, None)
+            more = any(o['key'] == op['key'] for o in self.ops.values())
+            forget = not more and (op.get('last') or not op.get('keep', True))
+            if page_id and not forget:
+                self.ids[op['key']] = page_id
+            if forget:
+                self.ids.pop(op['key'], None)  # the key's updates are done
+            self.log({'done': seq, 'key': op['key'], 'id': None if forget else page_id, 'forget': forget})
+
+    def reload(self):  # push deferred ops back onto the queues, oldest first
+        with self.lock:
+            for seq in sorted(self.deferred):
+                op = self.ops.get(seq)
+                if op is None:
+                    self.deferred.discard(seq)
+                    continue
+                if op['op'] == 'update' and self.resolve(op['key']) is None:
+                    if not any(o['op'] == 'add' and o['key'] == op['key'] for o in self.ops.values()):
+                        self.ops.pop(seq)  # its create failed for good
+                        self.deferred.discard(seq)
+                        self.log({'done': seq, 'key': op['key'], 'id': None})
+                    continue
+                if self.blocked(seq, op):
+                    continue
+                try:
+                    self.route(op['key']).put_nowait(seq)
+                except queue.Full:
+                    break
+                self.deferred.discard(seq)
+                if op['op'] == 'add':
+                    self.queued_adds[op['key']] = op
+
+    def pending(self):
+        return len(self.ops)
+
+    def flush(self, timeout=30):  # wait until everything queued has been sent (or timeout)
+        end = time.time() + timeout
+        while self.ops and time.time() < end:
+            time.sleep(0.05)
+        return not self.ops
+
+    def close(self, timeout=30):
+        done = self.flush(timeout)
+        self.stopping.set()
+        for q in self.queues:
+            try:
+                q.put_nowait(None)
+            except queue.Full:
+                pass  # that worker sees stopping after its current get
+        for t in self.threads:
+            t.join(max(timeout, 1))  # a send in flight finishes and logs before the file closes
+        with self.lock:
+            if not done:
+                logging.warning(f"{len(self.ops)} Notion writes left in {self.spill_file} for the next start")
+            self.spill.close()
+        return done
+
 # class util:
 #     def dup(row0, rel=None):
 #         data = row0.getJson().copy()
@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import threading
+
+TERMINAL = ('filled', 'fulfilled', 'cancelled')
+
+# orderStatus from the private stream -> OrderRegistry status
+STREAM_STATUS = {
+    'Filled': 'fulfilled',
+    'Cancelled': 'cancelled',
+    'PartiallyFilledCanceled': 'cancelled',
+    'Rejected': 'cancelled',
+    'Deactivated': 'cancelled',
+}
+
+
+class OrderRegistry:
+    """BybitTrader.orders: orderLinkId -> {'name', 'details', 'status', 'order_id'}.
+
+    Reads like the plain dict it replaces, but keeps secondary indexes by
+    name, orderId, status and category so lookups and filters are O(1).
+    Status changes must go through set_status() to keep the indexes right.
+    Orders that reach a terminal status are archived to an NDJSON file
+    (orders_archive.ndjson under base_dir unless `archive_file` is given)
+    and dropped from memory once more than `keep_terminal` of them are held
+    or they are older than `max_age` seconds.
+    """
+
+    def __init__(self, keep_terminal=1000, max_age=None, archive_file=None, base_dir='./'):
+        self.keep_terminal = keep_terminal
+        self.max_age = max_age
+        self.archive_file = archive_file or os.path.join(base_dir, 'orders_archive.ndjson')
+        self.lock = threading.RLock()
+        self.orders = {}
+        self.names = {}  # name -> link id
+        self.order_ids = {}  # orderId -> link id
+        self.statuses = {}  # status -> set of link ids
+        self.categories = {}  # category -> set of link ids
+        self.terminal = {}  # link id -> time it became terminal, oldest first
+        self.archived = 0
+
+    # dict-style access
+    def __getitem__(self, link_id):
+        return self.orders[link_id]
+
+    def __contains__(self, link_id):
+        return link_id in self.orders
+
+    def __iter__(self):
+        return iter(list(self.orders))
+
+    def __len__(self):
+        return len(self.orders)
+
+    def __setitem__(self, link_id, entry):
+        self.add(link_id, entry)
+
+    def get(self, link_id, default=None):
+        return self.orders.get(link_id, default)
+
+    def keys(self):
+        return list(self.orders.keys())
+
+    def values(self):
+        return list(self.orders.values())
+
+    def items(self):
+        return list(self.orders.items())
+
+    def add(self, link_id, entry):
+        with self.lock:
+            if link_id in self.orders:
+                self._unindex(link_id)
+            self.orders[link_id] = entry
+            self.names[entry['name']] = link_id
+            order_id = entry.get('order_id') or entry['details'].get('orderId')
+            if order_id:
+                self.order_ids[order_id] = link_id
+            self.statuses.setdefault(entry['status'], set()).add(link_id)
+            self.categories.setdefault(entry['details'].get('category'), set()).add(link_id)
+            self.mark(link_id, entry['status'])
+
+    def _unindex(self, link_id):
+        entry = self.orders[link_id]
+        self.names.pop(entry['name'], None)
+        self.order_ids.pop(entry.get('order_id') or entry['details'].get('orderId'), None)
+        self.statuses.get(entry['status'], set()).discard(link_id)
+        self.categories.get(entry['details'].get('category'), set()).discard(link_id)
+
+    def set_status(self, link_id, status):
+        with self.lock:
+            entry = self.orders[link_id]
+            if entry['status'] == status:
+                return
+            self.statuses.get(entry['status'], set()).discard(link_id)
+            entry['status'] = status
+            self.statuses.setdefault(status, set()).add(link_id)
+            self.mark(link_id, status)
+
+    # indexed lookups
+    def by_name(self, name):
+        """(link id, entry) for an order name, or (None, None)."""
+        link_id = self.names.get(name)
+        return (link_id, self.orders[link_id]) if link_id else (None, None)
+
+    def by_order_id(self, order_id):
+        link_id = self.order_ids.get(order_id)
+        return (link_id, self.orders[link_id]) if link_id else (None, None)
+
+    def link_ids(self, status=None, category=None):
+        """Set of link ids matching status and/or category."""
+        with self.lock:
+            sets = []
+            if status is not None:
+                sets.append(self.statuses.get(status, set()))
+            if category is not None:
+                sets.append(self.categories.get(category, set()))
+            if not sets:
+                return set(self.orders)
+            return set.intersection(*sets) if len(sets) > 1 else set(sets[0])
+
+    def select(self, status=None, category=None):
+        return sorted(((link_id, self.orders[link_id]) for link_id in self.link_ids(status, category)), key=lambda x: x[1]['name'])
+
+    # retention
+    def mark(self, link_id, status):
+        if status not in TERMINAL:
+            self.terminal.pop(link_id, None)  # re-opened
+        elif link_id not in self.terminal:  # filled -> fulfilled keeps its place
+            self.terminal[link_id] = time.time()
+            self.evict()
+
+    def evict(self):
+        now = time.time()
+        evicted = []
+        while self.terminal:
+            link_id, since = next(iter(self.terminal.items()))
+            too_many = len(self.terminal) > self.keep_terminal
+            too_old = self.max_age is not None and now - since > self.max_age
+            if not (too_many or too_old):
+                break
+            del self.terminal[link_id]
+            entry = self.orders.get(link_id)
+            if entry is None:
+                continue
+            self._unindex(link_id)
+            del self.orders[link_id]
+            evicted.append({'orderLinkId': link_id, **entry})
+        if evicted:
+            self.archived += len(evicted)
+            try:
+                with open(self.archive_file, 'a') as f:
+                    f.writelines(json.dumps(e, default=str) + '\n' for e in evicted)
+            except IOError as e:
+                print(f"Error archiving orders to {self.archive_file}: {e}")
+
+    def find_archived(self, name):
+        """Scan the archive file for an evicted order by name (slow path)."""
+        if not os.path.exists(self.archive_file):
+            return None
+        with open(self.archive_file, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get('name') == name:
+                    return entry
+        return None
@@ -0,0 +1,216 @@
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+
+# Client-side rate limiting for Bybit v5. Every endpoint gets a token bucket
+# sized from Bybit's documented limits and then corrected from the
+# X-Bapi-Limit / X-Bapi-Limit-Status / X-Bapi-Limit-Reset-Timestamp headers
+# of each response. Callers queue on the bucket by priority, so when the
+# budget is short, cancels and the sell leg of a filled buy go out first and
+# ticker polls and open-order refreshes wait. The account-wide bucket is
+# shared the same way: of the requests whose endpoint budget allows them to
+# go, the highest priority one takes the next global token.
+
+CRITICAL, HIGH, NORMAL, LOW = 0, 1, 2, 3
+
+# endpoint prefix -> default priority (first match wins)
+PRIORITIES = (
+    ('/v5/order/cancel', CRITICAL),
+    ('/v5/order/create', NORMAL),
+    ('/v5/order/amend', NORMAL),
+    ('/v5/order/realtime', LOW),
+    ('/v5/order/history', LOW),
+    ('/v5/execution/list', LOW),
+    ('/v5/market/', LOW),
+)
+
+# endpoint -> requests per second until the exchange reports its own figure
+LIMITS = {
+    '/v5/order/create': 20,
+    '/v5/order/amend': 10,
+    '/v5/order/cancel': 20,
+    '/v5/order/create-batch': 20,
+    '/v5/order/amend-batch': 10,
+    '/v5/order/cancel-batch': 20,
+    '/v5/order/realtime': 50,
+    '/v5/order/history': 50,
+    '/v5/execution/list': 50,
+}
+DEFAULT_LIMIT = 10
+RATE_LIMITED = 10006  # retCode for "Too many visits"
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self.tokens = self.burst
+        self.stamp = time.monotonic()
+        self.blocked_until = 0.0  # monotonic time the exchange told us to wait for
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait_time(self, now):
+        """Seconds until one token is available (0 if one is available now)."""
+        self.refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def block(self, until):
+        self.blocked_until = max(self.blocked_until, until)
+        self.tokens = min(self.tokens, 0.0)
+
+
+class RequestScheduler:
+    """Admits requests per endpoint in priority order, at the rate the exchange allows.
+
+    acquire() blocks the calling thread only as long as its own endpoint's
+    budget requires, then the caller sends the request and reports the
+    response with update(). Requests also draw on one account-wide bucket,
+    which goes to the best (priority, arrival) request among the heads of
+    the endpoint queues that are ready to send; a high priority request held
+    back by its own endpoint's budget does not stall the other endpoints.
+    """
+
+    def __init__(self, limits=None, priorities=PRIORITIES, global_rate=100, global_burst=None, timeout=30.0):
+        self.limits = dict(LIMITS, **(limits or {}))
+        self.priorities = priorities
+        self.timeout = timeout  # longest a request waits for its turn before TimeoutError
+        self.cond = threading.Condition()
+        self.buckets = {}  # endpoint -> TokenBucket
+        self.waiting = {}  # endpoint -> heap of (priority, seq)
+        self.all = TokenBucket(global_rate, global_burst)
+        self.seq = itertools.count()
+        self.counts = {}  # endpoint -> {'sent', 'rate_limited', 'waited_s'}
+
+    def priority(self, endpoint):
+        for prefix, priority in self.priorities:
+            if endpoint.startswith(prefix):
+                return priority
+        return NORMAL
+
+    def bucket(self, endpoint):
+        if endpoint not in self.buckets:
+            self.buckets[endpoint] = TokenBucket(self.limits.get(endpoint, DEFAULT_LIMIT))
+            self.counts[endpoint] = {'sent': 0, 'rate_limited': 0, 'waited_s': 0.0}
+        return self.buckets[endpoint]
+
+    def acquire(self, endpoint, priority=None, timeout=None):
+        """Wait for this endpoint's turn. Returns the seconds spent waiting."""
+        ticket = (self.priority(endpoint) if priority is None else priority, next(self.seq))
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        with self.cond:
+            heapq.heappush(self.waiting.setdefault(endpoint, []), ticket)
+            try:
+                while True:
+                    admitted, wait = self._admit(endpoint, ticket, start, timeout)
+                    if admitted:
+                        return wait
+                    self.cond.wait(wait)
+            except BaseException:
+                self._withdraw(endpoint, ticket)
+                raise
+
+    async def acquire_async(self, endpoint, priority=None, timeout=None, poll=0.005):
+        """acquire() for asyncio callers: same queue and budgets, but awaits instead of blocking the loop.
+
+        Async waiters cannot be woken by notify_all, so a waiter behind others
+        in the queue rechecks every poll seconds.
+        """
+        ticket = (self.priority(endpoint) if priority is None else priority, next(self.seq))
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        with self.cond:
+            heapq.heappush(self.waiting.setdefault(endpoint, []), ticket)
+        try:
+            while True:
+                with self.cond:
+                    admitted, wait = self._admit(endpoint, ticket, start, timeout)
+                    behind = not admitted and self.waiting[endpoint][0] != ticket
+                if admitted:
+                    return wait
+                await asyncio.sleep(poll if behind or wait is None else min(wait, 1.0))
+        except BaseException:
+            with self.cond:
+                self._withdraw(endpoint, ticket)
+            raise
+
+    def _admit(self, endpoint, ticket, start, timeout):
+        """One admission attempt under self.cond: (True, seconds waited) or (False, seconds to wait, None if unknown)."""
+        bucket = self.bucket(endpoint)
+        queue = self.waiting[endpoint]
+        now = time.monotonic()
+        wait = None  # not at the head: sleep until someone ahead is admitted
+        if queue[0] == ticket:
+            own, shared = bucket.wait_time(now), self.all.wait_time(now)
+            wait = own if own > 0 else shared if shared > 0 else None  # None: ready, but another endpoint goes first
+            if wait is None and self._next_ready(now) == ticket:
+                bucket.take()
+                self.all.take()
+                heapq.heappop(queue)
+                counts = self.counts[endpoint]
+                counts['sent'] += 1
+                counts['waited_s'] += now - start
+                self.cond.notify_all()
+                return True, now - start
+        if timeout is not None and now - start >= timeout:
+            raise TimeoutError(f"Rate limit queue for {endpoint} did not clear in {timeout}s")
+        if timeout is not None:
+            wait = min(wait, start + timeout - now) if wait is not None else start + timeout - now
+        return False, wait
+
+    def _next_ready(self, now):
+        """Best ticket heading an endpoint queue whose own bucket has a token: the next to take a global one."""
+        best = None
+        for endpoint, queue in self.waiting.items():
+            if queue and (best is None or queue[0] < best) and self.buckets[endpoint].wait_time(now) <= 0:
+                best = queue[0]
+        return best
+
+    def _withdraw(self, endpoint, ticket):
+        queue = self.waiting.get(endpoint, [])
+        if ticket in queue:
+            queue.remove(ticket)
+            heapq.heapify(queue)
+            self.cond.notify_all()
+
+    def update(self, endpoint, headers, ret_code=0):
+        """Fold a response's rate limit headers (and a 10006 answer) into the endpoint's bucket."""
+        limit = headers.get('X-Bapi-Limit')
+        remaining = headers.get('X-Bapi-Limit-Status')
+        reset = headers.get('X-Bapi-Limit-Reset-Timestamp')
+        with self.cond:
+            bucket = self.bucket(endpoint)
+            now = time.monotonic()
+            bucket.refill(now)
+            if limit and float(limit) > 0 and float(limit) != bucket.rate:
+                bucket.rate = bucket.burst = float(limit)
+            if remaining is not None:
+                bucket.tokens = min(bucket.tokens, float(remaining))
+            reset_in = max(float(reset) / 1000 - time.time(), 0.0) if reset else 0.0
+            if ret_code == RATE_LIMITED:
+                self.counts[endpoint]['rate_limited'] += 1
+                bucket.block(now + max(reset_in, 1 / bucket.rate))
+            elif remaining is not None and float(remaining) <= 0 and reset_in:
+                bucket.block(now + reset_in)
+            self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            now = time.monotonic()
+            report = {}
+            for endpoint, bucket in self.buckets.items():
+                bucket.refill(now)
+                report[endpoint] = dict(self.counts[endpoint], rate=bucket.rate, tokens=round(bucket.tokens, 2),
+                                        blocked_s=max(bucket.blocked_until - now, 0.0),
+                                        queued=len(self.waiting.get(endpoint, [])))
+            return report
@@ -0,0 +1,505 @@
+import os
+import json
+import time
+import logging
+import threading
+
+# Storage backends for GridTrader state (buy_orders, sell_orders,
+# order_tracking, open_orders and the portfolio).
+
+
+class StateManager:
+    def __init__(self, base_dir='./', namespace=None):
+        # self.lock = threading.Lock()
+        prefix = f'{namespace}_' if namespace else ''  # lets several grids share one directory
+        self.state_files = {
+            'buy_orders': os.path.join(base_dir, prefix + 'buy_orders.json'),
+            'sell_orders': os.path.join(base_dir, prefix + 'sell_orders.json'),
+            'order_tracking': os.path.join(base_dir, prefix + 'order_tracking.json'),
+            'portfolio': os.path.join(base_dir, prefix + 'portfolio.json'),
+            'open_orders': os.path.join(base_dir, prefix + 'open_orders.json')
+        }
+
+    def load_state(self, key, default_value):
+        return self.load_json_file(self.state_files[key], default_value)
+
+    def save_state(self, key, data):
+        self.save_json_file_atomic(self.state_files[key], data)
+
+    def load_json_file(self, file_name, default_value):
+        if os.path.exists(file_name):
+            try:
+                with open(file_name, 'r') as f:
+                    data = json.load(f)
+                    if isinstance(data, dict):
+                        return data
+                    else:
+                        logging.warning(f"Data in {file_name} is not a valid dictionary. Loading default value.")
+                        return default_value
+            except json.JSONDecodeError as e:
+                logging.error(f"Error decoding JSON from {file_name}: {e}. Loading default value.")
+                return default_value
+        else:
+            return default_value
+
+    def save_json_file_atomic(self, file_name, data):
+        temp_file_name = file_name + '.tmp'
+        try:
+            with open(temp_file_name, 'w') as f:
+                json.dump(data, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file_name, file_name)  # readers see the old file or the new one, never half of one
+        except Exception as e:
+            logging.critical(f"Failed to save file {file_name}: {e}")
+            raise
+
+    def save_all(self, states):  # checkpoint every key at once
+        for key, data in states.items():
+            self.save_state(key, data)
+
+    def track(self, key, data):  # hook for backends that record every mutation
+        return data
+
+    def note(self, key, data):  # record a new value of a scalar key (portfolio) between checkpoints
+        pass
+
+    def add_trade(self, row, ts=None):  # ledger row and sell time in ms, for backends that keep one (GridTrader writes its own log)
+        pass
+
+    def close(self):
+        pass
+
+
+class JournaledDict(dict):
+    """dict that reports every mutation to a JournalStateManager.
+
+    Each mutation and its journal record happen under the manager's lock,
+    so a concurrent compact() never snapshots a change whose record then
+    lands in the fresh journal, nor misses one already journaled.
+    """
+    def __init__(self, manager, name, data):
+        super().__init__(data)
+        self.manager = manager
+        self.name = name
+
+    def __setitem__(self, key, value):
+        with self.manager.lock:
+            super().__setitem__(key, value)
+            self.manager.append(self.name, 's', key, value)
+
+    def __delitem__(self, key):
+        with self.manager.lock:
+            super().__delitem__(key)
+            self.manager.append(self.name, 'd', key)
+
+    def pop(self, key, *default):
+        with self.manager.lock:
+            present = key in self
+            value = super().pop(key, *default)
+            if present:
+                self.manager.append(self.name, 'd', key)
+            return value
+
+    def popitem(self):
+        with self.manager.lock:
+            key, value = super().popitem()
+            self.manager.append(self.name, 'd', key)
+            return key, value
+
+    def setdefault(self, key, default=None):
+        with self.manager.lock:
+            if key not in self:
+                self[key] = default
+            return self[key]
+
+    def update(self, *args, **kwargs):
+        with self.manager.lock:
+            for key, value in dict(*args, **kwargs).items():
+                self[key] = value
+
+    def clear(self):
+        with self.manager.lock:
+            super().clear()
+            self.manager.append(self.name, 'c')
+
+
+class JournalStateManager(StateManager):
+    """Write-ahead journal plus periodic snapshots.
+
+    Every mutation of a tracked dict, and every note() of the portfolio,
+    is appended to `state.journal` as one compact JSON line. A background
+    thread fsyncs the journal every `commit_interval` seconds, so a burst
+    of fills shares one fsync. save_all() (GridTrader.checkpoint_state)
+    and every `compact_every` records write an atomic snapshot and empty
+    the journal. Loading replays the snapshot then the journal. Keys keep
+    their JSON type, so float price keys come back as floats, not strings.
+    Without a snapshot the JSON state files are the starting point, and
+    they are written out as the first snapshot as soon as the backend opens.
+    """
+    def __init__(self, base_dir='./', namespace=None, commit_interval=0.05, compact_every=10000):
+        super().__init__(base_dir, namespace)
+        prefix = f'{namespace}_' if namespace else ''
+        self.snapshot_file = os.path.join(base_dir, prefix + 'state.snapshot')
+        self.journal_file = os.path.join(base_dir, prefix + 'state.journal')
+        self.commit_interval = commit_interval
+        self.compact_every = compact_every
+        self.lock = threading.RLock()
+        self.tracked = {}  # name -> JournaledDict handed out by load_state
+        self.values = {}  # name -> last noted value for scalar keys
+        self.seq = 0
+        self.records = 0  # journal records since the last snapshot
+        self.dirty = False
+        fresh = not os.path.exists(self.snapshot_file)
+        self.state = self.recover()
+        self.journal = open(self.journal_file, 'a')
+        if fresh:
+            self.compact(self.state)  # the imported JSON state must not depend on a checkpoint that may never come
+        self.running = True
+        self.committer = threading.Thread(target=self.commit_loop, daemon=True)
+        self.committer.start()
+
+    def recover(self):
+        if os.path.exists(self.snapshot_file):
+            with open(self.snapshot_file, 'r') as f:
+                snap = json.load(f)
+            self.seq = snap['seq']
+            state = {name: dict(map(tuple, items)) if isinstance(items, list) else items for name, items in snap['state'].items()}
+        else:
+            state = {}
+            for key in self.state_files:  # first open: start from the JSON files
+                data = StateManager.load_state(self, key, None)
+                if data is not None:
+                    state[key] = data
+        replayed = 0
+        if os.path.exists(self.journal_file):
+            good = 0  # bytes up to the end of the last whole record
+            with open(self.journal_file, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # torn tail from a crash, nothing after it was committed
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        break
+                    good += len(line)
+                    seq, name, op = rec[0], rec[1], rec[2]
+                    if seq <= self.seq:
+                        continue  # already in the snapshot
+                    if op == 's':
+                        state.setdefault(name, {})[rec[3]] = rec[4]
+                    elif op == 'd':
+                        state.setdefault(name, {}).pop(rec[3], None)
+                    elif op == 'c':
+                        state[name] = {}
+                    elif op == 'p':
+                        state[name] = rec[3]
+                    self.seq = seq
+                    replayed += 1
+            if good < os.path.getsize(self.journal_file):
+                with open(self.journal_file, 'r+b') as f:
+                    f.truncate(good)  # or records appended from here on would follow the torn one and be lost on the next replay
+        if replayed:
+            logging.info(f"Replayed {replayed} journal records from {self.journal_file}")
+        self.records = replayed
+        return state
+
+    def load_state(self, key, default_value):
+        return self.track(key, self.state.get(key, default_value))
+
+    def track(self, key, data):
+        if key == 'portfolio':
+            self.values[key] = data
+            return data
+        tracked = JournaledDict(self, key, data)
+        self.tracked[key] = tracked
+        return tracked
+
+    def note(self, key, data):
+        self.values[key] = data
+        self.append(key, 'p', data)
+
+    def append(self, name, op, *args):
+        with self.lock:
+            self.seq += 1
+            self.journal.write(json.dumps([self.seq, name, op, *args], separators=(',', ':')) + '\n')
+            self.dirty = True
+            self.records += 1
+            if self.records >= self.compact_every:
+                self.compact()
+
+    def commit(self):
+        with self.lock:
+            if self.dirty:
+                self.journal.flush()
+                os.fsync(self.journal.fileno())
+                self.dirty = False
+
+    def commit_loop(self):
+        while self.running:
+            time.sleep(self.commit_interval)
+            try:
+                self.commit()
+            except ValueError:
+                return  # journal closed
+
+    def compact(self, states=None):
+        """Write a snapshot of the current state and start an empty journal."""
+        with self.lock:
+            merged = dict(self.tracked)
+            merged.update(self.values)
+            merged.update(states or {})
+            states = merged
+            snap = {'seq': self.seq, 'state': {name: list(data.items()) if name != 'portfolio' else data for name, data in states.items()}}
+            self.save_json_file_atomic(self.snapshot_file, snap)
+            self.journal.close()
+            self.journal = open(self.journal_file, 'w')  # everything up to seq is in the snapshot
+            self.records = 0
+            self.dirty = False
+
+    def save_state(self, key, data):
+        self.compact({key: data})
+
+    def save_all(self, states):
+        self.compact(states)
+
+    def close(self):
+        self.running = False
+        with self.lock:
+            self.commit()
+            self.journal.close()
+
+
+class SqliteStateManager(StateManager):
+    """State and trade ledger in one SQLite database (WAL mode).
+
+    Order books (buy_orders, sell_orders, order_tracking, open_orders) live
+    in one `orders` table indexed by book/status/price and by order id.
+    Entries removed from a dict are marked 'closed' there and copied to
+    `order_history` (as are values overwritten in place, as 'replaced'), so
+    a key that is reused later does not erase what it held before. Mutations of the dicts handed out by load_state run
+    cached prepared statements and are committed in groups every
+    `commit_interval` seconds. The trade ledger mirrors trades_record.csv.
+    A new database imports the existing JSON state files and trades CSV.
+    """
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS orders (
+            book TEXT NOT NULL, key TEXT NOT NULL, price REAL, order_id TEXT,
+            status TEXT NOT NULL, value TEXT, updated REAL,
+            PRIMARY KEY (book, key));
+        CREATE INDEX IF NOT EXISTS orders_status_price ON orders (book, status, price);
+        CREATE INDEX IF NOT EXISTS orders_order_id ON orders (order_id);
+        CREATE TABLE IF NOT EXISTS order_history (
+            id INTEGER PRIMARY KEY, book TEXT NOT NULL, key TEXT NOT NULL, price REAL, order_id TEXT,
+            status TEXT NOT NULL, value TEXT, opened REAL, closed REAL);
+        CREATE INDEX IF NOT EXISTS order_history_book ON order_history (book, closed);
+        CREATE INDEX IF NOT EXISTS order_history_order_id ON order_history (order_id);
+        CREATE TABLE IF NOT EXISTS kv (name TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE IF NOT EXISTS trades (
+            id INTEGER PRIMARY KEY, ts INTEGER, buy_price REAL, sell_price REAL, qty REAL,
+            pair_profit REAL, cumulative_income REAL, portfolio_value REAL, balance REAL,
+            eth_holdings REAL, session TEXT);
+        CREATE INDEX IF NOT EXISTS trades_session ON trades (session, ts);
+        CREATE INDEX IF NOT EXISTS trades_sell_price ON trades (sell_price);
+    '''
+    ARCHIVE = ("INSERT INTO order_history (book, key, price, order_id, status, value, opened, closed) "
+               "SELECT book, key, price, order_id, ?, value, updated, ? FROM orders WHERE book = ? AND status = 'open'")
+    UPSERT = 'INSERT OR REPLACE INTO orders (book, key, price, order_id, status, value, updated) VALUES (?, ?, ?, ?, ?, ?, ?)'
+    CLOSE = "UPDATE orders SET status = 'closed', updated = ? WHERE book = ? AND key = ?"
+    CLOSE_ALL = "UPDATE orders SET status = 'closed', updated = ? WHERE book = ? AND status = 'open'"
+    PUT = 'INSERT OR REPLACE INTO kv (name, value) VALUES (?, ?)'
+    TRADE = ('INSERT INTO trades (ts, buy_price, sell_price, qty, pair_profit, cumulative_income, portfolio_value, '
+             'balance, eth_holdings, session) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)')
+
+    def __init__(self, base_dir='./', namespace=None, csv_file=None, commit_interval=0.05):
+        import sqlite3
+        super().__init__(base_dir, namespace)
+        prefix = f'{namespace}_' if namespace else ''
+        self.db_file = os.path.join(base_dir, prefix + 'state.db')
+        fresh = not os.path.exists(self.db_file)
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(self.db_file, check_same_thread=False, isolation_level='DEFERRED')
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(self.SCHEMA)
+        self.conn.commit()
+        self.tracked = {}
+        self.dirty = False
+        self.commit_interval = commit_interval
+        if fresh:
+            self.import_legacy(csv_file)
+        self.running = True
+        self.committer = threading.Thread(target=self.commit_loop, daemon=True)
+        self.committer.start()
+
+    # import from the JSON/CSV files
+    def import_legacy(self, csv_file=None):
+        with self.lock:
+            for book in ('buy_orders', 'sell_orders', 'order_tracking', 'open_orders'):
+                for key, value in StateManager.load_state(self, book, {}).items():
+                    try:
+                        key = float(key) if book in ('buy_orders', 'sell_orders') else key  # JSON turned price keys into strings
+                    except ValueError:
+                        pass
+                    self.append(book, 's', key, value)
+            portfolio = StateManager.load_state(self, 'portfolio', None)
+            if portfolio is not None:
+                self.note('portfolio', portfolio)
+            if csv_file:
+                self.import_csv(csv_file)
+            self.commit()
+
+    def import_csv(self, csv_file):
+        import csv
+        if not os.path.exists(csv_file):
+            return 0
+        with open(csv_file, 'r', newline='') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # header
+            rows = [[None] + [float(x) for x in r[:8]] + [r[8]] for r in reader if len(r) >= 9]
+        with self.lock:
+            self.conn.executemany(self.TRADE, rows)
+            self.dirty = True
+        return len(rows)
+
+    # StateManager interface
+    def row_for(self, book, key, value):
+        price, order_id = None, None
+        if book in ('buy_orders', 'sell_orders'):
+            price, order_id = key, value
+        elif book == 'order_tracking':
+            order_id = key
+            price = value.get('buy-price') if isinstance(value, dict) else None
+        else:
+            order_id = key
+        return price, order_id
+
+    def load_state(self, key, default_value):
+        with self.lock:
+            if key == 'portfolio':
+                row = self.conn.execute('SELECT value FROM kv WHERE name = ?', (key,)).fetchone()
+                return json.loads(row[0]) if row else default_value
+            rows = self.conn.execute("SELECT key, value FROM orders WHERE book = ? AND status = 'open'", (key,)).fetchall()
+        data = {json.loads(k): json.loads(v) for k, v in rows} if rows else default_value
+        return self.track(key, data)
+
+    def track(self, key, data):
+        if key == 'portfolio':
+            return data
+        tracked = JournaledDict(self, key, data)
+        self.tracked[key] = tracked
+        return tracked
+
+    def append(self, name, op, *args):  # called by JournaledDict for every mutation
+        now = time.time()
+        with self.lock:
+            if op == 's':
+                key, value = args
+                price, order_id = self.row_for(name, key, value)
+                key, value = json.dumps(key), json.dumps(value)
+                self.conn.execute(self.ARCHIVE + ' AND key = ? AND value != ?', ('replaced', now, name, key, value))
+                self.conn.execute(self.UPSERT, (name, key, price, None if order_id is None else str(order_id), 'open', value, now))
+            elif op == 'd':
+                key = json.dumps(args[0])
+                self.conn.execute(self.ARCHIVE + ' AND key = ?', ('closed', now, name, key))
+                self.conn.execute(self.CLOSE, (now, name, key))
+            elif op == 'c':
+                self.conn.execute(self.ARCHIVE, ('closed', now, name))
+                self.conn.execute(self.CLOSE_ALL, (now, name))
+            self.dirty = True
+
+    def note(self, key, data):
+        with self.lock:
+            self.conn.execute(self.PUT, (key, json.dumps(data)))
+            self.dirty = True
+
+    def add_trade(self, row, ts=None):
+        """Ledger row in trades_record.csv column order; ts in ms, like ledger.TradeLedger."""
+        with self.lock:
+            self.conn.execute(self.TRADE, [int(time.time() * 1000) if ts is None else ts] + list(row[:9]))
+            self.dirty = True
+
+    def save_state(self, key, data):
+        if key == 'portfolio':
+            self.note(key, data)
+        elif data is not self.tracked.get(key):
+            with self.lock:
+                self.append(key, 'c')
+                for k, v in data.items():
+                    self.append(key, 's', k, v)
+        self.commit()
+
+    def save_all(self, states):
+        with self.lock:
+            for key, data in states.items():
+                self.save_state(key, data)
+
+    def commit(self):
+        with self.lock:
+            if self.dirty:
+                self.conn.commit()
+                self.dirty = False
+
+    def commit_loop(self):
+        while self.running:
+            time.sleep(self.commit_interval)
+            try:
+                self.commit()
+            except Exception as e:
+                logging.error(f"State commit failed: {e}")
+
+    def close(self):
+        self.running = False
+        self.commit()
+        self.conn.close()
+
+    # queries
+    def orders(self, book, status='open', below=None, above=None):
+        """[(key, value)] of a book, optionally limited to price < below / price > above.
+
+        status 'open' reads the live book; 'closed' or 'replaced' read order_history.
+        """
+        if status == 'open':
+            sql = "SELECT key, value FROM orders WHERE book = ? AND status = 'open'"
+            args = [book]
+        else:
+            sql = 'SELECT key, value FROM order_history WHERE book = ? AND status = ?'
+            args = [book, status]
+        if below is not None:
+            sql += ' AND price < ?'
+            args.append(below)
+        if above is not None:
+            sql += ' AND price > ?'
+            args.append(above)
+        with self.lock:
+            rows = self.conn.execute(sql + ' ORDER BY price', args).fetchall()
+        return [(json.loads(k), json.loads(v)) for k, v in rows]
+
+    def open_sells_below(self, price):
+        return self.orders('sell_orders', below=price)
+
+    def find_order(self, order_id):
+        """(book, key, status) rows that reference an exchange order id, live and historical."""
+        with self.lock:
+            rows = self.conn.execute("SELECT book, key, status FROM orders WHERE order_id = ? AND status = 'open' "
+                                     'UNION ALL SELECT book, key, status FROM order_history WHERE order_id = ? ORDER BY 3',
+                                     (str(order_id), str(order_id))).fetchall()
+        return [(book, json.loads(key), status) for book, key, status in rows]
+
+    def trades(self, session=None, since=None):  # since: ms
+        sql = 'SELECT ts, buy_price, sell_price, qty, pair_profit, cumulative_income, portfolio_value, balance, eth_holdings, session FROM trades WHERE 1=1'
+        args = []
+        if session is not None:
+            sql += ' AND session = ?'
+            args.append(str(session))
+        if since is not None:
+            sql += ' AND ts >= ?'
+            args.append(since)
+        with self.lock:
+            return self.conn.execute(sql + ' ORDER BY id', args).fetchall()
+
+    def session_summary(self):
+        """{session: (pairs, total pair profit)}"""
+        with self.lock:
+            rows = self.conn.execute('SELECT session, COUNT(*), SUM(pair_profit) FROM trades GROUP BY session').fetchall()
+        return {s: (n, p) for s, n, p in rows}
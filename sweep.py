@@ -0,0 +1,209 @@
+import os
+import csv
+import json
+import time
+import argparse
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# Vectorized grid parameter sweep.
+#
+# Every grid level n (buy at L = initial_price + n * grid_size, sell at
+# L + grid_size) runs the same small state machine as GridTrader under the
+# backtest's SimTrader: idle -> buy placed (price in its cell) -> bought
+# (a print at or below L) -> sold (a print at or above L + grid_size) -> idle.
+# A level's input only changes when the price changes grid cell, so each
+# cell change becomes one event per level it passes. All levels' state
+# machines are then run at once with a parallel prefix over transition
+# tables, so one parameter combination is a handful of array passes.
+
+IDLE, PLACED, BOUGHT = 0, 1, 2
+# event classes: E price in the level's cell, X price exactly on the level,
+# B price below the level, S price at or above the level's sell price
+E, X, B, S = 0, 1, 2, 3
+TRANSITIONS = np.array([
+    [PLACED, PLACED, BOUGHT],  # E
+    [PLACED, BOUGHT, BOUGHT],  # X: fills happen before placement within one print
+    [IDLE, BOUGHT, BOUGHT],    # B
+    [IDLE, PLACED, IDLE],      # S
+], dtype=np.int8)
+
+
+def level_events(prices, grid_size, initial_price):
+    """Return (tick, level, class) arrays of the events that drive each level's state machine."""
+    steps = (prices - initial_price) / grid_size
+    f = np.floor(steps + 1e-9).astype(np.int64)
+    exact = np.abs(steps - f) < 1e-9
+    state = f * 2 + exact
+    change = np.empty(len(prices), dtype=bool)
+    change[0] = True
+    change[1:] = state[1:] != state[:-1]
+    # a second print exactly on a level fills the buy placed by the first one
+    repeat = np.zeros(len(prices), dtype=bool)
+    repeat[1:] = exact[1:] & ~change[1:] & change[:-1]
+
+    t = np.flatnonzero(change)
+    prev = np.where(t > 0, f[np.maximum(t - 1, 0)], f[t])
+    lo = np.minimum(prev, f[t])
+    hi = np.maximum(prev, f[t])
+    hi[0] = lo[0]  # first print: only its own cell matters, every other level is idle
+    counts = hi - lo + 1
+    tick = np.repeat(t, counts)
+    start = np.repeat(np.cumsum(counts) - counts, counts)
+    level = np.repeat(lo, counts) + (np.arange(counts.sum()) - start)
+    at = np.repeat(f[t], counts)
+    cls = np.where(level > at, B, np.where(level < at, S, np.where(exact[tick], X, E))).astype(np.int8)
+
+    r = np.flatnonzero(repeat)
+    tick = np.concatenate((tick, r))
+    level = np.concatenate((level, f[r]))
+    cls = np.concatenate((cls, np.full(len(r), X, dtype=np.int8)))
+    order = np.lexsort((tick, level))
+    return tick[order], level[order], cls[order]
+
+
+def run_levels(level, cls):
+    """State of each level before and after every event (events sorted by level, then time)."""
+    n = len(cls)
+    funcs = TRANSITIONS[cls].copy()  # funcs[i][s] = state after event i when in state s before it
+    first = np.ones(n, dtype=bool)
+    first[1:] = level[1:] != level[:-1]
+    funcs[first] = funcs[first][:, :1]  # every level starts idle: this also stops the scan leaking across levels
+    d = 1
+    while d < n:
+        funcs[d:] = np.take_along_axis(funcs[d:], funcs[:-d].astype(np.intp), axis=1)
+        d *= 2
+    after = funcs[:, IDLE]
+    before = np.empty(n, dtype=np.int8)
+    before[0] = IDLE
+    before[1:] = after[:-1]
+    before[first] = IDLE
+    return before, after
+
+
+def simulate(prices, grid_size, buy_size, initial_price=0.0, fee_rate=0.001):
+    """PnL, fees and capital for one parameter set over a whole price series."""
+    prices = np.asarray(prices, dtype=np.float64)
+    tick, level, cls = level_events(prices, grid_size, initial_price)
+    before, after = run_levels(level, cls)
+    buy_price = np.round(initial_price + level * grid_size, 2)
+    sell_price = np.round(buy_price + grid_size, 2)
+
+    bought = (before == PLACED) & (after == BOUGHT)
+    sold = (before == BOUGHT) & (after == IDLE)
+    buy_fees = fee_rate * buy_size * buy_price[bought]
+    sell_fees = fee_rate * buy_size * sell_price[sold]
+    realized = float(((sell_price[sold] - buy_price[sold]) * buy_size).sum() - sell_fees.sum()
+                     - (fee_rate * buy_size * buy_price[sold]).sum())
+
+    last = np.ones(len(level), dtype=bool)
+    last[:-1] = level[1:] != level[:-1]
+    holding = last & (after == BOUGHT)
+    unrealized = float(((prices[-1] - buy_price[holding]) * buy_size - fee_rate * buy_size * buy_price[holding]).sum())
+
+    # capital tied up in inventory over time
+    flow_t = np.concatenate((tick[bought], tick[sold]))
+    flow = np.concatenate((buy_price[bought] * buy_size, -buy_price[sold] * buy_size))
+    order = np.argsort(flow_t, kind='stable')
+    inventory = np.cumsum(flow[order])
+    return {
+        'grid_size': grid_size,
+        'buy_size': buy_size,
+        'initial_price': initial_price,
+        'pairs': int(sold.sum()),
+        'buy_fills': int(bought.sum()),
+        'realized_pnl': realized,
+        'unrealized_pnl': unrealized,
+        'pnl': realized + unrealized,
+        'fees': float(buy_fees.sum() + sell_fees.sum()),
+        'peak_capital': float(inventory.max()) if len(inventory) else 0.0,
+        'final_capital': float((buy_price[holding] * buy_size).sum()),
+    }
+
+
+# process pool plumbing: workers map the price file once and keep it
+_prices = None
+
+
+def _init_worker(path, length):
+    global _prices
+    _prices = np.memmap(path, dtype=np.float64, mode='r', shape=(length,))
+
+
+def _run_chunk(args):
+    combos, fee_rate = args
+    return [simulate(_prices, g, q, i, fee_rate) for g, q, i in combos]
+
+
+def share_prices(prices, path):
+    """Write prices to a flat float64 file that sweep workers memory-map."""
+    mm = np.memmap(path, dtype=np.float64, mode='w+', shape=(len(prices),))
+    mm[:] = prices
+    mm.flush()
+    return path
+
+
+def sweep(prices, grid_sizes, buy_sizes, initial_prices=(0.0,), fee_rate=0.001, workers=None, path='sweep_prices.f8', chunk=16):
+    """Simulate every parameter combination on a process pool, best PnL first."""
+    combos = list(itertools.product(grid_sizes, buy_sizes, initial_prices))
+    share_prices(np.asarray(prices, dtype=np.float64), path)
+    chunks = [(combos[i:i + chunk], fee_rate) for i in range(0, len(combos), chunk)]
+    results = []
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(path, len(prices))) as pool:
+            for part in pool.map(_run_chunk, chunks):
+                results.extend(part)
+    finally:
+        os.remove(path)
+    results.sort(key=lambda r: r['pnl'], reverse=True)
+    return results
+
+
+def benchmark(prices, combos=200, workers=None, path='sweep_prices.f8'):
+    """Combinations per second, overall and per worker process."""
+    workers = workers or os.cpu_count()
+    grid_sizes = np.linspace(2, 40, combos)
+    start = time.perf_counter()
+    sweep(prices, grid_sizes, [0.001], fee_rate=0.001, workers=workers, path=path)
+    elapsed = time.perf_counter() - start
+    return {'ticks': len(prices), 'combos': combos, 'workers': workers, 'seconds': elapsed,
+            'combos_per_s': combos / elapsed, 'combos_per_s_per_core': combos / elapsed / workers}
+
+
+def write_table(results, path):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+
+
+if __name__ == '__main__':
+    from backtest import load_ticks
+    parser = argparse.ArgumentParser(description='Rank grid parameters over a recorded tape.')
+    parser.add_argument('tape', help='*_records.json, *_records.ndjson or a *_ticks directory')
+    parser.add_argument('--grid-sizes', default='3:30:1', help='start:stop:step')
+    parser.add_argument('--buy-sizes', default='0.001')
+    parser.add_argument('--initial-prices', default='0')
+    parser.add_argument('--fee-rate', type=float, default=0.001)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', default='sweep_results.csv')
+    parser.add_argument('--benchmark', action='store_true')
+    args = parser.parse_args()
+
+    def values(spec):
+        if ':' in spec:
+            start, stop, step = (float(x) for x in spec.split(':'))
+            return list(np.round(np.arange(start, stop + step / 2, step), 8))
+        return [float(x) for x in spec.split(',')]
+
+    prices = np.fromiter((p for _, p in load_ticks(args.tape)), dtype=np.float64)
+    if args.benchmark:
+        print(json.dumps(benchmark(prices, workers=args.workers), indent=4))
+    else:
+        results = sweep(prices, values(args.grid_sizes), values(args.buy_sizes), values(args.initial_prices),
+                        args.fee_rate, args.workers)
+        write_table(results, args.out)
+        for r in results[:10]:
+            print(f"grid={r['grid_size']:<8} size={r['buy_size']:<8} init={r['initial_price']:<8} pnl={r['pnl']:10.4f} "
+                  f"pairs={r['pairs']:<6} fees={r['fees']:8.4f} peak_capital={r['peak_capital']:10.2f}")
@@ -0,0 +1,415 @@
+import os
+import json
+import time
+import heapq
+import threading
+import numpy as np
+
+# Append-only trade tape: one JSON trade per line (NDJSON).
+# A crash can only ever leave a partial last line, which the reader skips.
+
+
+class TapeWriter:
+    """Buffered append-only writer, one open handle per target."""
+
+    def __init__(self, base_dir='./', flush_bytes=64 * 1024, flush_interval=1.0, suffix='_records.ndjson'):
+        self.base_dir = base_dir
+        self.flush_bytes = flush_bytes  # flush once this many bytes are buffered
+        self.flush_interval = flush_interval  # ...or once this many seconds passed since the last flush
+        self.suffix = suffix
+        self.lock = threading.Lock()
+        self.handles = {}  # target -> open file handle
+        self.buffers = {}  # target -> list of encoded lines
+        self.buffered = {}  # target -> number of buffered bytes
+        self.last_flush = {}  # target -> time of last flush
+        self.flusher = None
+        self.running = False
+
+    def path(self, target):
+        return os.path.join(self.base_dir, f'{target}{self.suffix}')
+
+    def write(self, target, records):
+        """Queue records (list of dicts) for target and flush if a threshold is hit."""
+        lines = [json.dumps(r, separators=(',', ':')) + '\n' for r in records]
+        with self.lock:
+            if target not in self.handles:
+                handle = open(self.path(target), 'a+', buffering=1024 * 1024)
+                if handle.tell() > 0:
+                    handle.seek(handle.tell() - 1)
+                    if handle.read(1) != '\n':
+                        handle.write('\n')  # terminate a line torn by a previous crash
+                self.handles[target] = handle
+                self.buffers[target] = []
+                self.buffered[target] = 0
+                self.last_flush[target] = time.time()
+            self.buffers[target].extend(lines)
+            self.buffered[target] += sum(len(l) for l in lines)
+            if self.buffered[target] >= self.flush_bytes or time.time() - self.last_flush[target] >= self.flush_interval:
+                self._flush(target)
+        if self.flusher is None or not self.flusher.is_alive():
+            self.start()
+
+    def _flush(self, target):
+        if self.buffers[target]:
+            try:
+                handle = self.handles[target]
+                handle.write(''.join(self.buffers[target]))
+                handle.flush()
+            except IOError as e:
+                print(f"Error writing to tape {self.path(target)}: {e}")
+            self.buffers[target] = []
+            self.buffered[target] = 0
+        self.last_flush[target] = time.time()
+
+    def flush(self, target=None):
+        with self.lock:
+            for t in ([target] if target else list(self.handles)):
+                if t in self.handles:
+                    self._flush(t)
+
+    def start(self):
+        """Start the background thread that flushes idle targets on the time threshold."""
+        self.running = True
+        self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self.flusher.start()
+
+    def _flush_loop(self):
+        while self.running:
+            time.sleep(self.flush_interval)
+            with self.lock:
+                now = time.time()
+                for t in list(self.handles):
+                    if self.buffers[t] and now - self.last_flush[t] >= self.flush_interval:
+                        self._flush(t)
+
+    def close(self, target=None):
+        with self.lock:
+            for t in ([target] if target else list(self.handles)):
+                if t in self.handles:
+                    self._flush(t)
+                    self.handles.pop(t).close()
+                    self.buffers.pop(t)
+                    self.buffered.pop(t)
+                    self.last_flush.pop(t)
+            if not self.handles:
+                self.running = False
+
+
+class RingBuffer:
+    """Fixed-capacity in-memory window of recent trades (timestamp, price, qty, side).
+
+    Columns are NumPy arrays used as a ring. A running price sum is stored
+    next to every trade, so the sum over any window is the difference of two
+    entries and a windowed query is one binary search on the timestamps.
+    That search needs timestamps that never go backwards: feed websocket
+    batches through append_trades, which orders each batch by 'T' (batches
+    themselves arrive in order).
+    """
+
+    SIDES = {'Buy': 1, 'Sell': -1}
+
+    def __init__(self, capacity=100000):
+        self.capacity = capacity
+        self.ts = np.zeros(capacity, dtype=np.int64)
+        self.price = np.zeros(capacity, dtype=np.float64)
+        self.qty = np.zeros(capacity, dtype=np.float64)
+        self.side = np.zeros(capacity, dtype=np.int8)
+        self.cum = np.zeros(capacity, dtype=np.float64)  # running price sum up to and including each slot
+        self.count = 0  # total trades ever appended
+        self.total = 0.0
+        self.since = int(time.time() * 1000)  # everything after this is in memory
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, ts, price, qty, side):
+        with self.lock:
+            i = self.count % self.capacity
+            if self.count >= self.capacity:
+                self.since = int(self.ts[(i + 1) % self.capacity])  # slot i is about to be overwritten
+            self.total += price
+            self.ts[i] = ts
+            self.price[i] = price
+            self.qty[i] = qty
+            self.side[i] = self.SIDES.get(side, 0)
+            self.cum[i] = self.total
+            self.count += 1
+
+    def append_trade(self, item):
+        """Append a raw Bybit trade entry ({'T', 'p', 'v', 'S'})."""
+        self.append(int(item['T']), float(item['p']), float(item['v']), item.get('S'))
+
+    def append_trades(self, items):
+        """Append one websocket batch of raw trades, oldest first whatever order it came in."""
+        for item in sorted(items, key=lambda item: int(item['T'])):
+            self.append_trade(item)
+
+    def covers(self, since):
+        """True if every trade at or after `since` (ms) is still in memory."""
+        return since >= self.since
+
+    def _find(self, since):
+        # number of logical slots (oldest first) with ts < since
+        n = len(self)
+        start = self.count % self.capacity if self.count > self.capacity else 0
+        lo, hi = 0, n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.ts[(start + mid) % self.capacity] < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return start, n, lo
+
+    def window_stats(self, since):
+        """Return (count, price sum) for trades with ts >= since."""
+        with self.lock:
+            start, n, k = self._find(since)
+            if k == n:
+                return 0, 0.0
+            last = self.cum[(start + n - 1) % self.capacity]
+            before = self.cum[(start + k - 1) % self.capacity] if k > 0 else self.cum[start] - self.price[start]
+            return n - k, float(last - before)
+
+    def mean_price(self, since):
+        count, total = self.window_stats(since)
+        return total / count if count > 0 else None
+
+    def window(self, since):
+        """Return copies of the (ts, price, qty, side) columns for trades with ts >= since."""
+        with self.lock:
+            start, n, k = self._find(since)
+            idx = (start + np.arange(k, n)) % self.capacity
+            return self.ts[idx], self.price[idx], self.qty[idx], self.side[idx]
+
+    def records(self, since):
+        """Window as Bybit-style trade dicts, matching what the tape readers return."""
+        names = {1: 'Buy', -1: 'Sell', 0: 'N/A'}
+        ts, price, qty, side = (column.tolist() for column in self.window(since))
+        return [{'T': t, 'p': str(p), 'v': str(q), 'S': names[s]} for t, p, q, s in zip(ts, price, qty, side)]
+
+
+def read_tape(path, since=None, block_size=64 * 1024):
+    """Return trades with T >= since (ms), oldest first.
+
+    The start of the window is found by bisecting byte offsets (parsing
+    the first whole line after each probe), then the file is read forward
+    from one block before it, so only the requested window gets parsed.
+    """
+    records = []
+    try:
+        with open(path, 'rb') as f:
+            start = 0
+            if since is not None:
+                f.seek(0, os.SEEK_END)
+                start = max(seek_time(f, since, f.tell(), block_size) - block_size, 0)  # a block of slack for batches out of order
+            f.seek(start)
+            if start:
+                f.readline()  # partial line
+            for line in f:
+                item = parse_line(line)
+                if item is not None and (since is None or item['T'] >= since):
+                    records.append(item)
+    except FileNotFoundError:
+        return []
+    return records
+
+
+def seek_time(f, since, size, block_size):
+    """Byte offset within block_size of the line holding the first trade with T >= since."""
+    lo, hi = 0, size
+    while hi - lo > block_size:
+        mid = (lo + hi) // 2
+        item = first_after(f, mid)
+        if item is None or item['T'] >= since:
+            hi = mid
+        else:
+            lo = mid
+    return lo
+
+
+def first_after(f, pos):
+    """First trade starting after byte pos (None at the end of the file)."""
+    f.seek(pos)
+    if pos:
+        f.readline()  # partial line
+    for line in f:
+        item = parse_line(line)
+        if item is not None:
+            return item
+    return None
+
+
+def iter_tape(path):
+    """Iterate over every trade in a tape, oldest first."""
+    try:
+        with open(path, 'rb') as f:
+            for line in f:
+                item = parse_line(line)
+                if item is not None:
+                    yield item
+    except FileNotFoundError:
+        return
+
+
+def parse_line(line):
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None  # torn write from a crash
+
+
+class TickStore:
+    """Memory-mapped columnar store for a recorded tape.
+
+    One fixed-width file per column inside `{target}_ticks/` plus a sparse
+    index holding every `stride`-th timestamp (its first entry is the stride
+    itself, so an existing store is always read back correctly). A time-range query is a
+    searchsorted on the index, a searchsorted inside one stride of the
+    timestamp column, and a zero-copy slice of each memory-mapped column.
+    """
+
+    COLUMNS = {'ts': np.int64, 'price': np.float64, 'qty': np.float64, 'side': np.int8}
+
+    def __init__(self, base_dir, target, stride=4096):
+        self.dir = os.path.join(base_dir, f'{target}_ticks')
+        self.stride = stride
+        self.maps = None
+        self.index = None
+
+    def column_path(self, name):
+        return os.path.join(self.dir, f'{name}.bin')
+
+    def exists(self):
+        return os.path.exists(self.column_path('ts'))
+
+    def __len__(self):
+        if not self.exists():
+            return 0
+        return os.path.getsize(self.column_path('ts')) // np.dtype(np.int64).itemsize
+
+    def append(self, ts, price, qty, side):
+        """Append column arrays (trades must be newer than what is stored)."""
+        os.makedirs(self.dir, exist_ok=True)
+        columns = {'ts': ts, 'price': price, 'qty': qty, 'side': side}
+        for name, dtype in self.COLUMNS.items():
+            with open(self.column_path(name), 'ab') as f:
+                np.asarray(columns[name], dtype=dtype).tofile(f)
+        self.build_index()
+
+    def build_index(self):
+        if os.path.exists(self.column_path('index')):
+            self.stride = int(np.fromfile(self.column_path('index'), dtype=np.int64, count=1)[0])
+        ts = np.memmap(self.column_path('ts'), dtype=np.int64, mode='r')
+        np.concatenate(([self.stride], ts[::self.stride])).astype(np.int64).tofile(self.column_path('index'))
+        self.maps = None  # file sizes changed, remap on next query
+
+    def open(self):
+        if self.maps is None:
+            n = len(self)
+            if n == 0:
+                return False
+            self.maps = {name: np.memmap(self.column_path(name), dtype=dtype, mode='r', shape=(n,)) for name, dtype in self.COLUMNS.items()}
+            index = np.fromfile(self.column_path('index'), dtype=np.int64)
+            self.stride, self.index = int(index[0]), index[1:]
+        return True
+
+    def locate(self, t):
+        """Position of the first trade with ts >= t."""
+        block = max(int(np.searchsorted(self.index, t, side='left')) - 1, 0)
+        lo = block * self.stride
+        hi = min(lo + 2 * self.stride, len(self.maps['ts']))
+        return lo + int(np.searchsorted(self.maps['ts'][lo:hi], t, side='left'))
+
+    def query(self, start=None, end=None):
+        """Return {column: view} for start <= ts < end (ms). The views share memory with the files."""
+        if not self.open():
+            return {name: np.empty(0, dtype=dtype) for name, dtype in self.COLUMNS.items()}
+        lo = 0 if start is None else self.locate(start)
+        hi = len(self.maps['ts']) if end is None else self.locate(end)
+        return {name: col[lo:hi] for name, col in self.maps.items()}
+
+    def mean_price(self, start=None, end=None):
+        price = self.query(start, end)['price']
+        return float(price.mean()) if len(price) else None
+
+
+def iter_json_array(path, block_size=1 << 20):
+    """Iterate over the items of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    with open(path, 'r') as f:
+        buf = f.read(block_size).lstrip()
+        if not buf.startswith('['):
+            raise ValueError(f"{path} is not a JSON array")
+        buf, pos, eof = buf[1:], 0, False
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buf) and buf[pos] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise
+                more = f.read(block_size)
+                eof = not more
+                buf, pos = buf[pos:] + more, 0  # the item runs past the block
+                continue
+            yield item
+            pos = end
+
+
+def convert_records(path, base_dir=None, target=None, stride=4096, chunk=1000000, window=100000):
+    """One-shot conversion of a *_records.json (or .ndjson) tape into a TickStore.
+
+    The file is streamed and written `chunk` trades at a time. Trades are
+    sorted through a heap of `window` entries, so disorder (trades inside
+    one websocket batch are not always in order) may span chunks; a trade
+    more than `window` trades out of place raises ValueError.
+    """
+    base_dir = base_dir or os.path.dirname(path) or './'
+    if target is None:
+        target = os.path.basename(path).rsplit('_records', 1)[0]
+    store = TickStore(base_dir, target, stride)
+    if store.exists():
+        raise FileExistsError(f"{store.dir} already exists")
+    items = iter_tape(path) if path.endswith('.ndjson') else iter_json_array(path)
+    sides = RingBuffer.SIDES
+    heap = []
+    pending = []
+    last = None
+    for n, i in enumerate(items):
+        heapq.heappush(heap, (int(i['T']), n, float(i['p']), float(i['v']), sides.get(i.get('S'), 0)))
+        if len(heap) > window:
+            row = heapq.heappop(heap)
+            if last is not None and row[0] < last:
+                raise ValueError(f"{path} has a trade more than {window} trades out of timestamp order")
+            last = row[0]
+            pending.append(row)
+            if len(pending) >= chunk:
+                append_rows(store, pending)
+                pending = []
+    if heap and last is not None and heap[0][0] < last:
+        raise ValueError(f"{path} has a trade more than {window} trades out of timestamp order")
+    pending.extend(heapq.heappop(heap) for _ in range(len(heap)))
+    if pending:
+        append_rows(store, pending)
+    return store
+
+
+def append_rows(store, rows):
+    ts, _, price, qty, side = zip(*rows)
+    store.append(ts, price, qty, side)
+
+
+if __name__ == '__main__':
+    # python tapelib.py ETHUSDT_spot_trade_records.json [more files...]
+    import sys
+    for p in sys.argv[1:]:
+        s = convert_records(p)
+        print(f"{p} -> {s.dir} ({len(s)} trades)")
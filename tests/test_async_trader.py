@@ -0,0 +1,34 @@
+import asyncio
+
+from asyncTrader import AsyncBybitTrader
+from bybitTrader import BybitTrader
+from mockbybit import MockBybit
+
+
+def test_not_a_blocking_trader():
+    assert not issubclass(AsyncBybitTrader, BybitTrader)
+
+
+def test_concurrent_creates_and_cancels(tmp_path):
+    async def run(mock):
+        async with AsyncBybitTrader('key', 'secret', base_dir=str(tmp_path), base_url=mock.rest_url, stream_url=mock.stream_url) as trader:
+            prices = [1400.0 + i for i in range(20)]
+            ids = await asyncio.gather(*(trader.create_order('spot', 'ETHUSDT', 'Buy', 'Limit', 0.01, p, verbose=False) for p in prices))
+            assert all(ids) and len(set(ids)) == 20
+            assert len(mock.exchange.open_orders()) == 20
+
+            names = [trader.orders.by_order_id(order_id)[1]['name'] for order_id in ids[:10]]
+            cancelled, batch = await asyncio.gather(
+                asyncio.gather(*(trader.cancel_order(name, verbose=False) for name in names)),
+                trader.cancel_orders('spot', 'ETHUSDT', ids[10:], verbose=False))
+            assert all(r['retCode'] == 0 for r in cancelled)
+            assert batch == [True] * 10
+            assert mock.exchange.open_orders() == []
+            assert trader.orders.link_ids('cancelled') == set(trader.orders.keys())
+
+            listing = await trader.get_open_orders('spot', verbose=False)
+            assert listing['result']['list'] == []
+            assert await trader.get_orders('spot', ids[:3]) == {i: mock.exchange.order_history(order_id=i)[0] for i in ids[:3]}
+
+    with MockBybit(prices=[1500.0], tick_interval=None) as mock:
+        asyncio.run(run(mock))
@@ -0,0 +1,78 @@
+import pytest
+
+import napilib as na
+from backtest import NullNotion
+from bybitTrader import BybitTrader
+from gridTrader import GridTrader
+from mockbybit import MockBybit
+
+
+@pytest.fixture
+def mock():
+    with MockBybit(prices=[1505.0], tick_interval=None) as mock:
+        yield mock
+
+
+@pytest.fixture
+def trader(mock, tmp_path):
+    return BybitTrader('key', 'secret', base_dir=str(tmp_path), base_url=mock.rest_url, stream_url=mock.stream_url)
+
+
+def buys(prices):
+    return [{"symbol": "ETHUSDT", "side": "Buy", "qty": 0.01, "price": p} for p in prices]
+
+
+def test_create_orders_goes_out_in_tens_and_folds_failures_per_item(mock, trader):
+    orders = buys([1400.0 + i for i in range(23)])
+    orders[4]["price"] = None  # a limit order without a price is rejected on its own
+    answers = iter([None, (10016, 'Internal system error.', {})])  # the second batch is rejected as a whole
+    admit = mock.admit
+    mock.admit = lambda endpoint: next(answers, None) or admit(endpoint)
+    ids = trader.create_orders("spot", orders, verbose=False)
+    assert len(ids) == 23
+    assert mock.counts['/v5/order/create-batch']['requests'] == 2  # the rejected one never reached the stand-in's count
+    assert ids[4] is None and all(ids[:4]) and all(ids[5:10])
+    assert ids[10:20] == [None] * 10
+    assert all(ids[20:])
+    assert len(mock.exchange.open_orders()) == 12
+    opened = {entry['order_id'] for _, entry in trader.orders.select(status='open')}
+    assert opened == {i for i in ids if i}
+
+
+def test_amend_and_cancel_orders_fold_per_item_and_update_the_registry(mock, trader):
+    ids = trader.create_orders("spot", buys([1400.0 + i for i in range(12)]), verbose=False)
+    assert all(ids)
+    amended = trader.amend_orders("spot", "ETHUSDT", [{"orderId": i, "price": 1300.0} for i in ids] + [{"orderId": "nope", "price": 1.0}],
+                                  verbose=False)
+    assert amended == [True] * 12 + [False]
+    assert mock.counts['/v5/order/amend-batch']['requests'] == 2
+    assert {entry['details']['price'] for _, entry in trader.orders.select()} == {'1300.0'}
+    assert {o['price'] for o in mock.exchange.open_orders()} == {'1300.0'}
+
+    mock.exchange.cancel('spot', {'orderId': ids[0]})  # gone already
+    cancelled = trader.cancel_orders("spot", "ETHUSDT", ids, verbose=False)
+    assert cancelled == [False] + [True] * 11
+    assert mock.counts['/v5/order/cancel-batch']['requests'] == 2
+    statuses = {entry['order_id']: entry['status'] for _, entry in trader.orders.select()}
+    assert statuses[ids[0]] == 'open'  # the exchange said no, so the registry was left alone
+    assert all(statuses[i] == 'cancelled' for i in ids[1:])
+    assert mock.exchange.open_orders() == []
+
+
+def test_a_ladder_is_seeded_and_cancelled_in_batches_with_plain_float_levels(mock, trader, tmp_path):
+    gt = GridTrader(None, None, na.db('', ''), 10, 0.01, 1500.0, 'ETHUSDT', trader=trader, notion=NullNotion(),
+                    state_dir=str(tmp_path), csv_file=str(tmp_path / 'trades_record.csv'), install_signals=False)
+    placed = gt.seed_ladder(1505.0, 12)
+    assert placed == [1500.0 - 10 * k for k in range(12)]
+    assert all(type(level) is float for level in placed)
+    assert all(type(level) is float for level in gt.buy_orders)
+    assert mock.counts['/v5/order/create-batch']['requests'] == 2
+    assert gt.seed_ladder(1505.0, 12) == []  # nothing missing, nothing sent
+    assert mock.counts['/v5/order/create-batch']['requests'] == 2
+
+    gt.order_tracking['sell-1'] = {'buy-price': 1490.0, 'qty': 0.01}  # that buy filled; its level stays
+    cancelled = gt.cancel_ladder()
+    assert sorted(cancelled) == sorted(l for l in placed if l != 1490.0)
+    assert all(type(level) is float for level in cancelled)
+    assert list(gt.buy_orders) == [1490.0]
+    assert [o['orderId'] for o in mock.exchange.open_orders()] == [gt.buy_orders[1490.0]]
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+import napilib as na
+from backtest import NullNotion
+from bybitTrader import BybitTrader
+from gridTrader import GridTrader
+from mockbybit import MockBybit
+
+
+def wait_for(condition, timeout=5.0):
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def grid(tmp_path):
+    with MockBybit(prices=[1505.0], tick_interval=None) as mock:
+        trader = BybitTrader('key', 'secret', base_dir=str(tmp_path), base_url=mock.rest_url, stream_url=mock.stream_url)
+        gt = GridTrader(None, None, na.db('', ''), 10, 0.01, 1500.0, 'ETHUSDT', trader=trader, notion=NullNotion(),
+                        state_dir=str(tmp_path), csv_file=str(tmp_path / 'trades_record.csv'), install_signals=False,
+                        event_driven=True, debounce=0.3, polling_interval=60)
+        gt.placed_on = []
+        create_order = trader.create_order
+        def recording_create_order(*args, **kwargs):
+            gt.placed_on.append(threading.current_thread().name)
+            return create_order(*args, **kwargs)
+        trader.create_order = recording_create_order
+        gt.evaluations = 0
+        handle_price = gt.handle_price
+        def counting_handle_price(*args):
+            gt.evaluations += 1
+            return handle_price(*args)
+        gt.handle_price = counting_handle_price
+        trader.websocket.price_listeners.append(gt.on_price)
+        yield gt
+        gt.stop_price_worker()
+
+
+def ticker(gt, prices):  # stands in for pybit's ticker thread
+    thread = threading.Thread(target=lambda: [gt.trader.websocket.set_price('ETHUSDT', p) for p in prices], name='ticker')
+    thread.start()
+    thread.join()
+
+
+def test_a_burst_of_ticks_is_evaluated_once(grid):
+    grid.start_price_worker()
+    with grid.lock:  # the worker is busy placing the first order while the burst arrives
+        ticker(grid, [1505.0])
+        assert wait_for(lambda: grid.evaluations == 1)
+        ticker(grid, [1505.0 - i * 0.5 for i in range(100)])  # through five cells, ending in 1450-1460
+    assert wait_for(lambda: len(grid.buy_orders) == 2)
+    time.sleep(0.2)
+    assert grid.evaluations == 2  # the first price, then only the newest of the burst
+    assert sorted(grid.buy_orders) == [1450.0, 1500.0]
+    assert grid.placed_on == ['price-ETHUSDT'] * 2  # never on the ticker thread
+
+
+def test_a_quick_re_entry_is_placed_after_the_debounce(grid):
+    grid.start_price_worker()
+    ticker(grid, [1505.0])
+    assert wait_for(lambda: 1500.0 in grid.buy_orders)
+    ticker(grid, [1495.0])
+    assert wait_for(lambda: 1490.0 in grid.buy_orders)
+    del grid.buy_orders[1500.0]  # say it filled and its sell is out
+    ticker(grid, [1505.0])  # back within the debounce
+    time.sleep(0.1)
+    assert 1500.0 not in grid.buy_orders
+    assert wait_for(lambda: 1500.0 in grid.buy_orders, timeout=2.0)
+    assert set(grid.placed_on) == {'price-ETHUSDT'}
+
+
+def test_a_stale_stream_falls_back_to_rest_polling(grid):
+    grid.polling_interval = 0.05
+    grid.trader.price_max_age = 0.05
+    time.sleep(0.1)  # the price cached while the grid started has gone stale
+    grid.start_price_worker()  # no ticker at all
+    assert wait_for(lambda: 1500.0 in grid.buy_orders)
+    assert grid.placed_on == ['price-ETHUSDT']
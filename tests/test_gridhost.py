@@ -0,0 +1,50 @@
+import pytest
+
+import napilib as na
+from backtest import NullNotion
+from bybitTrader import BybitTrader
+from gridTrader import GridHost
+from mockbybit import MockBybit
+
+
+@pytest.fixture
+def host(tmp_path):
+    with MockBybit(prices=[1505.0], tick_interval=None) as mock:
+        trader = BybitTrader('key', 'secret', base_dir=str(tmp_path), base_url=mock.rest_url, stream_url=mock.stream_url)
+        host = GridHost(None, None, na.db('', ''), state_dir=str(tmp_path), trader=trader, notion=NullNotion(), install_signals=False)
+        host.add('ETHUSDT', 10, 0.01, 1500.0)
+        host.add('BTCUSDT', 100, 0.001, 60000.0)
+        host.seen = {}
+        for symbol, grid in host.grids.items():
+            process = grid.process_order_updates
+            def recording(message, symbol=symbol, process=process):
+                host.seen.setdefault(symbol, []).append([order['orderId'] for order in message['data']])
+                return process(message)
+            grid.process_order_updates = recording
+        yield host
+        for grid in host.grids.values():
+            grid.state_manager.close()
+
+
+def update(order_id, symbol, status='New'):
+    return {'orderId': order_id, 'symbol': symbol, 'orderStatus': status, 'side': 'Buy', 'updatedTime': '0'}
+
+
+def test_order_updates_are_split_by_symbol(host):
+    host.dispatch({'topic': 'order', 'data': [update('1', 'ETHUSDT'), update('2', 'BTCUSDT'), update('3', 'ETHUSDT'),
+                                              update('4', 'SOLUSDT')]})
+    assert host.seen == {'ETHUSDT': [['1', '3']], 'BTCUSDT': [['2']]}  # one call per grid, the unmanaged symbol dropped
+    host.dispatch(None)
+    host.dispatch({'topic': 'order', 'data': []})
+    assert host.seen == {'ETHUSDT': [['1', '3']], 'BTCUSDT': [['2']]}
+
+
+def test_one_grid_raising_does_not_stop_the_others(host):
+    eth = host.grids['ETHUSDT']
+    def broken(message):
+        raise RuntimeError('boom')
+    eth.handle_filled_order_callback = broken
+    host.dispatch({'topic': 'order', 'data': [update('1', 'ETHUSDT'), update('2', 'BTCUSDT')]})
+    host.dispatch({'topic': 'order', 'data': [update('3', 'ETHUSDT'), update('4', 'BTCUSDT')]})
+    assert host.seen == {'BTCUSDT': [['2'], ['4']]}
+    assert not eth.lock.locked()
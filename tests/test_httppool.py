@@ -0,0 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import httppool
+from mockbybit import MockBybit
+
+
+@pytest.fixture
+def mock():
+    with MockBybit(prices=[1505.0], tick_interval=None) as mock:
+        yield mock
+
+
+def tickers(mock):
+    return mock.rest_url + '/v5/market/tickers?category=spot&symbol=ETHUSDT'
+
+
+def test_one_session_and_connection_serve_every_request_to_a_host(mock):
+    pool = httppool.SessionPool()
+    host, session = pool.session(tickers(mock))
+    for _ in range(20):
+        assert pool.get(tickers(mock)).json()['retCode'] == 0
+    assert pool.session(mock.rest_url + '/v5/order/realtime') == (host, session)
+    stats = pool.stats()[host]
+    assert stats['requests'] == 20 and stats['errors'] == 0
+    assert stats['connections_opened'] == 1  # kept alive between requests
+    pool.close()
+
+
+def test_a_blocking_pool_never_opens_more_than_max_size(mock):
+    pool = httppool.SessionPool(max_size=3, block=True)
+    with ThreadPoolExecutor(8) as executor:
+        codes = list(executor.map(lambda _: pool.get(tickers(mock)).json()['retCode'], range(40)))
+    assert codes == [0] * 40
+    stats = pool.stats()[pool.session(tickers(mock))[0]]
+    assert stats['requests'] == 40
+    assert stats['connections_opened'] <= 3
+    pool.close()
+
+
+def test_configure_rebuilds_the_sessions(mock):
+    pool = httppool.SessionPool()
+    host, before = pool.session(tickers(mock))
+    pool.configure(max_size=2)
+    after = pool.session(tickers(mock))[1]
+    assert after is not before
+    assert after.get_adapter(mock.rest_url)._pool_maxsize == 2
+    with pytest.raises(AttributeError):
+        pool.configure(pool_sise=2)
+    pool.close()
@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+
+import ledger
+
+
+def row(buy, sell, qty, profit, session):
+    return [buy, sell, qty, profit, 0.0, 0.0, 0.0, 0.0, session]
+
+
+def filled(path):
+    book = ledger.TradeLedger(str(path))
+    book.extend([
+        (row(100, 101, 1, 1.0, 'a'), 10000, 4000),
+        (row(100, 101, 1, -3.0, 'a'), 20000, 18000),
+        (row(200, 202, 2, 2.0, 'b'), 30000, 0),
+        (row(100, 101, 1, 4.0, 'a'), 70000, 60000),
+    ])
+    return book
+
+
+def test_analytics(tmp_path):
+    book = filled(tmp_path / 'ledger')
+    assert len(book) == 4
+    ts, equity = book.equity_curve('a')
+    assert ts.tolist() == [10000, 20000, 70000]
+    assert equity.tolist() == [1.0, -2.0, 2.0]
+    dd = book.drawdown('a')
+    assert dd['max_drawdown'] == 3.0
+    assert (dd['peak_ts'], dd['trough_ts']) == (10000, 20000)
+    assert book.holding_times().tolist() == [6.0, 2.0, 10.0]  # the row without a buy time is left out
+    assert book.turnover('b') == 2 * (200 + 202)
+    starts, profit, pairs = book.profit_by(60000)
+    assert starts.tolist() == [0, 60000]
+    assert profit.tolist() == [0.0, 4.0]
+    assert pairs.tolist() == [3, 1]
+    assert book.columns(start=20000, end=70000)['pair_profit'].tolist() == [-3.0, 2.0]
+
+
+def test_session_summary_matches_per_session_analytics(tmp_path):
+    book = filled(tmp_path / 'ledger')
+    summary = book.session_summary()
+    assert set(summary) == {'a', 'b'}
+    for name, s in summary.items():
+        profit = book.columns(name)['pair_profit']
+        assert s['pairs'] == len(profit)
+        assert np.isclose(s['profit'], profit.sum())
+        assert np.isclose(s['max_drawdown'], book.drawdown(name)['max_drawdown'])
+    assert summary['a']['win_rate'] == 2 / 3
+    assert summary['a']['mean_holding_s'] == 6.0
+    assert (summary['a']['first_ts'], summary['a']['last_ts']) == (10000, 70000)
+    assert summary['b']['mean_holding_s'] is None
+
+
+def test_repair_drops_a_torn_row(tmp_path):
+    path = tmp_path / 'ledger'
+    filled(path)
+    with open(os.path.join(path, 'ts.bin'), 'ab') as f:
+        np.asarray([80000], dtype=np.int64).tofile(f)  # crash after the first column of a row
+    with open(os.path.join(path, 'qty.bin'), 'ab') as f:
+        f.write(b'\x00\x00\x00')  # and half a value in another
+
+    book = ledger.TradeLedger(str(path))
+    assert len(book) == 4
+    for name, dtype in ledger.TradeLedger.COLUMNS.items():
+        assert os.path.getsize(book.column_path(name)) == 4 * np.dtype(dtype).itemsize
+    book.extend([(row(100, 101, 1, 1.0, 'a'), 90000, 85000)])
+    assert book.columns()['ts'].tolist() == [10000, 20000, 30000, 70000, 90000]
+
+
+def test_csv_round_trip(tmp_path):
+    book = filled(tmp_path / 'ledger')
+    csv_file = str(tmp_path / 'trades_record.csv')
+    book.to_csv(csv_file)
+    copy = ledger.TradeLedger(str(tmp_path / 'copy'))
+    assert copy.import_csv(csv_file) == 4
+    assert copy.columns('a')['pair_profit'].tolist() == [1.0, -3.0, 4.0]
+    assert copy.sessions() == ['a', 'b']
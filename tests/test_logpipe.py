@@ -0,0 +1,81 @@
+import io
+import logging
+import queue
+
+import logpipe
+
+
+class CountingHandler(logging.StreamHandler):
+    def __init__(self):
+        super().__init__(io.StringIO())
+        self.setFormatter(logging.Formatter('%(message)s'))
+        self.flushes = 0
+
+    def flush(self):
+        self.flushes += 1
+        super().flush()
+
+
+def record(msg, *args, level=logging.INFO):
+    return logging.LogRecord('test', level, __file__, 1, msg, args, None)
+
+
+def test_queued_records_go_out_as_one_write_per_batch():
+    q = queue.SimpleQueue()
+    handler = CountingHandler()
+    quiet = CountingHandler()
+    quiet.setLevel(logging.ERROR)
+    for i in range(250):
+        q.put(record('line %d', i))
+    listener = logpipe.LogListener(q, [handler, quiet], batch_size=100, interval=0)
+    listener.start()
+    listener.stop()
+    assert handler.stream.getvalue().splitlines() == [f'line {i}' for i in range(250)]
+    assert handler.flushes == 3  # 100 + 100 + 50, not one flush per record
+    assert quiet.flushes == 0 and quiet.stream.getvalue() == ''  # below its level, never formatted or flushed
+
+
+def test_close_drains_everything_still_queued(tmp_path):
+    path = tmp_path / 'grid_trader.log'
+    pipe = logpipe.LogPipeline(str(path), console=False, ring_size=10, fmt='%(levelname)s %(message)s')
+    pipe.listener.interval = 1.0  # the listener is asleep between batches when close() comes
+    logger = logging.getLogger('test-logpipe')
+    logger.propagate = False
+    srcfile = logging._srcfile
+    pipe.install(logger, lean=True)
+    assert logging._srcfile is None and logging.logThreads is False
+    payload = {'price': 1500}
+    logger.info('first %s', payload)
+    payload['price'] = 0  # changed after the call: the line must still say 1500
+    for i in range(999):
+        logger.info('fill %d', i)
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        logger.exception('failed')
+    assert pipe.tail(2)[0] == 'INFO fill 998'
+    pipe.close()
+    lines = path.read_text().splitlines()
+    assert lines[0] == "INFO first {'price': 1500}"
+    assert lines[1:1000] == [f'INFO fill {i}' for i in range(999)]
+    assert lines[1000] == 'ERROR failed' and lines[-1] == 'ValueError: boom'
+    assert logging._srcfile == srcfile and logging.logThreads is True  # lean switches restored
+    assert not logger.handlers
+    pipe.close()  # a second close is harmless
+
+
+def test_the_file_rolls_over_between_batches(tmp_path):
+    path = tmp_path / 'grid_trader.log'
+    pipe = logpipe.LogPipeline(str(path), console=False, max_bytes=2000, backup_count=50, fmt='%(message)s')
+    pipe.listener.interval = 0
+    logger = logging.getLogger('test-logpipe-rotate')
+    logger.propagate = False
+    pipe.install(logger)
+    for i in range(500):
+        logger.info('line %04d', i)
+    pipe.close()
+    files = sorted(tmp_path.glob('grid_trader.log*'), key=lambda p: int(p.suffix[1:]) if p.suffix[1:].isdigit() else 0,
+                   reverse=True)
+    assert len(files) > 1
+    lines = [line for p in files for line in p.read_text().splitlines()]
+    assert lines == [f'line {i:04d}' for i in range(500)]  # nothing lost or reordered across the rollovers
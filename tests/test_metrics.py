@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+import metrics
+
+
+def test_histogram_percentiles_stay_inside_the_bucket_holding_them():
+    values = np.random.default_rng(3).lognormal(1.5, 1.2, 20000)  # ms, a long right tail like REST latency
+    h = metrics.Histogram()
+    for v in values:
+        h.observe(float(v))
+    assert h.count == len(values) and sum(h.counts) == len(values)
+    assert h.sum == pytest.approx(values.sum())
+    for q in (1, 25, 50, 90, 99, 99.9):
+        exact = np.percentile(values, q)
+        i = np.searchsorted(h.bounds, exact)
+        lo = h.bounds[i - 1] if i > 0 else 0.0
+        hi = h.bounds[i] if i < len(h.bounds) else values.max()
+        assert lo <= h.percentile(q) <= hi
+    assert h.percentile(0) == values.min() and h.percentile(100) == values.max()
+
+
+def test_histogram_edges():
+    h = metrics.Histogram()
+    assert h.percentile(50) is None
+    assert h.snapshot()['avg'] is None and h.snapshot()['min'] is None
+    h.observe(3.0)
+    assert h.percentile(50) == 3.0 and h.percentile(99) == 3.0  # clamped to what was seen, not the 2.5-5 bucket
+    h.observe(5.0)  # on a bound: counted in the bucket it closes
+    assert h.counts[h.bounds.index(5)] == 2
+    big = metrics.Histogram()
+    for v in (40000.0, 50000.0, 60000.0):
+        big.observe(v)
+    assert big.counts[-1] == 3  # +Inf
+    assert 40000.0 <= big.percentile(50) <= 60000.0
+    assert big.percentile(99) <= 60000.0
+
+
+def test_snapshot_reports_per_series_percentiles():
+    m = metrics.Metrics()
+    for v in range(1, 101):
+        m.observe('rest_ms', float(v), endpoint='/v5/order/create')
+    m.observe('rest_ms', 1.0, endpoint='/v5/market/tickers')
+    m.inc('rest_errors', endpoint='/v5/order/create', kind='10016')
+    with m.timer('checkpoint_ms'):
+        pass
+    series = m.histograms[m.key('rest_ms', {'endpoint': '/v5/order/create'})].snapshot()
+    assert series['count'] == 100 and series['min'] == 1.0 and series['max'] == 100.0
+    assert 25 <= series['p50'] <= 50 and 50 <= series['p99'] <= 100
+    assert m.histograms[m.key('checkpoint_ms', {})].count == 1
+    off = metrics.Metrics(enabled=False)
+    off.observe('rest_ms', 1.0)
+    assert off.histograms == {}
@@ -0,0 +1,269 @@
+import json
+import threading
+import time
+import types
+
+import numpy as np
+import pytest
+
+import napilib as na
+
+TOKEN = 'secret_test_token'
+
+
+class Down(na.writer):  # a writer that crashes before any worker sends
+    def work(self, q):
+        pass
+
+
+class Recorder(na.writer):
+    def __init__(self, *args, **kwargs):
+        self.calls = []
+        super().__init__(*args, **kwargs)
+
+    def send(self, op, database):
+        self.calls.append((op['op'], self.resolve(op['key']), database.dbID, dict(op['properties'])))
+        return 'page-1' if op['op'] == 'add' else None
+
+
+def props(**values):
+    r = na.row()
+    for name, value in values.items():
+        r.set(name, value, 'number')
+    return r
+
+
+def test_spill_recovery(tmp_path):
+    spill = str(tmp_path / 'notion_queue.jsonl')
+    database = na.db(TOKEN, 'db-1')
+    down = Down(spill)
+    key = down.add(database, props(price=1.0))
+    down.update(key, props(qty=2.0), database)  # merged into the queued create
+    down.update('page-9', props(price=3.0), database, last=True)
+    assert not down.close(timeout=0)
+    with open(spill) as f:
+        text = f.read()
+    assert TOKEN not in text
+    with open(spill, 'a') as f:
+        f.write('{"seq": 99, "op": "add"')  # torn write
+
+    recorder = Recorder(spill, dbs=(database,))
+    assert recorder.flush(5)
+    assert sorted(recorder.calls) == [
+        ('add', None, 'db-1', props(price=1.0, qty=2.0).getJson()['properties']),
+        ('update', 'page-9', 'db-1', props(price=3.0).getJson()['properties']),
+    ]
+    assert recorder.ids == {key: 'page-1'}  # page-9 got its last update and was forgotten
+    recorder.close()
+
+    again = Recorder(spill, dbs=(database,))
+    assert again.pending() == 0 and again.ids == {key: 'page-1'}
+    again.close()
+
+
+def test_unregistered_database_waits_in_the_spill(tmp_path):
+    spill = str(tmp_path / 'notion_queue.jsonl')
+    down = Down(spill)
+    down.add(na.db(TOKEN, 'db-1'), props(price=1.0), keep=False)
+    down.close(timeout=0)
+
+    recorder = Recorder(spill)
+    assert not recorder.flush(0.7)  # nothing to send it with yet
+    recorder.register(na.db(TOKEN, 'db-1'))
+    assert recorder.flush(5)
+    assert [c[0] for c in recorder.calls] == ['add']
+    assert recorder.ids == {}
+    recorder.close()
+
+
+def test_legacy_spill_with_tokens(tmp_path):
+    spill = str(tmp_path / 'notion_queue.jsonl')
+    with open(spill, 'w') as f:
+        f.write(json.dumps({'seq': 1, 'op': 'add', 'key': 'pending-a', 'secret': TOKEN, 'properties': {}}) + '\n')
+        f.write(json.dumps({'seq': 2, 'op': 'add', 'key': 'pending-b', 'properties': {}}) + '\n')  # nothing to send it with
+
+    recorder = Recorder(spill)
+    with open(spill) as f:
+        assert TOKEN not in f.read()
+    assert recorder.pending() == 1
+    recorder.register(na.db(TOKEN, 'db-1'))
+    assert recorder.flush(5)
+    assert recorder.calls == [('add', None, 'db-1', {})]
+    recorder.close()
+
+
+class Flaky(Recorder):
+    def send(self, op, database):
+        super().send(op, database)
+        raise ConnectionError('notion unreachable')
+
+
+def test_close_stops_workers_before_closing_the_spill(tmp_path):
+    spill = str(tmp_path / 'notion_queue.jsonl')
+    flaky = Flaky(spill, backoff=0.01, dbs=(na.db(TOKEN, 'db-1'),))
+    flaky.add(na.db(TOKEN, 'db-1'), props(price=1.0))
+    assert not flaky.close(timeout=0.3)
+    assert flaky.calls  # it was being retried when close() came
+    assert not any(t.is_alive() for t in flaky.threads)
+
+    recorder = Recorder(spill, dbs=(na.db(TOKEN, 'db-1'),))
+    assert recorder.flush(5)
+    assert [c[0] for c in recorder.calls] == ['add']
+    recorder.close()
+
+
+def test_spill_file_is_compacted_while_running(tmp_path):
+    spill = str(tmp_path / 'notion_queue.jsonl')
+    database = na.db(TOKEN, 'db-1')
+    recorder = Recorder(spill, dbs=(database,), compact_every=5)
+    for i in range(23):
+        recorder.add(database, props(price=float(i)), keep=False)
+    assert recorder.flush(5)
+    with open(spill) as f:
+        lines = f.readlines()
+    assert len(lines) < 1 + 2 * 5  # ids line, then at most a few writes and their acknowledgements
+    assert len(recorder.calls) == 23
+    recorder.close()
+
+
+class Response:
+    def __init__(self, status, body=None, headers=None):
+        self.status_code = status
+        self.body = body or {}
+        self.headers = headers or {}
+        self.text = json.dumps(self.body)
+
+    def json(self):
+        return self.body
+
+
+@pytest.fixture
+def notion(monkeypatch):
+    """Pages served from a dict instead of the API; answers can be queued ahead of them."""
+    api = types.SimpleNamespace(pages={}, calls=[], answers=[], lock=threading.Lock())
+    def request(method, url, **kwargs):
+        with api.lock:
+            api.calls.append((method, url.rsplit('/', 1)[-1], kwargs['headers']['Authorization']))
+            if api.answers:
+                return api.answers.pop(0)
+        time.sleep(0.02)
+        return Response(200, api.pages[url.rsplit('/', 1)[-1]])
+    monkeypatch.setattr(na.httppool, 'request', request)
+    monkeypatch.setattr(na, 'limit', na.limiter(1000, 1000))
+    monkeypatch.setattr(na, 'cache', na.pagecache())
+    return api
+
+
+def page(page_id, **relations):
+    return {'id': page_id, 'properties': {'Name': {'type': 'title', 'title': [{'text': {'content': page_id}}]},
+                                         **{name: {'type': 'relation', 'relation': [{'id': i} for i in ids]}
+                                            for name, ids in relations.items()}}}
+
+
+def test_the_limiter_spaces_requests_and_honours_a_pause():
+    limit = na.limiter(rate=50, burst=2)
+    start = time.monotonic()
+    for _ in range(7):
+        limit.acquire()
+    assert time.monotonic() - start >= 5 / 50 * 0.9  # the burst, then one per 1/rate
+    assert limit.waits >= 5
+    limit.pause(0.2)
+    start = time.monotonic()
+    limit.acquire()
+    assert time.monotonic() - start >= 0.18
+
+
+def test_a_429_pauses_every_sender_then_retries(notion):
+    notion.pages['p1'] = page('p1')
+    notion.answers = [Response(429, headers={'Retry-After': '0.1'})]
+    start = time.monotonic()
+    assert na.fetch_page('p1', TOKEN)['id'] == 'p1'
+    assert time.monotonic() - start >= 0.09
+    assert [c[1] for c in notion.calls] == ['p1', 'p1']
+    notion.answers = [Response(429, headers={'Retry-After': '0'})] * 4
+    with pytest.raises(na.NotionError) as error:
+        na.request('get', na.urlMain + 'pages/p2', TOKEN, retries=3)
+    assert error.value.status == 429
+
+
+def test_relations_are_fetched_once_and_together(notion):
+    targets = [f't{i}' for i in range(6)]
+    for i in targets:
+        notion.pages[i] = page(i)
+    notion.pages['src'] = page('src', Links=targets + ['t0'])
+    na.fetch_page('t5', TOKEN)  # already cached
+    source = na.row(id='src', secret=TOKEN)
+    notion.calls.clear()
+
+    links = source.get('Links')
+    assert len(links) == 7 and notion.calls == []  # nothing fetched until the relation is used
+    start = time.monotonic()
+    assert [r.get('Name') for r in links] == targets + ['t0']
+    assert time.monotonic() - start < 5 * 0.02  # the five missing pages went out concurrently
+    assert sorted(c[1] for c in notion.calls) == ['t0', 't1', 't2', 't3', 't4']  # each once, the cached one not at all
+    assert all(c[2] == f'Bearer {TOKEN}' for c in notion.calls)
+    list(links)
+    assert len(notion.calls) == 5
+
+    na.cache.invalidate()
+    notion.calls.clear()
+    na.prefetch_relations([source], ['Links', 'Name'], TOKEN)
+    assert sorted(c[1] for c in notion.calls) == targets
+    assert [r.get('Name') for r in source.get('Links')] == targets + ['t0']
+    assert len(notion.calls) == 6  # served from the warmed cache
+
+
+def full_page(page_id, n):
+    return {'id': page_id, 'object': 'page', 'parent': {'database_id': 'db'}, 'url': f'https://notion.so/{page_id}', 'properties': {
+        'Name': {'type': 'title', 'title': [{'text': {'content': f'row {n}'}}]},
+        'price': {'type': 'number', 'number': None if n == 2 else 1500.0 + n},
+        'side': {'type': 'select', 'select': {'name': 'Buy'} if n % 2 else None},
+        'tags': {'type': 'multi_select', 'multi_select': [{'name': 'grid'}, {'name': f'n{n}'}]},
+        'done': {'type': 'checkbox', 'checkbox': n % 2 == 0},
+        'when': {'type': 'date', 'date': {'start': f'2024-01-0{n + 1}'} if n else None},
+        'pair': {'type': 'relation', 'relation': [{'id': f't{n}'}]},
+        'profit': {'type': 'formula', 'formula': {'type': 'number', 'number': n * 0.5}},
+        'note': {'type': 'rich_text', 'rich_text': []},
+    }}
+
+
+def test_compact_rows_decode_like_rows_and_drop_the_json_once_decoded():
+    raws = [full_page(f'p{n}', n) for n in range(4)]
+    sch = na.schema.from_page(raws[0], TOKEN)
+    assert sch.types == ['title', 'number', 'select', 'multi_select', 'checkbox', 'date', 'relation', 'formula', 'rich_text']
+    for n, raw in enumerate(raws):
+        compact, full = sch.row(raw), na.row(raw=raw, secret=TOKEN)
+        for name in sch.names:
+            if name == 'pair':
+                assert compact.get(name).ids == full.get(name).ids == [f't{n}']
+                assert compact.get(name).secret == TOKEN
+            else:
+                assert compact[name] == full.get(name), name
+        assert compact.raw is None  # every property decoded, so the page json was let go
+        assert compact.id == f'p{n}'
+
+    partial = sch.row(full_page('p9', 3))
+    assert partial.get('price') == 1503.0 and partial.raw is not None  # decoded on first access only
+    partial.raw['price']['number'] = 0.0
+    assert partial.get('price') == 1503.0  # and kept
+    del partial.raw['side']
+    assert partial.get('side') is None  # a property missing from the page reads as None
+    assert partial.to_dict()['tags'] == ['grid', 'n3']
+    with pytest.raises(KeyError):
+        partial.get('nope')
+
+
+def test_columns_and_iter_compact_over_query_pages(notion):
+    raws = [full_page(f'p{n}', n) for n in range(4)]
+    notion.answers = [Response(200, {'results': raws[:3], 'has_more': True, 'next_cursor': 'c1'}),
+                      Response(200, {'results': raws[3:], 'has_more': False, 'next_cursor': None})]
+    database = na.db(TOKEN, 'db')
+    out = database.columns(['price', 'done', 'pair', 'tags'], numpy=True)
+    assert [c[1] for c in notion.calls] == ['query', 'query']
+    assert out['id'] == ['p0', 'p1', 'p2', 'p3']
+    assert out['price'].dtype == np.float64 and np.isnan(out['price'][2]) and out['price'][3] == 1503.0
+    assert out['done'].tolist() == [True, False, True, False]
+    assert out['pair'].tolist() == [['t0'], ['t1'], ['t2'], ['t3']]  # one list per cell, not a 2-d array
+    assert out['tags'][1] == ['grid', 'n1']
+    assert database._schema.names[0] == 'Name'  # inferred from the first result, no schema request
+    assert na.columns([]) == {}
@@ -0,0 +1,73 @@
+import json
+
+import napilib as na
+from backtest import NullNotion
+from bybitTrader import BybitTrader
+from gridTrader import GridTrader
+from mockbybit import MockBybit
+import orders
+
+
+def entry(name, status='open', category='spot', order_id=None):
+    return {'name': name, 'details': {'category': category, 'orderId': order_id}, 'status': status}
+
+
+def test_indexes_follow_status_changes(tmp_path):
+    registry = orders.OrderRegistry(base_dir=str(tmp_path))
+    registry['l1'] = entry('n1', order_id='o1')
+    registry['l2'] = entry('n2', category='linear')
+    assert registry.by_name('n1') == ('l1', registry['l1'])
+    assert registry.by_order_id('o1')[0] == 'l1'
+    assert registry.link_ids('open', 'spot') == {'l1'}
+    registry.set_status('l1', 'cancelled')
+    assert registry.link_ids('open') == {'l2'}
+    assert registry.link_ids('cancelled', 'spot') == {'l1'}
+    assert [link_id for link_id, _ in registry.select()] == ['l1', 'l2']
+
+
+def test_retention_archives_each_terminal_order_once(tmp_path):
+    registry = orders.OrderRegistry(keep_terminal=2, base_dir=str(tmp_path))
+    for i in range(4):
+        registry[f'l{i}'] = entry(f'n{i}')
+    registry.set_status('l0', 'filled')
+    registry.set_status('l0', 'fulfilled')  # still one place in the queue
+    registry.set_status('l1', 'cancelled')
+    registry.set_status('l1', 'open')  # re-opened: off the queue
+    assert list(registry.terminal) == ['l0']
+    registry.set_status('l2', 'filled')
+    registry.set_status('l3', 'filled')
+    registry.set_status('l1', 'cancelled')
+    assert sorted(registry.keys()) == ['l1', 'l3']
+    assert registry.archived == 2
+    with open(registry.archive_file) as f:
+        assert [json.loads(line)['orderLinkId'] for line in f] == ['l0', 'l2']
+    assert registry.find_archived('n0')['status'] == 'fulfilled'
+    assert registry.by_name('n0') == (None, None)
+
+
+def test_max_age(tmp_path):
+    registry = orders.OrderRegistry(max_age=0, base_dir=str(tmp_path))
+    registry['l0'] = entry('n0', status='cancelled')
+    registry['l1'] = entry('n1', status='cancelled')  # evicts l0, now past max_age
+    assert 'l0' not in registry
+
+
+def test_fills_from_the_order_stream_are_evicted(tmp_path):
+    with MockBybit(prices=[1505.0, 1495.0, 1521.0], tick_interval=None) as mock:
+        trader = BybitTrader('key', 'secret', base_dir=str(tmp_path), base_url=mock.rest_url, stream_url=mock.stream_url, keep_terminal=1)
+        gt = GridTrader(None, None, na.db('', ''), 10, 0.01, 1500.0, 'ETHUSDT', trader=trader, notion=NullNotion(),
+                        state_dir=str(tmp_path), csv_file=str(tmp_path / 'trades_record.csv'), install_signals=False)
+        for price in (1500.0, 1510.0):
+            gt.place_buy_order(price)
+        assert len(trader.orders.link_ids('open')) == 2
+        mock.step()  # both buys fill; their sells at 1510 and 1520 are placed
+        for order in mock.exchange.order_history():
+            gt.process_order_updates({'data': [order]})
+        assert len(trader.orders) == 3  # two open sells and the newest fill; the other fill went to the archive
+        assert trader.orders.archived == 1
+        mock.step()  # both sells fill
+        for order in mock.exchange.order_history():
+            if order['side'] == 'Sell':
+                gt.process_order_updates({'data': [order]})
+        assert trader.orders.link_ids('open') == set()
+        assert len(trader.orders) == 1 and trader.orders.archived == 3
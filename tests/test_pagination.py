@@ -0,0 +1,54 @@
+import time
+
+import httppool
+from bybitTrader import BybitTrader
+from mockbybit import MockBybit
+
+
+def pages(n, size, calls):
+    def fetch(cursor):
+        calls.append(cursor)
+        k = int(cursor or 0)
+        return list(range(k * size, (k + 1) * size)), str(k + 1) if k + 1 < n else None
+    return fetch
+
+
+def test_paginate_follows_the_cursor_and_prefetches_one_page_ahead():
+    calls = []
+    assert [page for page in httppool.paginate(pages(3, 4, calls))] == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 10, 11]]
+    assert calls == [None, '1', '2']
+
+    calls = []
+    stream = httppool.paginate(pages(5, 2, calls), prefetch=True)
+    assert next(stream) == [0, 1]
+    deadline = time.time() + 2
+    while len(calls) < 2 and time.time() < deadline:
+        time.sleep(0.005)
+    time.sleep(0.05)
+    assert calls == [None, '1']  # the second page is on its way, never a third
+    assert next(stream) == [2, 3]
+    stream.close()
+    assert calls == [None, '1', '2']
+
+
+def test_open_orders_and_executions_are_read_across_pages(tmp_path):
+    with MockBybit(prices=[1505.0], tick_interval=None) as mock:
+        trader = BybitTrader('key', 'secret', base_dir=str(tmp_path), base_url=mock.rest_url, stream_url=mock.stream_url)
+        ids = trader.create_orders('spot', [{'symbol': 'ETHUSDT', 'side': 'Buy', 'qty': 1, 'price': 1000.0 + i} for i in range(120)],
+                                   verbose=False)
+        assert all(ids)
+        for prefetch in (False, True):
+            before = mock.counts['/v5/order/realtime']['requests'] if '/v5/order/realtime' in mock.counts else 0
+            listed = [order['orderId'] for order in trader.iter_orders('spot', page_size=50, prefetch=prefetch)]
+            assert sorted(listed) == sorted(ids)
+            assert mock.counts['/v5/order/realtime']['requests'] - before == 3
+
+        start = int(time.time() * 1000) - 1000
+        for order_id in ids[:70]:
+            mock.exchange.partial_fill(order_id, 0.5)
+        fills = list(trader.iter_executions('spot', 'ETHUSDT', start=start, page_size=25, prefetch=True))
+        assert len(fills) == 70 and mock.counts['/v5/execution/list']['requests'] == 3
+        executions = trader.get_executions('spot', 'ETHUSDT', start=start, window=200)  # many slices, paged in parallel
+        assert sorted(e['execId'] for e in executions) == sorted(e['execId'] for e in fills)  # each fill once
+        assert [int(e['execTime']) for e in executions] == sorted(int(e['execTime']) for e in fills)  # oldest first
+        assert {e['orderId'] for e in executions} == set(ids[:70])
@@ -0,0 +1,34 @@
+import time
+
+from bybitTrader import BybitTrader
+from mockbybit import MockBybit
+
+
+def test_the_cached_price_is_used_until_it_is_stale(tmp_path):
+    with MockBybit(prices=[1505.0, 1510.0, 1515.0], tick_interval=None) as mock:
+        trader = BybitTrader('key', 'secret', base_dir=str(tmp_path), base_url=mock.rest_url, stream_url=mock.stream_url)
+        rest = lambda: mock.counts.get('/v5/market/tickers', {}).get('requests', 0)
+        seen = []
+        trader.websocket.price_listeners.append(lambda symbol, price, received: seen.append((symbol, price)))
+
+        assert trader.get_last_price('ETHUSDT') == 1505.0  # nothing cached: REST, and the answer is cached
+        assert rest() == 1 and seen == [('ETHUSDT', 1505.0)]
+        mock.step()
+        assert trader.get_last_price('ETHUSDT') == 1505.0  # still fresh
+        assert rest() == 1
+
+        trader.websocket.handle_ticker({'ts': int(time.time() * 1000), 'data': {'symbol': 'ETHUSDT', 'lastPrice': '1507.5'}})
+        assert trader.get_last_price('ETHUSDT') == 1507.5  # the stream keeps it current without REST
+        assert rest() == 1
+
+        price, received = trader.websocket.prices['ETHUSDT']
+        trader.websocket.prices['ETHUSDT'] = (price, received - trader.price_max_age - 1)  # the ticker went quiet
+        assert trader.websocket.get_price('ETHUSDT', trader.price_max_age) is None
+        assert trader.websocket.get_price('ETHUSDT') == 1507.5  # without max_age any cached price will do
+        assert trader.get_last_price('ETHUSDT') == 1510.0
+        assert rest() == 2
+
+        mock.step()
+        assert trader.get_last_price('ETHUSDT', max_age=0) == 1515.0  # a caller may demand a fresher price
+        assert rest() == 3
+        assert trader.websocket.get_price('BTCUSDT') is None
@@ -0,0 +1,90 @@
+import threading
+import time
+import types
+
+import pytest
+
+import ratelimit
+from bybitTrader import BybitTrader
+from mockbybit import MockBybit
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit, 'time', types.SimpleNamespace(monotonic=clock.monotonic, time=time.time))
+    return clock
+
+
+def wait_for(condition, timeout=5.0):
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(0.005)
+    return condition()
+
+
+def queue(scheduler, admitted, name, endpoint, priority=None):
+    """Start a thread that waits its turn on endpoint, and return once it is queued."""
+    before = len(scheduler.waiting.get(endpoint, []))
+    thread = threading.Thread(target=lambda: (scheduler.acquire(endpoint, priority), admitted.append(name)), daemon=True)
+    thread.start()
+    assert wait_for(lambda: len(scheduler.waiting.get(endpoint, [])) == before + 1)
+    return thread
+
+
+def advance(scheduler, clock, seconds, admitted, expected):
+    clock.now += seconds
+    with scheduler.cond:
+        scheduler.cond.notify_all()
+    assert wait_for(lambda: len(admitted) == expected)
+    time.sleep(0.05)
+    assert len(admitted) == expected  # one token, one request
+
+
+def test_a_critical_request_overtakes_low_ones_queued_before_it(clock):
+    scheduler = ratelimit.RequestScheduler(limits={'/v5/test': 1}, timeout=None)
+    scheduler.acquire('/v5/test')  # the only token
+    admitted = []
+    threads = [queue(scheduler, admitted, f'low{i}', '/v5/test', ratelimit.LOW) for i in range(3)]
+    threads.append(queue(scheduler, admitted, 'critical', '/v5/test', ratelimit.CRITICAL))
+    for n in range(1, 5):
+        advance(scheduler, clock, 1.0, admitted, n)
+    for thread in threads:
+        thread.join(1)
+    assert admitted == ['critical', 'low0', 'low1', 'low2']
+
+
+def test_a_cancel_takes_the_global_token_before_a_waiting_ticker(clock):
+    scheduler = ratelimit.RequestScheduler(global_rate=1, timeout=None)
+    scheduler.acquire('/v5/order/create')  # the only account-wide token
+    admitted = []
+    ticker = queue(scheduler, admitted, 'ticker', '/v5/market/tickers')
+    cancel = queue(scheduler, admitted, 'cancel', '/v5/order/cancel')
+    advance(scheduler, clock, 1.0, admitted, 1)
+    assert admitted == ['cancel']  # both endpoint budgets were free, the priority decided
+    advance(scheduler, clock, 1.0, admitted, 2)
+    ticker.join(1)
+    cancel.join(1)
+    assert admitted == ['cancel', 'ticker']
+
+
+def test_a_rate_limited_answer_is_queued_again_and_retried(tmp_path):
+    with MockBybit(prices=[1505.0], tick_interval=None) as mock:
+        trader = BybitTrader('key', 'secret', base_dir=str(tmp_path), base_url=mock.rest_url, stream_url=mock.stream_url)
+        answers = [(ratelimit.RATE_LIMITED, 'Too many visits!', {})]
+        admit = mock.admit
+        mock.admit = lambda endpoint: answers.pop() if answers else admit(endpoint)
+        price = trader.get_index_price('ETHUSDT')
+        assert price == 1505.0
+        assert mock.counts['/v5/market/tickers']['requests'] == 1  # the 10006 came from the stand-in above
+        counts = trader.scheduler.counts['/v5/market/tickers']
+        assert counts['rate_limited'] == 1
+        assert counts['sent'] == 2  # went through the queue again, after the block
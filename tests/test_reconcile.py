@@ -0,0 +1,58 @@
+import pytest
+
+import napilib as na
+from backtest import NullNotion
+from bybitTrader import BybitTrader
+from gridTrader import GridTrader
+from mockbybit import MockBybit
+
+
+@pytest.fixture
+def mock():
+    with MockBybit(prices=[1505.0, 1505.0, 1495.0, 1531.0], tick_interval=None) as m:
+        yield m
+
+
+def grid(mock, tmp_path):
+    trader = BybitTrader('key', 'secret', base_dir=str(tmp_path), base_url=mock.rest_url, stream_url=mock.stream_url)
+    return GridTrader(None, None, na.db('', ''), 10, 0.01, 1500.0, 'ETHUSDT', trader=trader, notion=NullNotion(),
+                      state_dir=str(tmp_path), csv_file=str(tmp_path / 'trades_record.csv'), install_signals=False)
+
+
+def open_sells(exchange):
+    return {float(o['price']): o['orderId'] for o in exchange.open_orders() if o['side'] == 'Sell'}
+
+
+@pytest.mark.parametrize('lookback', [7 * 24 * 3600, 0.001], ids=['executions', 'order-lookups'])
+def test_reconcile_after_downtime(mock, tmp_path, lookback):
+    exchange = mock.exchange
+    gt = grid(mock, tmp_path)
+    for price in (1500.0, 1490.0, 1510.0, 1520.0):
+        gt.place_buy_order(price)
+    mock.step()  # 1510 and 1520 fill while we are listening
+    for price in (1510.0, 1520.0):
+        gt.process_order_updates({'data': exchange.order_history(order_id=gt.buy_orders[price])})
+    assert sorted(open_sells(exchange)) == [1520.0, 1530.0]
+    gt.checkpoint_state()
+
+    # down: a buy is cancelled, a sell is cancelled, a buy and a sell fill
+    exchange.cancel('spot', {'orderId': gt.buy_orders[1490.0]})
+    exchange.cancel('spot', {'orderId': gt.sell_orders[1520.0]})
+    mock.step(2)
+    income = gt.cumulative_income
+    gt.state_manager.close()
+
+    gt = grid(mock, tmp_path)
+    report = gt.reconcile(lookback=lookback)
+    assert {k: report[k] for k in ('buy_fills', 'sell_fills', 'dropped', 'replaced', 'unconfirmed')} == \
+        {'buy_fills': 1, 'sell_fills': 1, 'dropped': 1, 'replaced': 1, 'unconfirmed': 0}
+    assert 1490.0 not in gt.buy_orders
+    sells = open_sells(exchange)
+    assert sorted(sells) == [1510.0, 1520.0]  # the missed buy's sell, and the cancelled one placed again
+    assert {sell_id: details['buy-price'] for sell_id, details in gt.order_tracking.items()} == \
+        {sells[1510.0]: 1500.0, sells[1520.0]: 1510.0}
+    assert gt.cumulative_income > income  # the 1520 -> 1530 pair was booked
+
+    again = gt.reconcile(lookback=lookback)
+    assert again['buy_fills'] == again['sell_fills'] == again['replaced'] == again['dropped'] == 0
+    assert open_sells(exchange) == sells
@@ -0,0 +1,75 @@
+import json
+import os
+
+import statestore
+
+
+def test_journal_replay_after_torn_write(tmp_path):
+    manager = statestore.JournalStateManager(str(tmp_path))
+    buys = manager.load_state('buy_orders', {})
+    buys[1500.0] = 'a'
+    buys[1490.0] = 'b'
+    del buys[1500.0]
+    manager.note('portfolio', {'balance': 10.0})
+    manager.close()
+    with open(manager.journal_file, 'a') as f:
+        f.write('[5,"buy_orders","s",1480.0,"c"')  # crash mid-append
+
+    manager = statestore.JournalStateManager(str(tmp_path))
+    buys = manager.load_state('buy_orders', {})
+    assert buys == {1490.0: 'b'}
+    assert manager.load_state('portfolio', None) == {'balance': 10.0}
+    buys[1470.0] = 'd'  # lands after the last whole record, not after the torn one
+    manager.close()
+
+    manager = statestore.JournalStateManager(str(tmp_path))
+    assert manager.load_state('buy_orders', {}) == {1490.0: 'b', 1470.0: 'd'}
+    manager.close()
+
+
+def test_legacy_state_survives_a_crash_before_the_first_compact(tmp_path):
+    with open(tmp_path / 'buy_orders.json', 'w') as f:
+        json.dump({'1500.0': 'a'}, f)
+    with open(tmp_path / 'portfolio.json', 'w') as f:
+        json.dump({'balance': 10.0}, f)
+    manager = statestore.JournalStateManager(str(tmp_path))
+    assert manager.load_state('buy_orders', {}) == {'1500.0': 'a'}
+    manager.journal.flush()  # crash: no close(), no checkpoint
+
+    manager = statestore.JournalStateManager(str(tmp_path))
+    buys = manager.load_state('buy_orders', {})
+    assert buys == {'1500.0': 'a'}
+    assert manager.load_state('portfolio', None) == {'balance': 10.0}
+    assert manager.load_state('sell_orders', {}) == {}
+    buys[1490.0] = 'b'
+    manager.commit()  # crash again, after a journaled change
+
+    manager = statestore.JournalStateManager(str(tmp_path))
+    assert manager.load_state('buy_orders', {}) == {'1500.0': 'a', 1490.0: 'b'}
+    manager.close()
+
+
+def test_journal_replay_skips_records_in_the_snapshot(tmp_path):
+    manager = statestore.JournalStateManager(str(tmp_path), compact_every=3)
+    sells = manager.load_state('sell_orders', {})
+    for i in range(7):
+        sells[float(i)] = str(i)
+    manager.close()
+    assert os.path.exists(manager.snapshot_file)
+
+    manager = statestore.JournalStateManager(str(tmp_path))
+    assert manager.load_state('sell_orders', {}) == {float(i): str(i) for i in range(7)}
+    manager.close()
+
+
+
+def test_sqlite_history_survives_key_reuse(tmp_path):
+    manager = statestore.SqliteStateManager(str(tmp_path))
+    buys = manager.load_state('buy_orders', {})
+    buys[1500.0] = 'a'
+    del buys[1500.0]
+    buys[1500.0] = 'b'
+    assert manager.orders('buy_orders') == [(1500.0, 'b')]
+    assert manager.orders('buy_orders', 'closed') == [(1500.0, 'a')]
+    assert manager.find_order('a') == [('buy_orders', 1500.0, 'closed')]
+    manager.close()
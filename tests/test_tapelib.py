@@ -0,0 +1,113 @@
+import json
+
+import numpy as np
+import pytest
+
+import tapelib
+
+
+def test_ring_buffer_wraparound():
+    buffer = tapelib.RingBuffer(capacity=5)
+    for i in range(12):
+        buffer.append(1000 + i, float(i), 0.5, 'Buy' if i % 2 else 'Sell')
+    assert len(buffer) == 5
+    assert buffer.since == 1007  # trades 1000..1006 were overwritten
+    assert not buffer.covers(1006)
+    assert buffer.covers(1007)
+    ts, price, qty, side = buffer.window(0)
+    assert ts.tolist() == [1007, 1008, 1009, 1010, 1011]
+    assert side.tolist() == [1, -1, 1, -1, 1]
+    assert buffer.window_stats(1009) == (3, 9.0 + 10.0 + 11.0)
+    assert buffer.window_stats(1007) == (5, float(sum(range(7, 12))))
+    assert buffer.window_stats(2000) == (0, 0.0)
+    assert buffer.mean_price(1010) == 10.5
+    records = buffer.records(1010)
+    assert records == [{'T': 1010, 'p': '10.0', 'v': '0.5', 'S': 'Sell'}, {'T': 1011, 'p': '11.0', 'v': '0.5', 'S': 'Buy'}]
+
+
+def test_ring_buffer_before_it_fills():
+    buffer = tapelib.RingBuffer(capacity=8)
+    for i in range(3):
+        buffer.append(1000 + i, float(i), 1.0, 'Buy')
+    assert len(buffer) == 3
+    assert buffer.window_stats(0) == (3, 3.0)
+    assert buffer.window(1001)[0].tolist() == [1001, 1002]
+
+
+def test_a_batch_out_of_order_is_appended_oldest_first():
+    buffer = tapelib.RingBuffer(capacity=8)
+    buffer.append_trades([{'T': 1000, 'p': '1', 'v': '1', 'S': 'Buy'}])
+    buffer.append_trades([{'T': t, 'p': str(t - 1000), 'v': '1', 'S': 'Sell'} for t in (1003, 1001, 1004, 1002)])
+    assert buffer.window(0)[0].tolist() == [1000, 1001, 1002, 1003, 1004]
+    assert buffer.window_stats(1002) == (3, 2.0 + 3.0 + 4.0)
+    assert buffer.window_stats(1001) == (4, 10.0)
+
+
+def test_the_stream_keeps_the_newest_trade_of_a_batch(tmp_path):
+    from bybitTrader import BybitTrader
+    socket = BybitTrader('key', 'secret', base_dir=str(tmp_path), tape_mode='ndjson').websocket
+    socket.target, socket.symbol, socket.callback = 'ETHUSDT', 'ETHUSDT', lambda message: None
+    socket.handle_message({'data': [{'T': 1002, 'p': '102', 'v': '1', 'S': 'Buy'}, {'T': 1001, 'p': '101', 'v': '1', 'S': 'Buy'}]})
+    assert socket.buffers['ETHUSDT'].window(0)[0].tolist() == [1001, 1002]
+    assert socket.get_price('ETHUSDT') == 102.0
+    socket.tape.close()
+
+
+def write_tape(path, trades, torn=False):
+    with open(path, 'w') as f:
+        f.writelines(json.dumps(t) + '\n' for t in trades)
+        if torn:
+            f.write('{"T": 1')
+
+
+def trades(n, start=1000):
+    return [{'T': start + i, 'p': str(100 + i % 7), 'v': '0.1', 'S': 'Buy'} for i in range(n)]
+
+
+def test_read_tape_window(tmp_path):
+    path = str(tmp_path / 'X_records.ndjson')
+    tape = trades(5000)
+    write_tape(path, tape, torn=True)
+    for since in (None, 0, 1000, 3500, 5999, 6000):
+        expected = [t for t in tape if since is None or t['T'] >= since]
+        assert tapelib.read_tape(path, since, block_size=256) == expected
+    assert tapelib.read_tape(str(tmp_path / 'missing.ndjson')) == []
+
+
+def test_convert_records_sorts_across_chunks(tmp_path):
+    tape = trades(1000)
+    for i in range(0, len(tape), 10):  # every websocket batch reversed
+        tape[i:i + 10] = tape[i:i + 10][::-1]
+    path = str(tmp_path / 'X_records.json')
+    with open(path, 'w') as f:
+        json.dump(tape, f)
+    store = tapelib.convert_records(path, chunk=64, window=16)
+    ts = store.query()['ts']
+    assert len(ts) == 1000
+    assert np.all(np.diff(ts) == 1)
+
+
+def test_tick_store_round_trip(tmp_path):
+    rng = np.random.default_rng(7)
+    ts = np.cumsum(rng.integers(0, 3, 2000)) + 1000  # repeated timestamps included
+    price = rng.uniform(90, 110, 2000)
+    qty = rng.uniform(0, 1, 2000)
+    side = rng.choice([1, -1], 2000).astype(np.int8)
+    empty = tapelib.TickStore(str(tmp_path), 'X', stride=64)
+    assert len(empty) == 0 and len(empty.query()['ts']) == 0 and empty.mean_price() is None
+    empty.append(ts[:1200], price[:1200], qty[:1200], side[:1200])
+    empty.query()  # mapped before the second append
+    empty.append(ts[1200:], price[1200:], qty[1200:], side[1200:])
+    store = tapelib.TickStore(str(tmp_path), 'X', stride=999)  # reopened: the stride comes from the index
+    assert len(store) == 2000
+    columns = store.query()
+    assert store.stride == 64
+    assert columns['ts'].tolist() == ts.tolist() and columns['side'].tolist() == side.tolist()
+    assert np.array_equal(columns['price'], price) and np.array_equal(columns['qty'], qty)
+    for start, end in ((None, None), (ts[0], ts[-1] + 1), (ts[500], ts[1500]), (ts[700], ts[700]), (0, ts[64]), (ts[-1] + 1, None)):
+        mask = (ts >= (ts[0] if start is None else start)) & (ts < (ts[-1] + 1 if end is None else end))
+        window = store.query(start, end)
+        assert window['ts'].tolist() == ts[mask].tolist()
+        assert np.array_equal(window['price'], price[mask])
+    assert store.mean_price(ts[100], ts[200]) == pytest.approx(price[(ts >= ts[100]) & (ts < ts[200])].mean())
+    assert empty.query()['ts'].tolist() == ts.tolist()  # the first instance remapped after its own append